@@ -2,7 +2,8 @@ from fastapi import APIRouter
 from app.api.endpoints import (
     auth, users, roles, departments, specializations, 
     doctors, patients, appointments, medical_records,
-    timeslots, chat, chatbot, insurance, notifications
+    timeslots, chat, chatbot, insurance, notifications,
+    monitoring, exports
 )
 
 api_router = APIRouter()
@@ -49,6 +50,12 @@ api_router.include_router(insurance.router, prefix="/insurance", tags=["Insuranc
 # Notification routes
 api_router.include_router(notifications.router, prefix="/notifications", tags=["Notifications"])
 
+# Streaming export routes
+api_router.include_router(exports.router, prefix="/exports", tags=["Exports"])
+
+# Monitoring routes
+api_router.include_router(monitoring.router, prefix="/monitoring", tags=["Monitoring"])
+
 # Print all routes for debugging
 print("\nAPI Routes:")
 for route in api_router.routes:
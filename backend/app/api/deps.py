@@ -1,9 +1,13 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.config.database import db
+from app.config.database import RequestConnection, db
 from app.utils.security import security
 from typing import Dict, Optional
+from collections import OrderedDict
 import logging
+import os
+import threading
+import time
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,7 +15,136 @@ logger = logging.getLogger(__name__)
 # Define OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+# User, role and profile ids of a principal, resolved in one round trip
+PRINCIPAL_QUERY = """
+    SELECT u.user_id, u.email, u.first_name, u.last_name,
+           u.phone, u.role_id, r.role_name,
+           d.doctor_id, p.patient_id, m.admin_id AS management_id
+    FROM users u
+    JOIN roles r ON u.role_id = r.role_id
+    LEFT JOIN doctors d ON d.user_id = u.user_id
+    LEFT JOIN patients p ON p.user_id = u.user_id
+    LEFT JOIN management m ON m.user_id = u.user_id
+    WHERE u.user_id = %s
+"""
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of loaded principals keyed by the token ``sub``.
+
+    Entries expire after ``ttl`` seconds. Writers to USERS/ROLES must call
+    invalidate() / invalidate_role() so that profile and role changes are
+    visible before the entry expires. Every invalidation bumps a generation
+    counter; a load that started before an invalidation is not stored, so a
+    request racing with an update cannot re-cache the old row.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key) -> Optional[Dict]:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return None
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            # Copy so handlers cannot mutate the cached principal
+            return dict(entry[1])
+
+    def set(self, key, principal: Dict, generation: Optional[int] = None):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        key = str(key)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, dict(principal))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, user_id):
+        """Drop the cached principal of one user."""
+        with self._lock:
+            self.generation += 1
+            self._invalidations += 1
+            self._entries.pop(str(user_id), None)
+
+    def invalidate_role(self, role_id):
+        """Drop every cached principal holding the given role."""
+        with self._lock:
+            self.generation += 1
+            self._invalidations += 1
+            for key in [k for k, (_, p) in self._entries.items() if p.get("role_id") == role_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
+
+principal_cache = PrincipalCache(
+    max_size=int(os.getenv("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60"))
+)
+
+async def get_request_db():
+    """
+    Request-scoped async database connection.
+
+    FastAPI caches dependencies per request, so every dependency and the
+    endpoint that declare Depends(get_request_db) share one pooled
+    connection. It is checked out the first time db.aget_db(conn) /
+    db.atransaction(conn) uses it, so requests answered from caches never
+    take one, and it is returned to the pool once the response has been sent.
+    """
+    conn = RequestConnection(db)
+    try:
+        yield conn
+    finally:
+        await conn.release()
+
+async def load_principal(user_id, conn=None) -> Optional[Dict]:
+    """
+    Load a user together with their role name and doctor_id, patient_id and
+    management_id (None when the user has no such profile) in a single query.
+    """
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(PRINCIPAL_QUERY, (user_id,))
+            return await cursor.fetchone()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), conn=Depends(get_request_db)):
     """
     Get the current user from the token.
     """
@@ -22,7 +155,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             detail="Invalid authentication token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(
@@ -30,28 +163,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT u.user_id, u.email, u.first_name, u.last_name, 
-                       u.phone, u.role_id, r.role_name
-                FROM users u
-                JOIN roles r ON u.role_id = r.role_id
-                WHERE u.user_id = %s
-                """,
-                (user_id,)
-            )
-            user = cursor.fetchone()
-    
+
+    user = principal_cache.get(user_id)
+    if user is None:
+        generation = principal_cache.generation
+        user = await load_principal(user_id, conn)
+        if user:
+            principal_cache.set(user_id, user, generation)
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     return user
 
 async def get_current_admin(current_user: Dict = Depends(get_current_user)):
@@ -67,72 +193,38 @@ async def get_current_admin(current_user: Dict = Depends(get_current_user)):
 
 async def get_current_doctor(current_user = Depends(get_current_user)):
     """
-    Get the current doctor user.
+    Get the current doctor user (admins are let through as well).
     """
     if current_user["role_name"] != "doctor" and current_user["role_name"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource",
         )
-    
-    # Get doctor details
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT doctor_id
-                FROM doctors
-                WHERE user_id = %s
-                """,
-                (current_user["user_id"],)
-            )
-            doctor = cursor.fetchone()
-    
-    if doctor is None and current_user["role_name"] != "admin":
+
+    if current_user.get("doctor_id") is None and current_user["role_name"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource",
         )
-    
-    # Add doctor_id to current_user if it exists
-    if doctor:
-        current_user["doctor_id"] = doctor["doctor_id"]
-    
+
     return current_user
 
 async def get_current_patient(current_user = Depends(get_current_user)):
     """
-    Get the current patient user.
+    Get the current patient user (admins are let through as well).
     """
     if current_user["role_name"] != "patient" and current_user["role_name"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource",
         )
-    
-    # Get patient details
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT patient_id
-                FROM patients
-                WHERE user_id = %s
-                """,
-                (current_user["user_id"],)
-            )
-            patient = cursor.fetchone()
-    
-    if patient is None and current_user["role_name"] != "admin":
+
+    if current_user.get("patient_id") is None and current_user["role_name"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource",
         )
-    
-    # Add patient_id to current_user if it exists
-    if patient:
-        current_user["patient_id"] = patient["patient_id"]
-    
+
     return current_user
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)) -> dict:
@@ -152,30 +244,16 @@ async def get_current_active_doctor(current_user: dict = Depends(get_current_act
     """
     if current_user["role_name"] != "doctor":
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Operation requires doctor privileges"
         )
-    
-    # Get doctor details
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM doctors
-                WHERE user_id = %s
-                """,
-                (current_user["user_id"],)
-            )
-            doctor = cursor.fetchone()
-    
-    if not doctor:
+
+    if current_user.get("doctor_id") is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Doctor profile not found"
         )
-    
-    current_user["doctor_id"] = doctor["doctor_id"]
-    current_user["doctor_details"] = doctor
+
     return current_user
 
 async def get_current_active_patient(current_user: dict = Depends(get_current_active_user)) -> dict:
@@ -184,30 +262,16 @@ async def get_current_active_patient(current_user: dict = Depends(get_current_ac
     """
     if current_user["role_name"] != "patient":
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Operation requires patient privileges"
         )
-    
-    # Get patient details
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM patients
-                WHERE user_id = %s
-                """,
-                (current_user["user_id"],)
-            )
-            patient = cursor.fetchone()
-    
-    if not patient:
+
+    if current_user.get("patient_id") is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient profile not found"
         )
-    
-    current_user["patient_id"] = patient["patient_id"]
-    current_user["patient_details"] = patient
+
     return current_user
 
 async def get_current_management(current_user: dict = Depends(get_current_active_user)) -> dict:
@@ -216,43 +280,32 @@ async def get_current_management(current_user: dict = Depends(get_current_active
     """
     if current_user["role_name"] != "management":
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Operation requires management privileges"
         )
-    
-    # Get management details
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM management
-                WHERE user_id = %s
-                """,
-                (current_user["user_id"],)
-            )
-            management = cursor.fetchone()
-    
-    if not management:
+
+    if current_user.get("management_id") is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Management profile not found"
         )
-    
-    current_user["management_id"] = management["management_id"]
-    current_user["management_details"] = management
+
     return current_user
 
 def verify_permission(required_permission: str):
     """
-    Verify that the current user has the required permission.
+    Verify that the current user has the required permission, granted to
+    their role or to them directly. Admins hold every permission.
     """
     async def permission_dependency(current_user: Dict = Depends(get_current_user)):
-        # In a real app, you would check if the user has the required permission
-        # For now, we'll just check if the user is an admin
-        if current_user["role_name"].lower() != "admin":
+        if current_user["role_name"].lower() == "admin":
+            return current_user
+        if not security.permissions.has(
+            current_user["user_id"], current_user.get("role_id"), required_permission
+        ):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission required: {required_permission}"
             )
         return current_user
-    return permission_dependency
\ No newline at end of file
+    return permission_dependency
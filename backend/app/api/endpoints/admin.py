@@ -12,9 +12,8 @@ logger = logging.getLogger(__name__)
 @router.post("/departments")
 async def create_department(
     data: Dict,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_permission("manage_departments"))
 ):
-    await verify_permission("manage_departments", current_user)
     try:
         with db.transaction() as conn:
             with conn.cursor() as cursor:
@@ -62,9 +61,8 @@ async def create_department(
 @router.post("/specializations")
 async def create_specialization(
     data: Dict,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_permission("manage_specializations"))
 ):
-    await verify_permission("manage_specializations", current_user)
     try:
         with db.transaction() as conn:
             with conn.cursor() as cursor:
@@ -111,14 +109,13 @@ async def create_specialization(
 
 @router.get("/audit-logs")
 async def get_audit_logs(
-    current_user: Dict = Depends(get_current_user),
+    current_user: Dict = Depends(verify_permission("view_audit_logs")),
     event_type: str = None,
     start_date: str = None,
     end_date: str = None,
     user_id: int = None,
     limit: int = 100
 ) -> List[Dict]:
-    await verify_permission("view_audit_logs", current_user)
     try:
         with db.get_db() as conn:
             with conn.cursor() as cursor:
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Response
 from app.config.database import db
-from ..deps import get_current_user, get_current_admin, get_current_doctor
+from ..deps import get_current_user, get_current_admin, get_current_doctor, get_request_db
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 import logging
 from datetime import datetime, date, time
+from app.services.availability import availability_index
+from app.services.booking import SlotUnavailable, abook_slot, aclaim_slot
+from app.services.appointments import APPOINTMENT_STATUSES, build_list_query, decode_cursor, page, parse_fields
 
 # Create schemas for appointment operations
 class AppointmentBase(BaseModel):
@@ -53,7 +56,8 @@ async def create_appointment(
             "priority_flag": False
         }
     ), 
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
 ):
     """
     Create a new appointment.
@@ -61,96 +65,38 @@ async def create_appointment(
     - If the current user is a patient, the appointment will be created for them
     - If the current user is a doctor or admin, they can create appointments for any patient
     
-    The time slot must be available.
+    The time slot must be available. The slot is claimed with a conditional
+    update, so of several concurrent bookings of one slot exactly one wins.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
-            # Check if the slot is available
-            cursor.execute(
-                """
-                SELECT * FROM TIMESLOTS
-                WHERE slot_id = %s AND is_available = TRUE
-                """,
-                (data.slot_id,)
+    # Get patient_id
+    if current_user["role_name"] == "patient":
+        patient_id = current_user.get("patient_id")
+        if patient_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Patient record not found for current user"
             )
-            slot = cursor.fetchone()
-            
-            if not slot:
+    else:
+        if data.patient_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="patient_id is required when creating an appointment as a doctor or admin"
+            )
+        patient_id = data.patient_id
+    
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
+            try:
+                appointment_id = await abook_slot(
+                    cursor, data.slot_id, patient_id, data.notes, data.priority_flag or False
+                )
+            except SlotUnavailable:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Selected time slot is not available"
                 )
-            
-            # Get patient_id
-            if current_user["role_name"] == "patient":
-                cursor.execute(
-                    "SELECT patient_id FROM PATIENTS WHERE user_id = %s",
-                    (current_user["user_id"],)
-                )
-                patient = cursor.fetchone()
-                if not patient:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail="Patient record not found for current user"
-                    )
-                patient_id = patient["patient_id"]
-            else:
-                if data.patient_id is None:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="patient_id is required when creating an appointment as a doctor or admin"
-                    )
-                patient_id = data.patient_id
-            
-            # Get doctor_id from slot
-            cursor.execute(
-                """
-                SELECT dc.doctor_id
-                FROM TIMESLOTS ts
-                JOIN DOCTOR_CALENDAR dc ON ts.calendar_id = dc.calendar_id
-                WHERE ts.slot_id = %s
-                """,
-                (data.slot_id,)
-            )
-            doctor_info = cursor.fetchone()
-            if not doctor_info:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Doctor information not found for this time slot"
-                )
-            doctor_id = doctor_info["doctor_id"]
-            
-            # Create appointment
-            cursor.execute(
-                """
-                INSERT INTO APPOINTMENTS (
-                    patient_id, doctor_id, slot_id,
-                    appointment_date, status, notes,
-                    priority_flag
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    patient_id,
-                    doctor_id,
-                    data.slot_id,
-                    slot["start_time"],
-                    "Scheduled",
-                    data.notes,
-                    data.priority_flag or False
-                )
-            )
-            
-            appointment_id = cursor.lastrowid
-            
-            # Mark slot as unavailable
-            cursor.execute(
-                """
-                UPDATE TIMESLOTS
-                SET is_available = FALSE
-                WHERE slot_id = %s
-                """,
-                (data.slot_id,)
-            )
+    
+    availability_index.mark(data.slot_id, False)
     
     return {
         "appointment_id": appointment_id,
@@ -160,99 +106,106 @@ async def create_appointment(
 @router.get("/", 
             response_model=List[Dict],
             summary="Get user appointments",
-            description="Retrieve all appointments for the current user (patient or doctor)")
-async def get_appointments(current_user: Dict = Depends(get_current_user)):
+            description="Retrieve appointments for the current user (patient or doctor), newest first, one page at a time")
+async def get_appointments(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
+):
     """
-    Get all appointments for the current user.
+    Get appointments for the current user.
     
-    - If the user is a patient, returns all their appointments
-    - If the user is a doctor, returns all appointments where they are the doctor
+    - If the user is a patient, returns their appointments
+    - If the user is a doctor, returns appointments where they are the doctor
     - If the user is an admin, returns all appointments
+    
+    Parameters:
+    - limit: Page size
+    - cursor: Value of the X-Next-Cursor header of the previous page
+    - status: Scheduled, Completed or Cancelled
+    - date_from, date_to: Appointment date range (format: YYYY-MM-DD), inclusive
+    - doctor_id, patient_id: Only appointments of this doctor or patient
+    - fields: Comma-separated columns to return, e.g. appointment_id,appointment_date,status
+    
+    Pages are ordered by (appointment_date, appointment_id) descending. The
+    X-Next-Cursor response header is set when another page follows.
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            if current_user["role_name"] == "admin":
-                # Admins can see all appointments
-                cursor.execute(
-                    """
-                    SELECT a.*, 
-                           p.user_id as patient_user_id,
-                           pu.first_name as patient_first_name,
-                           pu.last_name as patient_last_name,
-                           d.user_id as doctor_user_id,
-                           du.first_name as doctor_first_name,
-                           du.last_name as doctor_last_name,
-                           ts.start_time, ts.end_time
-                    FROM APPOINTMENTS a
-                    JOIN PATIENTS p ON a.patient_id = p.patient_id
-                    JOIN USERS pu ON p.user_id = pu.user_id
-                    JOIN DOCTORS d ON a.doctor_id = d.doctor_id
-                    JOIN USERS du ON d.user_id = du.user_id
-                    JOIN TIMESLOTS ts ON a.slot_id = ts.slot_id
-                    ORDER BY a.appointment_date DESC
-                    """
-                )
-            elif current_user["role_name"] == "doctor":
-                # Doctors see their own appointments
-                cursor.execute(
-                    """
-                    SELECT a.*, 
-                           p.user_id as patient_user_id,
-                           pu.first_name as patient_first_name,
-                           pu.last_name as patient_last_name,
-                           ts.start_time, ts.end_time
-                    FROM APPOINTMENTS a
-                    JOIN PATIENTS p ON a.patient_id = p.patient_id
-                    JOIN USERS pu ON p.user_id = pu.user_id
-                    JOIN DOCTORS d ON a.doctor_id = d.doctor_id
-                    JOIN TIMESLOTS ts ON a.slot_id = ts.slot_id
-                    WHERE d.user_id = %s
-                    ORDER BY a.appointment_date DESC
-                    """,
-                    (current_user["user_id"],)
-                )
-            else:
-                # Patients see their own appointments
-                cursor.execute(
-                    """
-                    SELECT a.*, 
-                           d.user_id as doctor_user_id,
-                           du.first_name as doctor_first_name,
-                           du.last_name as doctor_last_name,
-                           dep.department_name,
-                           ts.start_time, ts.end_time
-                    FROM APPOINTMENTS a
-                    JOIN PATIENTS p ON a.patient_id = p.patient_id
-                    JOIN DOCTORS d ON a.doctor_id = d.doctor_id
-                    JOIN USERS du ON d.user_id = du.user_id
-                    JOIN DEPARTMENTS dep ON d.department_id = dep.department_id
-                    JOIN TIMESLOTS ts ON a.slot_id = ts.slot_id
-                    WHERE p.user_id = %s
-                    ORDER BY a.appointment_date DESC
-                    """,
-                    (current_user["user_id"],)
-                )
-            
-            appointments = cursor.fetchall()
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        projection = parse_fields(fields)
+        first_day = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else None
+        last_day = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid parameter: {str(e)}. Use YYYY-MM-DD for dates"
+        )
+    
+    if status_filter is not None and status_filter not in APPOINTMENT_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status. Use one of: {', '.join(APPOINTMENT_STATUSES)}"
+        )
+    
+    # Admins see all appointments, doctors and patients only their own
+    scope_doctor_id = scope_patient_id = None
+    if current_user["role_name"] == "doctor":
+        scope_doctor_id = current_user.get("doctor_id")
+        if scope_doctor_id is None:
+            return []
+    elif current_user["role_name"] != "admin":
+        scope_patient_id = current_user.get("patient_id")
+        if scope_patient_id is None:
+            return []
     
+    query, params = build_list_query(
+        current_user["role_name"],
+        fields=projection,
+        scope_doctor_id=scope_doctor_id,
+        scope_patient_id=scope_patient_id,
+        status=status_filter,
+        date_from=first_day,
+        date_to=last_day,
+        doctor_id=doctor_id,
+        patient_id=patient_id,
+        after=after,
+        limit=limit + 1
+    )
+    
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as db_cursor:
+            await db_cursor.execute(query, params)
+            rows = await db_cursor.fetchall()
+    
+    appointments, next_cursor = page(list(rows), limit, projection)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return appointments
 
 @router.get("/{appointment_id}", 
             response_model=Dict,
             summary="Get appointment details",
             description="Retrieve detailed information about a specific appointment")
-async def get_appointment(appointment_id: int, current_user: Dict = Depends(get_current_user)):
+async def get_appointment(appointment_id: int, current_user: Dict = Depends(get_current_user), conn=Depends(get_request_db)):
     """
     Get a specific appointment by ID.
     
     Users can only access appointments where they are either the patient or the doctor,
     unless they are an admin.
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as cursor:
             if current_user["role_name"] == "admin":
                 # Admins can see any appointment
-                cursor.execute(
+                await cursor.execute(
                     """
                     SELECT a.*, 
                            p.user_id as patient_user_id,
@@ -276,7 +229,7 @@ async def get_appointment(appointment_id: int, current_user: Dict = Depends(get_
                 )
             else:
                 # Regular users can only see their own appointments
-                cursor.execute(
+                await cursor.execute(
                     """
                     SELECT a.*, 
                            p.user_id as patient_user_id,
@@ -300,7 +253,7 @@ async def get_appointment(appointment_id: int, current_user: Dict = Depends(get_
                     (appointment_id, current_user["user_id"], current_user["user_id"])
                 )
             
-            appointment = cursor.fetchone()
+            appointment = await cursor.fetchone()
             
             if not appointment:
                 raise HTTPException(
@@ -323,7 +276,8 @@ async def update_appointment(
             "priority_flag": True
         }
     ), 
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
 ):
     """
     Update an appointment.
@@ -334,10 +288,10 @@ async def update_appointment(
     
     When changing the time slot, the new slot must be available.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Get the appointment
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT a.*, p.user_id as patient_user_id, d.user_id as doctor_user_id
                 FROM APPOINTMENTS a
@@ -347,7 +301,7 @@ async def update_appointment(
                 """,
                 (appointment_id,)
             )
-            appointment = cursor.fetchone()
+            appointment = await cursor.fetchone()
             
             if not appointment:
                 raise HTTPException(
@@ -384,22 +338,21 @@ async def update_appointment(
                 params.append(data.priority_flag)
             
             if data.slot_id is not None and data.slot_id != appointment["slot_id"]:
-                # Check if new slot is available
-                cursor.execute(
-                    """
-                    SELECT * FROM TIMESLOTS
-                    WHERE slot_id = %s AND is_available = TRUE
-                    """,
-                    (data.slot_id,)
-                )
-                new_slot = cursor.fetchone()
-                
-                if not new_slot:
+                # Claim the new slot first so a concurrent booking cannot take it too
+                try:
+                    await aclaim_slot(cursor, data.slot_id)
+                except SlotUnavailable:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="Selected time slot is not available"
                     )
                 
+                await cursor.execute(
+                    "SELECT start_time FROM TIMESLOTS WHERE slot_id = %s",
+                    (data.slot_id,)
+                )
+                new_slot = await cursor.fetchone()
+                
                 # Update appointment date
                 update_fields.append("appointment_date = %s")
                 params.append(new_slot["start_time"])
@@ -409,7 +362,7 @@ async def update_appointment(
                 params.append(data.slot_id)
                 
                 # Mark old slot as available
-                cursor.execute(
+                await cursor.execute(
                     """
                     UPDATE TIMESLOTS
                     SET is_available = TRUE
@@ -417,16 +370,6 @@ async def update_appointment(
                     """,
                     (appointment["slot_id"],)
                 )
-                
-                # Mark new slot as unavailable
-                cursor.execute(
-                    """
-                    UPDATE TIMESLOTS
-                    SET is_available = FALSE
-                    WHERE slot_id = %s
-                    """,
-                    (data.slot_id,)
-                )
             
             if update_fields:
                 # Add updated_at timestamp
@@ -435,7 +378,7 @@ async def update_appointment(
                 # Add appointment_id to params
                 params.append(appointment_id)
                 
-                cursor.execute(
+                await cursor.execute(
                     f"""
                     UPDATE APPOINTMENTS
                     SET {", ".join(update_fields)}
@@ -444,6 +387,10 @@ async def update_appointment(
                     params
                 )
     
+    if data.slot_id is not None and data.slot_id != appointment["slot_id"]:
+        availability_index.mark(appointment["slot_id"], True)
+        availability_index.mark(data.slot_id, False)
+    
     return {"message": "Appointment updated successfully"}
 
 @router.delete("/{appointment_id}", 
@@ -452,7 +399,8 @@ async def update_appointment(
                description="Cancel an existing appointment and free up the time slot")
 async def cancel_appointment(
     appointment_id: int,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
 ):
     """
     Cancel an appointment.
@@ -463,10 +411,10 @@ async def cancel_appointment(
     
     This will mark the appointment as cancelled and make the time slot available again.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Get the appointment first to check permissions and get the slot_id
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT a.*, p.user_id as patient_user_id, d.user_id as doctor_user_id
                 FROM APPOINTMENTS a
@@ -476,7 +424,7 @@ async def cancel_appointment(
                 """,
                 (appointment_id,)
             )
-            appointment = cursor.fetchone()
+            appointment = await cursor.fetchone()
             
             if not appointment:
                 raise HTTPException(
@@ -497,7 +445,7 @@ async def cancel_appointment(
                 )
             
             # Update appointment status
-            cursor.execute(
+            await cursor.execute(
                 """
                 UPDATE APPOINTMENTS
                 SET status = 'Cancelled', updated_at = NOW()
@@ -507,7 +455,7 @@ async def cancel_appointment(
             )
             
             # Make the time slot available again
-            cursor.execute(
+            await cursor.execute(
                 """
                 UPDATE TIMESLOTS
                 SET is_available = TRUE
@@ -516,4 +464,6 @@ async def cancel_appointment(
                 (appointment["slot_id"],)
             )
     
+    availability_index.mark(appointment["slot_id"], True)
+    
     return {"message": "Appointment cancelled successfully"} 
\ No newline at end of file
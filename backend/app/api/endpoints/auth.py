@@ -3,6 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta, date
 from app.config.database import db
 from app.utils import security
+from app.api.deps import oauth2_scheme
 from typing import Dict, Optional, Union
 from pydantic import BaseModel, EmailStr
 import logging
@@ -96,7 +97,7 @@ async def login(
             )
             user = cursor.fetchone()
     
-    if not user or not security.verify_password(password, user["password"]):
+    if not user or not await security.averify_password(password, user["password"]):
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password"
@@ -152,7 +153,7 @@ async def login_json(request_data: dict = Body(...)):
             )
             user = cursor.fetchone()
     
-    if not user or not security.verify_password(password, user["password"]):
+    if not user or not await security.averify_password(password, user["password"]):
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password"
@@ -226,7 +227,7 @@ async def json_login(request_data: dict = Body(...)):
             )
             user = cursor.fetchone()
     
-    if not user or not security.verify_password(password, user["password"]):
+    if not user or not await security.averify_password(password, user["password"]):
         raise HTTPException(
             status_code=401,
             detail="Invalid email or password"
@@ -251,11 +252,39 @@ async def json_login(request_data: dict = Body(...)):
         }
     }
 
+@router.post("/logout", response_model=Dict)
+async def logout(token: str = Depends(oauth2_scheme)):
+    """
+    Revoke the current access token. It is rejected by every worker from then
+    on (within REVOCATION_SYNC_INTERVAL seconds on other workers).
+    """
+    if security.verify_token(token) is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid authentication token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    security.security.blacklist_token(token)
+    return {"message": "Logged out successfully"}
+
 @router.post("/signup", response_model=Dict)
 async def signup(user_data: UserSignup):
     """
     Register a new user with patient role and create a patient record.
     """
+    # Hash on the worker pool before taking a connection, so the slow bcrypt
+    # call neither blocks the event loop nor holds a pooled connection
+    try:
+        hashed_password = await security.aget_password_hash(user_data.password)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Password hashing error: {str(e)}")
+        # Fallback to a simple hash if bcrypt fails
+        import hashlib
+        hashed_password = hashlib.sha256(user_data.password.encode()).hexdigest()
+    
     # Use transaction to ensure changes are committed
     with db.transaction() as conn:
         with conn.cursor() as cursor:
@@ -292,15 +321,6 @@ async def signup(user_data: UserSignup):
                     detail="Email already registered"
                 )
             
-            try:
-                # Hash the password - with error handling
-                hashed_password = security.get_password_hash(user_data.password)
-            except Exception as e:
-                logger.error(f"Password hashing error: {str(e)}")
-                # Fallback to a simple hash if bcrypt fails
-                import hashlib
-                hashed_password = hashlib.sha256(user_data.password.encode()).hexdigest()
-            
             # Insert new user with patient role
             cursor.execute(
                 """
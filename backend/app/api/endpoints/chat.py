@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 from datetime import datetime
 import logging
-from ..deps import get_current_user
+from ..deps import get_current_user, get_request_db
 from ...config.database import db
-import json
+from app.services.chat import amark_page_read, amark_read, arecord_message, build_contacts_query, build_history_query
+from app.services.chat_writer import message_writer
+from app.services.pubsub import bus as pubsub_bus
+from app.services.websockets import SocketManager
 
 # Initialize router
 router = APIRouter()
@@ -37,13 +40,6 @@ class ContactResponse(BaseModel):
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
 
-# Add this helper function to handle datetime serialization
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
 # Add this helper function to convert database rows to JSON-serializable dicts
 def serialize_db_row(row):
     if not row:
@@ -55,141 +51,101 @@ def serialize_db_row(row):
     return result
 
 # WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-        logger.info(f"User {user_id} connected to WebSocket. Total connections: {len(self.active_connections)}")
+class ConnectionManager(SocketManager):
+    """
+    Chat sockets of the users connected to this worker. A socket that falls
+    WS_SEND_QUEUE_SIZE messages behind is closed; the client reconnects and
+    reloads the history it missed.
+    """
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-            logger.info(f"User {user_id} disconnected from WebSocket. Remaining users: {len(self.active_connections)}")
+    def __init__(self, bus=pubsub_bus):
+        super().__init__("medihub:chat", bus, policy="evict")
 
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    # Serialize the message with our custom encoder
-                    serialized_message = json.loads(json.dumps(message, cls=DateTimeEncoder))
-                    await connection.send_json(serialized_message)
-                except Exception as e:
-                    logger.error(f"Error sending message to user {user_id}: {str(e)}")
+        """Send to every socket of the user, on whichever worker they are connected."""
+        await self.publish(user_id, message)
 
 # Create connection manager instance
 manager = ConnectionManager()
 
 @router.get("/contacts", response_model=List[ContactResponse])
-async def get_contacts(current_user: Dict = Depends(get_current_user)):
+async def get_contacts(
+    conversations_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
+):
     """
     Get a list of users the current user has chatted with or can chat with.
+    
+    Parameters:
+    - conversations_only: Only users with messages either way, most recent first
+    - limit, offset: The page; without conversations_only users are ordered by name
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            # Get all users except current user
-            cursor.execute(
-                """
-                SELECT u.user_id, u.first_name, u.last_name, u.email
-                FROM users u
-                WHERE u.user_id != %s
-                ORDER BY u.first_name, u.last_name
-                """,
-                (current_user["user_id"],)
-            )
-            contacts = cursor.fetchall()
-            
-            # For each contact, get unread count and last message
-            for contact in contacts:
-                # Get unread count
-                cursor.execute(
-                    """
-                    SELECT COUNT(*) as unread_count
-                    FROM chat_messages
-                    WHERE sender_id = %s AND receiver_id = %s AND read_status = FALSE
-                    """,
-                    (contact["user_id"], current_user["user_id"])
-                )
-                unread_result = cursor.fetchone()
-                contact["unread_count"] = unread_result["unread_count"] if unread_result else 0
-                
-                # Get last message
-                cursor.execute(
-                    """
-                    SELECT message, sent_at
-                    FROM chat_messages
-                    WHERE (sender_id = %s AND receiver_id = %s)
-                       OR (sender_id = %s AND receiver_id = %s)
-                    ORDER BY sent_at DESC
-                    LIMIT 1
-                    """,
-                    (current_user["user_id"], contact["user_id"], 
-                     contact["user_id"], current_user["user_id"])
-                )
-                last_message = cursor.fetchone()
-                if last_message:
-                    contact["last_message"] = last_message["message"]
-                    contact["last_message_time"] = last_message["sent_at"]
+    query, params = build_contacts_query(current_user["user_id"], conversations_only, limit, offset)
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            contacts = await cursor.fetchall()
     
     return contacts
 
 @router.get("/messages", response_model=List[MessageResponse])
-async def get_messages(contact_id: int, current_user: Dict = Depends(get_current_user)):
+async def get_messages(
+    contact_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
+):
     """
-    Get all messages between the current user and a specific contact.
+    Get messages between the current user and a specific contact, newest first.
+    
+    Parameters:
+    - before: Load older history; the smallest message_id of the last page
+    - after: Load newer messages; the largest message_id already shown
+    - limit: Page size
+    
+    Unread messages from the contact on the returned page are marked as read.
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT message_id, sender_id, receiver_id, message, message_type,
-                       sent_at, read_status, is_urgent
-                FROM chat_messages
-                WHERE (sender_id = %s AND receiver_id = %s)
-                   OR (sender_id = %s AND receiver_id = %s)
-                ORDER BY sent_at ASC
-                """,
-                (current_user["user_id"], contact_id, contact_id, current_user["user_id"])
-            )
-            messages = cursor.fetchall()
-            
-            # Mark messages from contact as read
-            cursor.execute(
-                """
-                UPDATE chat_messages
-                SET read_status = TRUE
-                WHERE sender_id = %s AND receiver_id = %s AND read_status = FALSE
-                """,
-                (contact_id, current_user["user_id"])
-            )
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before or after, not both"
+        )
+    
+    query, params = build_history_query(current_user["user_id"], contact_id, before, after, limit)
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            messages = list(await cursor.fetchall())
+            await amark_page_read(cursor, current_user["user_id"], contact_id, messages)
     
+    if after is not None:
+        messages.reverse()
     return messages
 
 @router.post("/send", response_model=MessageResponse)
-async def send_message(message: MessageCreate, current_user: Dict = Depends(get_current_user)):
+async def send_message(message: MessageCreate, current_user: Dict = Depends(get_current_user), conn=Depends(get_request_db)):
     """
     Send a new message to another user.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Verify receiver exists
-            cursor.execute(
+            await cursor.execute(
                 "SELECT user_id FROM users WHERE user_id = %s",
                 (message.receiver_id,)
             )
-            if not cursor.fetchone():
+            if not await cursor.fetchone():
                 raise HTTPException(status_code=404, detail="Recipient not found")
             
             now = datetime.now()
             
             # Insert the message
-            cursor.execute(
+            await cursor.execute(
                 """
                 INSERT INTO chat_messages (
                     sender_id, receiver_id, message, sent_at,
@@ -209,9 +165,10 @@ async def send_message(message: MessageCreate, current_user: Dict = Depends(get_
             
             # Get the message ID
             message_id = cursor.lastrowid
+            await arecord_message(cursor, current_user["user_id"], message.receiver_id, message_id, now)
             
             # Fetch the complete message data
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT message_id, sender_id, receiver_id, message, message_type,
                        sent_at, read_status, is_urgent
@@ -221,64 +178,65 @@ async def send_message(message: MessageCreate, current_user: Dict = Depends(get_
                 (message_id,)
             )
             
-            new_message_row = cursor.fetchone()
+            new_message_row = await cursor.fetchone()
             new_message = serialize_db_row(new_message_row)
-            
-            # Send message via WebSocket if recipient is connected
-            if message.receiver_id in manager.active_connections:
-                await manager.send_personal_message(
-                    {
-                        "type": "chat_message",
-                        "data": new_message
-                    },
-                    message.receiver_id
-                )
-                logger.info(f"Message sent to recipient {message.receiver_id} via WebSocket")
+    
+    # Push to the recipient's sockets, on whichever worker they are connected,
+    # once the message has been committed
+    await manager.send_personal_message(
+        {
+            "type": "chat_message",
+            "data": new_message
+        },
+        message.receiver_id
+    )
     
     return new_message
 
 @router.put("/messages/{message_id}/read", response_model=Dict)
-async def mark_message_read(message_id: int, current_user: Dict = Depends(get_current_user)):
+async def mark_message_read(message_id: int, current_user: Dict = Depends(get_current_user), conn=Depends(get_request_db)):
     """
     Mark a message as read.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Verify message exists and is sent to current user
-            cursor.execute(
+            await cursor.execute(
                 """
-                SELECT message_id
+                SELECT message_id, sender_id
                 FROM chat_messages
                 WHERE message_id = %s AND receiver_id = %s
                 """,
                 (message_id, current_user["user_id"])
             )
-            if not cursor.fetchone():
+            found = await cursor.fetchone()
+            if not found:
                 raise HTTPException(
                     status_code=404,
                     detail="Message not found or you don't have permission to mark it as read"
                 )
             
             # Mark as read
-            cursor.execute(
+            await cursor.execute(
                 """
                 UPDATE chat_messages
                 SET read_status = TRUE
-                WHERE message_id = %s
+                WHERE message_id = %s AND read_status = FALSE
                 """,
                 (message_id,)
             )
+            await amark_read(cursor, current_user["user_id"], found["sender_id"], cursor.rowcount)
     
     return {"status": "success"}
 
 @router.put("/messages/read-all", response_model=Dict)
-async def mark_all_messages_read(sender_id: int, current_user: Dict = Depends(get_current_user)):
+async def mark_all_messages_read(sender_id: int, current_user: Dict = Depends(get_current_user), conn=Depends(get_request_db)):
     """
     Mark all messages from a specific sender as read.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 UPDATE chat_messages
                 SET read_status = TRUE
@@ -286,6 +244,7 @@ async def mark_all_messages_read(sender_id: int, current_user: Dict = Depends(ge
                 """,
                 (sender_id, current_user["user_id"])
             )
+            await amark_read(cursor, current_user["user_id"], sender_id, cursor.rowcount)
     
     return {"status": "success"}
 
@@ -306,7 +265,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str):
             return
         
         # Connect to websocket
-        await manager.connect(websocket, user_id)
+        sender = await manager.connect(websocket, user_id)
         logger.info(f"User {user_id} connected to WebSocket")
         
         try:
@@ -319,55 +278,27 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str):
                 message_type = data.get("type")
                 
                 if message_type == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    sender.send({"type": "pong"})
                     continue
                 
                 elif message_type == "chat_message":
                     # Verify required fields
                     if not all(key in data for key in ["receiver_id", "message"]):
-                        await websocket.send_json({
+                        sender.send({
                             "type": "error",
                             "message": "Invalid message format"
                         })
                         continue
                     
                     try:
-                        # Insert message into database
-                        with db.transaction() as conn:
-                            with conn.cursor() as cursor:
-                                now = datetime.now()
-                                cursor.execute(
-                                    """
-                                    INSERT INTO chat_messages (
-                                        sender_id, receiver_id, message, sent_at,
-                                        is_urgent, read_status, message_type
-                                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                                    """,
-                                    (
-                                        user_id,
-                                        data["receiver_id"],
-                                        data["message"],
-                                        now,
-                                        data.get("is_urgent", False),
-                                        False,
-                                        data.get("message_type", "Text")
-                                    )
-                                )
-                                message_id = cursor.lastrowid
-                                
-                                # Fetch the complete message
-                                cursor.execute(
-                                    """
-                                    SELECT message_id, sender_id, receiver_id, message, message_type,
-                                           sent_at, read_status, is_urgent
-                                    FROM chat_messages
-                                    WHERE message_id = %s
-                                    """,
-                                    (message_id,)
-                                )
-                                new_message_row = cursor.fetchone()
-                                # Convert to a serializable dict
-                                new_message = serialize_db_row(new_message_row)
+                        # Stored with the next batch; returns once committed
+                        new_message = await message_writer.submit(
+                            user_id,
+                            int(data["receiver_id"]),
+                            data["message"],
+                            data.get("is_urgent", False),
+                            data.get("message_type", "Text")
+                        )
                         
                         # Prepare message data for WebSocket
                         message_data = {
@@ -375,32 +306,30 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str):
                             "data": new_message
                         }
                         
-                        # Send to receiver if they're connected
+                        # Send to the receiver's sockets, on whichever worker they are connected
                         receiver_id = int(data["receiver_id"])
-                        if receiver_id in manager.active_connections:
-                            await manager.send_personal_message(
-                                message_data,
-                                receiver_id
-                            )
-                            logger.info(f"Message sent to receiver {receiver_id}")
-                        else:
-                            logger.info(f"Receiver {receiver_id} not connected, message saved to database only")
+                        await manager.send_personal_message(
+                            message_data,
+                            receiver_id
+                        )
                         
                         # Send confirmation back to sender
-                        await websocket.send_json(message_data)
+                        sender.send(message_data)
                         
                         logger.info(f"Message sent from {user_id} to {data['receiver_id']}")
                     
                     except Exception as e:
                         logger.error(f"Error processing message: {str(e)}")
-                        await websocket.send_json({
+                        sender.send({
                             "type": "error",
                             "message": f"Error processing message: {str(e)}"
                         })
                 
         except WebSocketDisconnect:
             logger.info(f"User {user_id} disconnected from WebSocket")
-            manager.disconnect(websocket, user_id)
+        finally:
+            # Also stops the writer of a socket that failed or was evicted
+            await manager.disconnect(websocket, user_id)
             
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
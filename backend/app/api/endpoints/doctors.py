@@ -8,6 +8,9 @@ from datetime import datetime, timedelta, time
 from app.schemas.doctor import DoctorCreate, DoctorResponse, DoctorUpdate
 from app.schemas.user import UserCreate
 from app.utils.security import security
+from app.services.timeslots import generate_candidates, create_slots, lock_calendar
+from app.services.availability import availability_index
+from app.services.schedule import RESET_MATERIALIZATION_QUERY, schedule_materializer
 
 # Create schemas for doctor calendar operations
 class CalendarCreate(BaseModel):
@@ -18,6 +21,7 @@ class TimeSlotCreate(BaseModel):
     start_hour: int = Field(9, description="Hour to start creating slots (24-hour format)")
     end_hour: int = Field(17, description="Hour to end creating slots (24-hour format)")
     duration_minutes: int = Field(30, description="Duration of each slot in minutes")
+    dry_run: bool = Field(False, description="Only report which slots would be created")
 
 class BulkTimeSlotCreate(BaseModel):
     start_date: str
@@ -27,6 +31,7 @@ class BulkTimeSlotCreate(BaseModel):
     slot_duration_minutes: int = 30
     weekdays: List[int] = Field([0, 1, 2, 3, 4], description="Days of week (0=Monday, 6=Sunday)")
     exclude_dates: List[str] = Field([], description="Dates to exclude (format: YYYY-MM-DD)")
+    dry_run: bool = Field(False, description="Only report which slots would be created")
 
 # Create schemas for doctor schedule operations
 class ScheduleTimeSlot(BaseModel):
@@ -273,103 +278,58 @@ async def create_doctor_timeslots(
             detail="Not authorized to create timeslots for this doctor"
         )
     
+    # Parse date
+    try:
+        date_obj = datetime.strptime(data.date, "%Y-%m-%d").date()
+        candidates = generate_candidates(
+            date_obj, date_obj,
+            time(hour=data.start_hour), time(hour=data.end_hour),
+            timedelta(minutes=data.duration_minutes)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid date or hours: {str(e)}. Use YYYY-MM-DD for the date"
+        )
+    
     with db.transaction() as conn:
         with conn.cursor() as cursor:
-            # Get doctor's calendar
-            cursor.execute(
-                """
-                SELECT * FROM DOCTOR_CALENDAR
-                WHERE doctor_id = %s
-                """,
-                (doctor_id,)
-            )
-            calendar = cursor.fetchone()
-            
-            if not calendar:
-                # Create calendar if it doesn't exist
-                cursor.execute(
-                    """
-                    INSERT INTO DOCTOR_CALENDAR (
-                        doctor_id, availability
-                    ) VALUES (%s, %s)
-                    """,
-                    (doctor_id, True)
-                )
-                calendar_id = cursor.lastrowid
-            else:
-                calendar_id = calendar["calendar_id"]
-            
-            # Create time slots
-            created_slots = []
+            calendar_id = lock_calendar(cursor, doctor_id, create=not data.dry_run)
+            created, skipped = create_slots(cursor, calendar_id, candidates, data.dry_run)
             
-            # Parse date
-            try:
-                date_obj = datetime.strptime(data.date, "%Y-%m-%d").date()
-            except ValueError:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid date format. Use YYYY-MM-DD"
-                )
-            
-            start_hour = data.start_hour
-            end_hour = data.end_hour
-            duration_minutes = data.duration_minutes
-            
-            # Create slots for the specified day
-            current_time = datetime.combine(date_obj, time(hour=start_hour))
-            end_time = datetime.combine(date_obj, time(hour=end_hour))
-            
-            while current_time < end_time:
-                slot_end = current_time + timedelta(minutes=duration_minutes)
-                
-                # Check for overlaps
+            created_slots = [
+                {
+                    "start_time": start.strftime("%Y-%m-%d %H:%M:%S"),
+                    "end_time": end.strftime("%Y-%m-%d %H:%M:%S"),
+                    "is_available": True
+                }
+                for start, end in created
+            ]
+            if created and not data.dry_run:
+                # Multi-row inserts only report the first id, so read them back
                 cursor.execute(
                     """
-                    SELECT slot_id
+                    SELECT slot_id, start_time
                     FROM TIMESLOTS
-                    WHERE calendar_id = %s AND (
-                        (start_time <= %s AND end_time > %s) OR
-                        (start_time < %s AND end_time >= %s) OR
-                        (start_time >= %s AND end_time <= %s)
-                    )
+                    WHERE calendar_id = %s AND start_time >= %s AND start_time <= %s
                     """,
-                    (
-                        calendar_id,
-                        current_time, current_time,
-                        slot_end, slot_end,
-                        current_time, slot_end
-                    )
+                    (calendar_id, created[0][0], created[-1][0])
                 )
-                if not cursor.fetchone():
-                    try:
-                        cursor.execute(
-                            """
-                            INSERT INTO TIMESLOTS (
-                                calendar_id, start_time, end_time, is_available
-                            ) VALUES (%s, %s, %s, %s)
-                            """,
-                            (calendar_id, current_time, slot_end, True)
-                        )
-                        
-                        created_slots.append({
-                            "slot_id": cursor.lastrowid,
-                            "start_time": current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                            "end_time": slot_end.strftime("%Y-%m-%d %H:%M:%S"),
-                            "is_available": True
-                        })
-                    except Exception as e:
-                        logger.error(f"Error creating timeslot: {str(e)}")
-                        raise HTTPException(
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail=f"Error creating timeslot: {str(e)}"
-                        )
-                
-                current_time = slot_end
+                slot_ids = {row["start_time"]: row["slot_id"] for row in cursor.fetchall()}
+                for slot, (start, _) in zip(created_slots, created):
+                    slot["slot_id"] = slot_ids.get(start)
+    
+    if created and not data.dry_run:
+        await availability_index.refresh_doctor(doctor_id)
     
+    verb = "Would create" if data.dry_run else "Successfully created"
     return {
         "calendar_id": calendar_id,
         "created_slots": created_slots,
-        "message": f"Successfully created {len(created_slots)} timeslots"
+        "created_count": len(created),
+        "skipped_count": len(skipped),
+        "dry_run": data.dry_run,
+        "message": f"{verb} {len(created)} timeslots"
     }
 
 @router.post("/{doctor_id}/bulk-timeslots", 
@@ -442,9 +402,13 @@ async def create_bulk_doctor_timeslots(
             second=int(end_time_parts[2]) if len(end_time_parts) > 2 else 0
         )
         
-        slot_duration = timedelta(minutes=data.slot_duration_minutes)
-        weekdays = data.weekdays
-        exclude_dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in data.exclude_dates]
+        candidates = generate_candidates(
+            start_date, end_date,
+            start_time_obj, end_time_obj,
+            timedelta(minutes=data.slot_duration_minutes),
+            data.weekdays,
+            [datetime.strptime(d, "%Y-%m-%d").date() for d in data.exclude_dates]
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -453,95 +417,19 @@ async def create_bulk_doctor_timeslots(
     
     with db.transaction() as conn:
         with conn.cursor() as cursor:
-            # Get doctor's calendar
-            cursor.execute(
-                """
-                SELECT * FROM DOCTOR_CALENDAR
-                WHERE doctor_id = %s
-                """,
-                (doctor_id,)
-            )
-            calendar = cursor.fetchone()
-            
-            if not calendar:
-                # Create calendar if it doesn't exist
-                cursor.execute(
-                    """
-                    INSERT INTO DOCTOR_CALENDAR (
-                        doctor_id, availability
-                    ) VALUES (%s, %s)
-                    """,
-                    (doctor_id, True)
-                )
-                calendar_id = cursor.lastrowid
-            else:
-                calendar_id = calendar["calendar_id"]
-            
-            # Create timeslots
-            created_count = 0
-            current_date = start_date
-            
-            while current_date <= end_date:
-                # Skip if not in selected weekdays or in excluded dates
-                if current_date.weekday() not in weekdays or current_date in exclude_dates:
-                    current_date += timedelta(days=1)
-                    continue
-                
-                # Create slots for this day
-                day_start = datetime.combine(current_date, start_time_obj)
-                day_end = datetime.combine(current_date, end_time_obj)
-                
-                slot_start = day_start
-                while slot_start + slot_duration <= day_end:
-                    slot_end = slot_start + slot_duration
-                    
-                    # Check for overlaps
-                    cursor.execute(
-                        """
-                        SELECT slot_id
-                        FROM TIMESLOTS
-                        WHERE calendar_id = %s AND (
-                            (start_time <= %s AND end_time > %s) OR
-                            (start_time < %s AND end_time >= %s) OR
-                            (start_time >= %s AND end_time <= %s)
-                        )
-                        """,
-                        (
-                            calendar_id,
-                            slot_start, slot_start,
-                            slot_end, slot_end,
-                            slot_start, slot_end
-                        )
-                    )
-                    if not cursor.fetchone():
-                        try:
-                            # Create timeslot
-                            cursor.execute(
-                                """
-                                INSERT INTO TIMESLOTS (calendar_id, start_time, end_time, is_available)
-                                VALUES (%s, %s, %s, %s)
-                                """,
-                                (
-                                    calendar_id,
-                                    slot_start,
-                                    slot_end,
-                                    True
-                                )
-                            )
-                            created_count += 1
-                        except Exception as e:
-                            logger.error(f"Error creating timeslot: {str(e)}")
-                            # Continue with other slots instead of failing completely
-                            pass
-                    
-                    slot_start = slot_end
-                
-                current_date += timedelta(days=1)
+            calendar_id = lock_calendar(cursor, doctor_id, create=not data.dry_run)
+            created, skipped = create_slots(cursor, calendar_id, candidates, data.dry_run)
+    
+    if created and not data.dry_run:
+        await availability_index.refresh_doctor(doctor_id)
     
+    verb = "Would create" if data.dry_run else "Successfully created"
     return {
         "calendar_id": calendar_id,
-        "created_count": created_count,
-        "message": f"Successfully created {created_count} timeslots"
+        "created_count": len(created),
+        "skipped_count": len(skipped),
+        "dry_run": data.dry_run,
+        "message": f"{verb} {len(created)} timeslots"
     }
 
 @router.post("/{doctor_id}/schedule", 
@@ -696,11 +584,16 @@ async def create_doctor_schedule(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail=f"Error creating schedule slot: {str(e)}"
                     )
+            
+            # Regenerate the doctor's timeslot window from the new rules
+            cursor.execute(RESET_MATERIALIZATION_QUERY, (doctor_id,))
+    
+    schedule_materializer.wake()
     
     return {
         "doctor_id": doctor_id,
         "created_slots": created_slots,
-        "message": f"Successfully created {len(created_slots)} schedule slots"
+        "message": f"Successfully created {len(created_slots)} schedule slots; timeslots are generated in the background"
     }
 
 @router.post("/", response_model=DoctorResponse)
@@ -0,0 +1,174 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from ..deps import get_current_user, get_current_admin, get_request_db
+from typing import Dict, List, Optional
+import logging
+from datetime import datetime, timedelta
+from app.services.appointments import APPOINTMENT_STATUSES, build_list_query, parse_fields
+from app.services.exports import get_encoder, stream_query
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _parse_date(value: Optional[str]):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+def _date_conditions(column: str, date_from: Optional[str], date_to: Optional[str], conditions: List[str], params: List):
+    # Dates are inclusive, so the range ends before the day after date_to
+    first_day, last_day = _parse_date(date_from), _parse_date(date_to)
+    if first_day:
+        conditions.append(f"{column} >= %s")
+        params.append(first_day)
+    if last_day:
+        conditions.append(f"{column} < %s")
+        params.append(last_day + timedelta(days=1))
+
+def _export(name: str, query: str, params: List, encoder, conn) -> StreamingResponse:
+    # The stream runs on the request connection, which is released once the
+    # response has been sent, so an export never holds two connections
+    return StreamingResponse(
+        stream_query(query, params, encoder, conn=conn),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{encoder.extension}"'}
+    )
+
+def _bad_request(e: ValueError):
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid parameter: {str(e)}. Use YYYY-MM-DD for dates"
+    )
+
+@router.get("/appointments",
+            summary="Export appointments",
+            description="Stream appointments as NDJSON or CSV, newest first")
+async def export_appointments(
+    format: str = "ndjson",
+    status_filter: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
+):
+    """
+    Export appointments.
+
+    Takes the filters and field projection of GET /appointments without
+    pagination. Admins export all appointments, doctors and patients their own.
+    """
+    try:
+        encoder = get_encoder(format)
+        projection = parse_fields(fields)
+        first_day, last_day = _parse_date(date_from), _parse_date(date_to)
+    except ValueError as e:
+        raise _bad_request(e)
+
+    if status_filter is not None and status_filter not in APPOINTMENT_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status. Use one of: {', '.join(APPOINTMENT_STATUSES)}"
+        )
+
+    # Ids start at 1, so a user without a doctor or patient record exports nothing
+    scope_doctor_id = scope_patient_id = None
+    if current_user["role_name"] == "doctor":
+        scope_doctor_id = current_user.get("doctor_id") or 0
+    elif current_user["role_name"] != "admin":
+        scope_patient_id = current_user.get("patient_id") or 0
+
+    query, params = build_list_query(
+        current_user["role_name"],
+        fields=projection,
+        scope_doctor_id=scope_doctor_id,
+        scope_patient_id=scope_patient_id,
+        status=status_filter,
+        date_from=first_day,
+        date_to=last_day,
+        doctor_id=doctor_id,
+        patient_id=patient_id
+    )
+    return _export("appointments", query, params, encoder, conn)
+
+@router.get("/medical-records",
+            summary="Export medical records",
+            description="Stream medical records as NDJSON or CSV, oldest first")
+async def export_medical_records(
+    format: str = "ndjson",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
+):
+    """
+    Export medical records.
+
+    Admins export all records, doctors the records they wrote and patients
+    their own. date_from and date_to filter on created_at, inclusive.
+    """
+    conditions, params = [], []
+    try:
+        encoder = get_encoder(format)
+        _date_conditions("mr.created_at", date_from, date_to, conditions, params)
+    except ValueError as e:
+        raise _bad_request(e)
+
+    if current_user["role_name"] == "doctor":
+        conditions.append("mr.doctor_id = %s")
+        params.append(current_user.get("doctor_id") or 0)
+    elif current_user["role_name"] != "admin":
+        conditions.append("mr.patient_id = %s")
+        params.append(current_user.get("patient_id") or 0)
+
+    if doctor_id is not None:
+        conditions.append("mr.doctor_id = %s")
+        params.append(doctor_id)
+    if patient_id is not None:
+        conditions.append("mr.patient_id = %s")
+        params.append(patient_id)
+
+    query = "SELECT mr.* FROM MEDICAL_RECORDS mr"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY mr.record_id"
+    return _export("medical_records", query, params, encoder, conn)
+
+@router.get("/audit-logs",
+            summary="Export audit logs",
+            description="Stream audit logs as NDJSON or CSV, oldest first (admin only)")
+async def export_audit_logs(
+    format: str = "ndjson",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    actor_id: Optional[int] = None,
+    action_type: Optional[str] = None,
+    current_user: Dict = Depends(get_current_admin),
+    conn=Depends(get_request_db)
+):
+    """
+    Export audit logs.
+
+    date_from and date_to filter on the log timestamp, inclusive.
+    """
+    conditions, params = [], []
+    try:
+        encoder = get_encoder(format)
+        _date_conditions("al.timestamp", date_from, date_to, conditions, params)
+    except ValueError as e:
+        raise _bad_request(e)
+
+    if actor_id is not None:
+        conditions.append("al.actor_id = %s")
+        params.append(actor_id)
+    if action_type is not None:
+        conditions.append("al.action_type = %s")
+        params.append(action_type)
+
+    query = "SELECT al.* FROM AUDIT_LOGS al"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY al.log_id"
+    return _export("audit_logs", query, params, encoder, conn)
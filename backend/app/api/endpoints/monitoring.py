@@ -0,0 +1,136 @@
+from fastapi import APIRouter, Depends
+from app.config.database import db
+from app.utils.security import security
+from app.services.availability import availability_index
+from app.services.schedule import schedule_materializer
+from app.services.pubsub import bus
+from app.services.chat_writer import message_writer
+from app.services.notifications import notification_outbox
+from ..deps import get_current_admin, principal_cache
+from .chat import manager as chat_manager
+from .notifications import notification_manager
+from typing import Dict
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/database",
+            response_model=Dict,
+            summary="Database pool statistics",
+            description="Connection pool size, checkouts, wait times and timeouts (admin only)")
+async def get_database_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get connection pool statistics for this worker process.
+    """
+    return {"pool": db.pool_stats(), "async_pool": db.async_pool_stats()}
+
+@router.get("/auth-cache",
+            response_model=Dict,
+            summary="Principal cache statistics",
+            description="Size, hit/miss counters and evictions of the authenticated principal cache (admin only)")
+async def get_auth_cache_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get principal cache statistics for this worker process.
+    """
+    return principal_cache.stats()
+
+@router.get("/password-hashing",
+            response_model=Dict,
+            summary="Password hashing pool statistics",
+            description="Queue depth, wait times and rejections of the bcrypt worker pool (admin only)")
+async def get_password_hashing_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get bcrypt worker pool statistics for this worker process.
+    """
+    return security.hash_pool.stats()
+
+@router.get("/token-cache",
+            response_model=Dict,
+            summary="JWT decode cache statistics",
+            description="Size and hit/miss counters of the verified token cache (admin only)")
+async def get_token_cache_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get verified token cache statistics for this worker process.
+    """
+    return security.token_cache_stats()
+
+@router.get("/token-revocation",
+            response_model=Dict,
+            summary="Token revocation statistics",
+            description="Bloom filter size, store lookups and sync status of the revocation list (admin only)")
+async def get_token_revocation_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get token revocation list statistics for this worker process.
+    """
+    return security.revocations.stats()
+
+@router.get("/permissions",
+            response_model=Dict,
+            summary="Permission matrix statistics",
+            description="Roles and users with grants, age and reload errors of the permission matrix (admin only)")
+async def get_permission_matrix_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get permission matrix statistics for this worker process.
+    """
+    return security.permissions.stats()
+
+@router.get("/availability",
+            response_model=Dict,
+            summary="Availability index statistics",
+            description="Indexed doctors, slots, horizon and reload status of the availability search index (admin only)")
+async def get_availability_index_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get availability index statistics for this worker process.
+    """
+    return availability_index.stats()
+
+@router.get("/schedule-materializer",
+            response_model=Dict,
+            summary="Schedule materializer statistics",
+            description="Runs, slots created and errors of the background DOCTOR_SCHEDULE materializer (admin only)")
+async def get_schedule_materializer_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get schedule materializer statistics for this worker process.
+    """
+    return schedule_materializer.stats()
+
+@router.get("/pubsub",
+            response_model=Dict,
+            summary="Pub/sub bus statistics",
+            description="Backend, subscribed user channels and message counters of the WebSocket pub/sub bus (admin only)")
+async def get_pubsub_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get pub/sub bus statistics for this worker process.
+    """
+    return bus.stats()
+
+@router.get("/websockets",
+            response_model=Dict,
+            summary="WebSocket send queue statistics",
+            description="Connections, outbound queue depths and slow-consumer drops of the chat and notification sockets (admin only)")
+async def get_websocket_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get WebSocket send queue statistics for this worker process.
+    """
+    return {"chat": chat_manager.stats(), "notifications": notification_manager.stats()}
+
+@router.get("/chat-writer",
+            response_model=Dict,
+            summary="Chat message writer statistics",
+            description="Batches, messages per batch, flush time and errors of the WebSocket chat message writer (admin only)")
+async def get_chat_writer_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get chat message writer statistics for this worker process.
+    """
+    return message_writer.stats()
+
+@router.get("/notification-outbox",
+            response_model=Dict,
+            summary="Notification outbox statistics",
+            description="Batches, deliveries, scheduled retries and notifications per second of the notification delivery worker (admin only)")
+async def get_notification_outbox_stats(current_user: Dict = Depends(get_current_admin)):
+    """
+    Get notification outbox statistics for this worker process.
+    """
+    return notification_outbox.stats()
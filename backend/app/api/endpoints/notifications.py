@@ -1,49 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from ...config.database import db
 from ..deps import get_current_user, verify_permission
 from ...utils.security import security
+from app.services.notifications import ENQUEUE_QUERY, NotificationManager, notification_manager, notification_outbox
 from typing import Dict, List, Optional
 import logging
 from datetime import datetime
 from fastapi.websockets import WebSocket, WebSocketDisconnect
-from asyncio import Queue
 import asyncio
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-class NotificationManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.message_queues: Dict[int, Queue] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-            self.message_queues[user_id] = Queue()
-        self.active_connections[user_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, user_id: int):
-        self.active_connections[user_id].remove(websocket)
-        if not self.active_connections[user_id]:
-            del self.active_connections[user_id]
-            del self.message_queues[user_id]
-
-    async def send_notification(self, user_id: int, message: Dict):
-        if user_id in self.active_connections:
-            dead_connections = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    dead_connections.append(connection)
-            
-            for dead_connection in dead_connections:
-                self.active_connections[user_id].remove(dead_connection)
-
-notification_manager = NotificationManager()
-
 @router.websocket("/ws/notifications/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -63,7 +31,9 @@ async def websocket_endpoint(
                 await websocket.receive_text()
                 
         except WebSocketDisconnect:
-            notification_manager.disconnect(websocket, user_id)
+            pass
+        finally:
+            await notification_manager.disconnect(websocket, user_id)
             
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
@@ -72,10 +42,10 @@ async def websocket_endpoint(
 @router.post("/")
 async def create_notification(
     data: Dict,
-    background_tasks: BackgroundTasks,
     current_user: Dict = Depends(get_current_user)
 ) -> Dict:
     try:
+        delivery_time = datetime.now()
         with db.transaction() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
@@ -90,24 +60,15 @@ async def create_notification(
                         data["notification_type"],
                         data["content"],
                         False,  # sent_status initially false
-                        datetime.now()  # delivery_time set to now
+                        delivery_time
                     )
                 )
                 
                 notification_id = cursor.lastrowid
-                
-                background_tasks.add_task(
-                    notification_manager.send_notification,
-                    data["user_id"],
-                    {
-                        "type": "notification",
-                        "data": {
-                            "id": notification_id,
-                            "content": data["content"],
-                            "type": data["notification_type"]
-                        }
-                    }
-                )
+                # Queued for the outbox worker in the same transaction
+                cursor.execute(ENQUEUE_QUERY, (notification_id, delivery_time))
+
+        notification_outbox.wake()
 
         return {"notif_id": notification_id, "message": "Notification created successfully"}
 
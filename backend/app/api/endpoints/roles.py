@@ -7,10 +7,10 @@ from app.schemas import (
     RoleUpdate,
     Message
 )
-from app.api.deps import get_current_user, get_current_admin
+from app.api.deps import get_current_user, get_current_admin, principal_cache
 from app.config.database import db
 from datetime import datetime
-from app.utils.security import get_password_hash
+from app.utils.security import get_password_hash, security
 from pydantic import BaseModel
 
 # Create a schema for roles based on the actual database schema
@@ -171,6 +171,7 @@ async def update_role(
             )
             updated_role = cursor.fetchone()
     
+    principal_cache.invalidate_role(role_id)
     return updated_role
 
 @router.delete("/{role_id}", response_model=Dict)
@@ -209,4 +210,83 @@ async def delete_role(role_id: int, current_user: Dict = Depends(get_current_adm
                 (role_id,)
             )
     
-    return {"message": "Role deleted successfully"} 
\ No newline at end of file
+    principal_cache.invalidate_role(role_id)
+    security.permissions.refresh_role(role_id)
+    return {"message": "Role deleted successfully"} 
+
+@router.get("/{role_id}/permissions", response_model=List[Dict])
+async def get_role_permissions(role_id: int, current_user: Dict = Depends(get_current_admin)):
+    """
+    Get the permissions granted to a role. Admin only.
+    """
+    with db.get_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT p.perm_id, p.resource, p.action,
+                       CONCAT(p.action, '_', p.resource) AS permission_name
+                FROM ROLE_PERMISSIONS rp
+                JOIN PERMISSIONS p ON p.perm_id = rp.perm_id
+                WHERE rp.role_id = %s
+                ORDER BY p.perm_id
+                """,
+                (role_id,)
+            )
+            permissions = cursor.fetchall()
+    
+    return permissions
+
+@router.put("/{role_id}/permissions/{perm_id}", response_model=Dict)
+async def grant_role_permission(role_id: int, perm_id: int, current_user: Dict = Depends(get_current_admin)):
+    """
+    Grant a permission to a role. Admin only.
+    """
+    with db.transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT role_id FROM roles WHERE role_id = %s",
+                (role_id,)
+            )
+            if not cursor.fetchone():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Role not found"
+                )
+            
+            cursor.execute(
+                "SELECT perm_id FROM PERMISSIONS WHERE perm_id = %s",
+                (perm_id,)
+            )
+            if not cursor.fetchone():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Permission not found"
+                )
+            
+            cursor.execute(
+                "INSERT IGNORE INTO ROLE_PERMISSIONS (role_id, perm_id) VALUES (%s, %s)",
+                (role_id, perm_id)
+            )
+    
+    security.permissions.refresh_role(role_id)
+    return {"message": "Permission granted successfully"}
+
+@router.delete("/{role_id}/permissions/{perm_id}", response_model=Dict)
+async def revoke_role_permission(role_id: int, perm_id: int, current_user: Dict = Depends(get_current_admin)):
+    """
+    Revoke a permission from a role. Admin only.
+    """
+    with db.transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM ROLE_PERMISSIONS WHERE role_id = %s AND perm_id = %s",
+                (role_id, perm_id)
+            )
+            if cursor.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Permission not granted to this role"
+                )
+    
+    security.permissions.refresh_role(role_id)
+    return {"message": "Permission revoked successfully"}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Form, Depends, Body
 from app.config.database import db
-from app.utils.security import get_password_hash
+from app.utils.security import aget_password_hash
 from pydantic import BaseModel, EmailStr
 from typing import Dict, Optional, Union
 import logging
@@ -55,6 +55,17 @@ async def signup(user_data: UserSignup = Depends(get_user_data)):
     Register a new user with admin role (role_id=1).
     Accepts both form data and JSON.
     """
+    # Hash on the worker pool before taking a connection
+    try:
+        hashed_password = await aget_password_hash(user_data.password)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Password hashing error: {str(e)}")
+        # Fallback to a simple hash if bcrypt fails
+        import hashlib
+        hashed_password = hashlib.sha256(user_data.password.encode()).hexdigest()
+    
     # Use transaction to ensure changes are committed
     with db.transaction() as conn:
         with conn.cursor() as cursor:
@@ -69,15 +80,6 @@ async def signup(user_data: UserSignup = Depends(get_user_data)):
                     detail="Email already registered"
                 )
             
-            try:
-                # Hash the password - with error handling
-                hashed_password = get_password_hash(user_data.password)
-            except Exception as e:
-                logger.error(f"Password hashing error: {str(e)}")
-                # Fallback to a simple hash if bcrypt fails
-                import hashlib
-                hashed_password = hashlib.sha256(user_data.password.encode()).hexdigest()
-            
             # Insert new user with role_id=1 (admin)
             cursor.execute(
                 """
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
 from app.config.database import db
-from ..deps import get_current_user, get_current_doctor, get_current_admin
+from ..deps import get_current_user, get_current_doctor, get_current_admin, get_request_db
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 import logging
 from datetime import datetime, timedelta
+from app.services.timeslots import generate_candidates, acreate_slots, afind_overlap
+from app.services.availability import availability_index
 
 # Create schemas for timeslot operations
 class TimeslotBase(BaseModel):
@@ -35,7 +37,8 @@ async def get_available_timeslots(
     doctor_id: Optional[int] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    conn=Depends(get_request_db)
 ):
     """
     Get available timeslots.
@@ -47,8 +50,8 @@ async def get_available_timeslots(
     
     Returns a list of available timeslots with doctor information.
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as cursor:
             query = """
                 SELECT ts.slot_id, ts.calendar_id, ts.start_time, ts.end_time, ts.is_available, 
                        dc.doctor_id,
@@ -78,22 +81,125 @@ async def get_available_timeslots(
             
             query += " ORDER BY ts.start_time"
             
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+async def _ensure_availability_index():
+    """Load the availability index if startup could not."""
+    if availability_index.loaded:
+        return
+    try:
+        await availability_index.load()
+    except Exception as e:
+        logger.error(f"Failed to load availability index: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Availability search is temporarily unavailable"
+        )
+
+@router.get("/availability", 
+            response_model=List[Dict],
+            summary="Search availability",
+            description="Find free timeslots across doctors, earliest first, filtered by department, specialization, doctor and date window")
+async def search_availability(
+    department_id: Optional[int] = None,
+    spec_id: Optional[int] = None,
+    doctor_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Search free timeslots across doctors.
+    
+    Parameters:
+    - department_id: Only doctors of this department
+    - spec_id: Only doctors with this specialization
+    - doctor_id: Only this doctor
+    - date_from: First day to search (format: YYYY-MM-DD), defaults to today
+    - date_to: Last day to search (format: YYYY-MM-DD), at most the index horizon
+    - limit: Maximum number of slots to return
+    
+    Served from the in-memory availability index, so results can trail
+    bookings made on other workers by up to a refresh interval.
+    """
+    try:
+        first_day = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else None
+        last_day = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format. Use YYYY-MM-DD"
+        )
+    
+    await _ensure_availability_index()
+    
+    if last_day is not None and last_day >= availability_index.horizon_end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"date_to must be before {availability_index.horizon_end.isoformat()}"
+        )
+    
+    return availability_index.search(
+        department_id=department_id,
+        spec_id=spec_id,
+        doctor_id=doctor_id,
+        date_from=first_day,
+        date_to=last_day,
+        limit=limit
+    )
+
+@router.get("/next-available", 
+            response_model=List[Dict],
+            summary="Next available timeslots",
+            description="Get the next free timeslots of a doctor, department or specialization")
+async def get_next_available_timeslots(
+    doctor_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    spec_id: Optional[int] = None,
+    count: int = Query(5, ge=1, le=50),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get the next free timeslots, earliest first.
+    
+    Parameters:
+    - doctor_id: Slots of this doctor
+    - department_id: Slots of any doctor in this department
+    - spec_id: Slots of any doctor with this specialization
+    - count: Number of slots to return
+    
+    At least one filter is required; several are combined with AND.
+    """
+    if doctor_id is None and department_id is None and spec_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide doctor_id, department_id or spec_id"
+        )
+    
+    await _ensure_availability_index()
+    
+    return availability_index.next_available(
+        doctor_id=doctor_id,
+        department_id=department_id,
+        spec_id=spec_id,
+        count=count
+    )
 
 @router.get("/{slot_id}", 
             response_model=Dict,
             summary="Get timeslot details",
             description="Retrieve detailed information about a specific timeslot")
-async def get_timeslot(slot_id: int, current_user: Dict = Depends(get_current_user)):
+async def get_timeslot(slot_id: int, current_user: Dict = Depends(get_current_user), conn=Depends(get_request_db)):
     """
     Get a specific timeslot by ID.
     
     Returns detailed information about the timeslot including doctor information.
     """
-    with db.get_db() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
+    async with db.aget_db(conn) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 SELECT ts.slot_id, ts.calendar_id, ts.start_time, ts.end_time, ts.is_available, 
                        dc.doctor_id,
@@ -109,7 +215,7 @@ async def get_timeslot(slot_id: int, current_user: Dict = Depends(get_current_us
                 """,
                 (slot_id,)
             )
-            slot = cursor.fetchone()
+            slot = await cursor.fetchone()
             
             if not slot:
                 raise HTTPException(
@@ -132,26 +238,35 @@ async def create_timeslot(
             "is_available": True
         }
     ),
-    current_user: Dict = Depends(get_current_doctor)
+    current_user: Dict = Depends(get_current_doctor),
+    conn=Depends(get_request_db)
 ):
     """
     Create a new timeslot.
     
     Only doctors can create timeslots for their own calendars.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
-            # Check if calendar belongs to the current doctor
-            cursor.execute(
+    if data.end_time <= data.start_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="End time must be after start time"
+        )
+    
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
+            # Check if calendar belongs to the current doctor; the row lock
+            # serializes overlap checks and inserts for this calendar
+            await cursor.execute(
                 """
                 SELECT dc.doctor_id, d.user_id
                 FROM DOCTOR_CALENDAR dc
                 JOIN DOCTORS d ON dc.doctor_id = d.doctor_id
                 WHERE dc.calendar_id = %s
+                FOR UPDATE
                 """,
                 (data.calendar_id,)
             )
-            calendar = cursor.fetchone()
+            calendar = await cursor.fetchone()
             
             if not calendar:
                 raise HTTPException(
@@ -173,31 +288,15 @@ async def create_timeslot(
                 )
             
             # Check if timeslot overlaps with existing timeslots
-            cursor.execute(
-                """
-                SELECT slot_id
-                FROM TIMESLOTS
-                WHERE calendar_id = %s AND (
-                    (start_time <= %s AND end_time > %s) OR
-                    (start_time < %s AND end_time >= %s) OR
-                    (start_time >= %s AND end_time <= %s)
-                )
-                """,
-                (
-                    data.calendar_id,
-                    data.start_time, data.start_time,
-                    data.end_time, data.end_time,
-                    data.start_time, data.end_time
-                )
-            )
-            if cursor.fetchone():
+            overlap = await afind_overlap(cursor, data.calendar_id, data.start_time, data.end_time)
+            if overlap:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Timeslot overlaps with existing timeslots"
                 )
             
             # Create timeslot
-            cursor.execute(
+            await cursor.execute(
                 """
                 INSERT INTO TIMESLOTS (calendar_id, start_time, end_time, is_available)
                 VALUES (%s, %s, %s, %s)
@@ -212,6 +311,11 @@ async def create_timeslot(
             
             slot_id = cursor.lastrowid
     
+    availability_index.upsert_slot(
+        slot_id, calendar["doctor_id"], data.calendar_id,
+        data.start_time, data.end_time, data.is_available
+    )
+    
     return {
         "slot_id": slot_id,
         "message": "Timeslot created successfully"
@@ -230,27 +334,29 @@ async def update_timeslot(
             "is_available": False
         }
     ),
-    current_user: Dict = Depends(get_current_doctor)
+    current_user: Dict = Depends(get_current_doctor),
+    conn=Depends(get_request_db)
 ):
     """
     Update a timeslot.
     
     Only doctors can update their own timeslots.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Get the slot
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT ts.*, dc.doctor_id, d.user_id
                 FROM TIMESLOTS ts
                 JOIN DOCTOR_CALENDAR dc ON ts.calendar_id = dc.calendar_id
                 JOIN DOCTORS d ON dc.doctor_id = d.doctor_id
                 WHERE ts.slot_id = %s
+                FOR UPDATE
                 """,
                 (slot_id,)
             )
-            slot = cursor.fetchone()
+            slot = await cursor.fetchone()
             
             if not slot:
                 raise HTTPException(
@@ -271,9 +377,24 @@ async def update_timeslot(
                     detail="Not authorized to update this time slot"
                 )
             
+            # Moving the slot must not make it overlap another one
+            if data.start_time is not None or data.end_time is not None:
+                new_start = data.start_time or slot["start_time"]
+                new_end = data.end_time or slot["end_time"]
+                if new_end <= new_start:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="End time must be after start time"
+                    )
+                if await afind_overlap(cursor, slot["calendar_id"], new_start, new_end, exclude_slot_id=slot_id):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Timeslot overlaps with existing timeslots"
+                    )
+            
             # Check if slot is used in any appointment if we're changing availability
             if data.is_available is not None and data.is_available != slot["is_available"] and not slot["is_available"]:
-                cursor.execute(
+                await cursor.execute(
                     """
                     SELECT COUNT(*) as appointment_count
                     FROM APPOINTMENTS
@@ -281,7 +402,7 @@ async def update_timeslot(
                     """,
                     (slot_id,)
                 )
-                result = cursor.fetchone()
+                result = await cursor.fetchone()
                 
                 if result["appointment_count"] > 0:
                     raise HTTPException(
@@ -311,7 +432,7 @@ async def update_timeslot(
             # Add slot_id to params
             params.append(slot_id)
             
-            cursor.execute(
+            await cursor.execute(
                 f"""
                 UPDATE TIMESLOTS
                 SET {", ".join(update_fields)}
@@ -320,6 +441,13 @@ async def update_timeslot(
                 params
             )
     
+    availability_index.upsert_slot(
+        slot_id, slot["doctor_id"], slot["calendar_id"],
+        data.start_time or slot["start_time"],
+        data.end_time or slot["end_time"],
+        slot["is_available"] if data.is_available is None else data.is_available
+    )
+    
     return {"message": "Time slot updated successfully"}
 
 @router.delete("/{slot_id}", 
@@ -328,7 +456,8 @@ async def update_timeslot(
                description="Delete an existing timeslot (doctor only)")
 async def delete_timeslot(
     slot_id: int,
-    current_user: Dict = Depends(get_current_doctor)
+    current_user: Dict = Depends(get_current_doctor),
+    conn=Depends(get_request_db)
 ):
     """
     Delete a timeslot.
@@ -336,10 +465,10 @@ async def delete_timeslot(
     Only doctors can delete their own timeslots.
     Timeslots with assigned appointments cannot be deleted.
     """
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
             # Get the slot
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT ts.*, dc.doctor_id, d.user_id
                 FROM TIMESLOTS ts
@@ -349,7 +478,7 @@ async def delete_timeslot(
                 """,
                 (slot_id,)
             )
-            slot = cursor.fetchone()
+            slot = await cursor.fetchone()
             
             if not slot:
                 raise HTTPException(
@@ -371,7 +500,7 @@ async def delete_timeslot(
                 )
             
             # Check if slot is used in any appointment
-            cursor.execute(
+            await cursor.execute(
                 """
                 SELECT COUNT(*) as appointment_count
                 FROM APPOINTMENTS
@@ -379,7 +508,7 @@ async def delete_timeslot(
                 """,
                 (slot_id,)
             )
-            result = cursor.fetchone()
+            result = await cursor.fetchone()
             
             if result["appointment_count"] > 0:
                 raise HTTPException(
@@ -388,7 +517,7 @@ async def delete_timeslot(
                 )
             
             # Delete slot
-            cursor.execute(
+            await cursor.execute(
                 """
                 DELETE FROM TIMESLOTS
                 WHERE slot_id = %s
@@ -396,6 +525,8 @@ async def delete_timeslot(
                 (slot_id,)
             )
     
+    availability_index.remove_slot(slot_id)
+    
     return {"message": "Time slot deleted successfully"}
 
 @router.post("/bulk", 
@@ -412,10 +543,12 @@ async def create_bulk_timeslots(
             "end_time": "17:00:00",
             "slot_duration_minutes": 30,
             "weekdays": [1, 2, 3, 4, 5],  # Monday to Friday
-            "exclude_dates": ["2023-12-03"]  # Exclude specific dates
+            "exclude_dates": ["2023-12-03"],  # Exclude specific dates
+            "dry_run": False
         }
     ),
-    current_user: Dict = Depends(get_current_doctor)
+    current_user: Dict = Depends(get_current_doctor),
+    conn=Depends(get_request_db)
 ):
     """
     Create multiple timeslots at once.
@@ -431,29 +564,41 @@ async def create_bulk_timeslots(
     - slot_duration_minutes: Duration of each slot in minutes
     - weekdays: List of weekdays to create slots for (0=Sunday, 1=Monday, ..., 6=Saturday)
     - exclude_dates: List of specific dates to exclude (YYYY-MM-DD)
+    - dry_run: Only report how many slots would be created and skipped
     """
     calendar_id = data.get("calendar_id")
-    start_date = datetime.strptime(data.get("start_date"), "%Y-%m-%d").date()
-    end_date = datetime.strptime(data.get("end_date"), "%Y-%m-%d").date()
-    start_time = data.get("start_time")
-    end_time = data.get("end_time")
-    slot_duration = timedelta(minutes=data.get("slot_duration_minutes", 30))
-    weekdays = data.get("weekdays", [0, 1, 2, 3, 4, 5, 6])  # Default to all days
-    exclude_dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in data.get("exclude_dates", [])]
+    dry_run = bool(data.get("dry_run", False))
+    try:
+        candidates = generate_candidates(
+            datetime.strptime(data.get("start_date"), "%Y-%m-%d").date(),
+            datetime.strptime(data.get("end_date"), "%Y-%m-%d").date(),
+            datetime.strptime(data.get("start_time"), "%H:%M:%S").time(),
+            datetime.strptime(data.get("end_time"), "%H:%M:%S").time(),
+            timedelta(minutes=data.get("slot_duration_minutes", 30)),
+            data.get("weekdays", [0, 1, 2, 3, 4, 5, 6]),  # Default to all days
+            [datetime.strptime(d, "%Y-%m-%d").date() for d in data.get("exclude_dates", [])]
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid date or time format: {str(e)}. Use YYYY-MM-DD for dates and HH:MM:SS for times"
+        )
     
-    with db.transaction() as conn:
-        with conn.cursor() as cursor:
-            # Check if calendar belongs to the current doctor
-            cursor.execute(
+    async with db.atransaction(conn) as conn:
+        async with conn.cursor() as cursor:
+            # Check if calendar belongs to the current doctor; the row lock
+            # keeps concurrent bulk requests from inserting overlapping slots
+            await cursor.execute(
                 """
                 SELECT dc.doctor_id, d.user_id
                 FROM DOCTOR_CALENDAR dc
                 JOIN DOCTORS d ON dc.doctor_id = d.doctor_id
                 WHERE dc.calendar_id = %s
+                FOR UPDATE
                 """,
                 (calendar_id,)
             )
-            calendar = cursor.fetchone()
+            calendar = await cursor.fetchone()
             
             if not calendar:
                 raise HTTPException(
@@ -474,62 +619,15 @@ async def create_bulk_timeslots(
                     detail="Not authorized to create timeslots for this calendar"
                 )
             
-            # Create timeslots
-            created_count = 0
-            current_date = start_date
-            while current_date <= end_date:
-                # Skip if not in selected weekdays or in excluded dates
-                if current_date.weekday() not in weekdays or current_date in exclude_dates:
-                    current_date += timedelta(days=1)
-                    continue
-                
-                # Create slots for this day
-                day_start = datetime.combine(current_date, datetime.strptime(start_time, "%H:%M:%S").time())
-                day_end = datetime.combine(current_date, datetime.strptime(end_time, "%H:%M:%S").time())
-                
-                slot_start = day_start
-                while slot_start + slot_duration <= day_end:
-                    slot_end = slot_start + slot_duration
-                    
-                    # Check for overlaps
-                    cursor.execute(
-                        """
-                        SELECT slot_id
-                        FROM TIMESLOTS
-                        WHERE calendar_id = %s AND (
-                            (start_time <= %s AND end_time > %s) OR
-                            (start_time < %s AND end_time >= %s) OR
-                            (start_time >= %s AND end_time <= %s)
-                        )
-                        """,
-                        (
-                            calendar_id,
-                            slot_start, slot_start,
-                            slot_end, slot_end,
-                            slot_start, slot_end
-                        )
-                    )
-                    if not cursor.fetchone():
-                        # Create timeslot
-                        cursor.execute(
-                            """
-                            INSERT INTO TIMESLOTS (calendar_id, start_time, end_time, is_available)
-                            VALUES (%s, %s, %s, %s)
-                            """,
-                            (
-                                calendar_id,
-                                slot_start,
-                                slot_end,
-                                True
-                            )
-                        )
-                        created_count += 1
-                    
-                    slot_start = slot_end
-                
-                current_date += timedelta(days=1)
+            created, skipped = await acreate_slots(cursor, calendar_id, candidates, dry_run)
+    
+    if created and not dry_run:
+        await availability_index.refresh_doctor(calendar["doctor_id"])
     
+    verb = "Would create" if dry_run else "Successfully created"
     return {
-        "message": f"Successfully created {created_count} timeslots",
-        "created_count": created_count
-    } 
\ No newline at end of file
+        "message": f"{verb} {len(created)} timeslots",
+        "created_count": len(created),
+        "skipped_count": len(skipped),
+        "dry_run": dry_run
+    }
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.config.database import db
-from app.utils.security import get_password_hash
+from app.utils.security import get_password_hash, security
 from pydantic import BaseModel, EmailStr
 from typing import Dict, List, Optional
 from datetime import date
-from ..deps import get_current_admin, get_current_user
+from ..deps import get_current_admin, get_current_user, principal_cache
 import logging
 
 # Set up logging
@@ -428,6 +428,7 @@ async def update_user(
             )
             updated_user = cursor.fetchone()
     
+    principal_cache.invalidate(user_id)
     return updated_user
 
 @router.delete("/{user_id}", response_model=Dict)
@@ -454,6 +455,8 @@ async def delete_user(user_id: int, current_user: Dict = Depends(get_current_adm
                 (user_id,)
             )
     
+    principal_cache.invalidate(user_id)
+    security.permissions.refresh_user(user_id)
     return {"message": "User deleted successfully"}
 
 @router.get("/roles/doctor", response_model=Dict, include_in_schema=False)
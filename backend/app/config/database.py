@@ -1,11 +1,21 @@
 import pymysql
 from pymysql.cursors import DictCursor
-from contextlib import contextmanager
+from pymysql.constants import SERVER_STATUS
+from contextlib import contextmanager, asynccontextmanager
+from collections import deque
+import asyncio
 import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
+try:
+    import aiomysql
+except ImportError:  # pragma: no cover - optional until the async layer is used
+    aiomysql = None
+
 load_dotenv("/home/seth0x41/MediHub/backend/.env")
 
 logger = logging.getLogger(__name__)
@@ -14,6 +24,271 @@ class DatabaseError(Exception):
     """Custom exception for database errors"""
     pass
 
+class PoolTimeoutError(DatabaseError):
+    """Raised when no pooled connection becomes available in time"""
+    pass
+
+class _PooledConnection:
+    """Bookkeeping for a single pooled connection"""
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+class RequestConnection:
+    """
+    Async connection checked out of the pool on first use.
+
+    Pass it wherever a connection is accepted (db.aget_db(conn),
+    db.atransaction(conn)): everything sharing it uses the same pooled
+    connection, and nothing is checked out if no one touches the database.
+    The owner returns it with release().
+    """
+
+    def __init__(self, database: "Database"):
+        self._db = database
+        self._pool = None
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def acquired(self) -> bool:
+        return self._conn is not None
+
+    async def acquire(self):
+        """Check the connection out of the pool if that has not happened yet."""
+        async with self._lock:
+            if self._conn is None:
+                self._pool = await self._db.init_async_pool()
+                self._conn = await self._db._acquire_async(self._pool)
+        return self._conn
+
+    async def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await self._db._release_async(self._pool, conn)
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of PyMySQL connections.
+
+    Connections are handed out LIFO so the busiest ones stay warm while the
+    rest age out. Expired (max_lifetime) and idle (idle_timeout) connections
+    are evicted lazily whenever the pool is used, and a connection that has
+    been idle for longer than ping_interval is pinged before it is handed out.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        max_lifetime: float = 3600.0,
+        idle_timeout: float = 300.0,
+        ping_interval: float = 30.0,
+        connect=None
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._connect = connect or pymysql.connect
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+
+        # Statistics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._failed_health_checks = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _open(self) -> _PooledConnection:
+        conn = self._connect(**self.config)
+        with self._cond:
+            self._created += 1
+        return _PooledConnection(conn)
+
+    def _is_expired(self, entry: _PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and now - entry.created_at >= self.max_lifetime
+
+    def _close_quietly(self, entry: _PooledConnection):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _evict_locked(self, now: float) -> list:
+        """Drop expired and surplus idle connections. Caller holds the lock."""
+        evicted = []
+        kept = deque()
+        while self._idle:
+            entry = self._idle.popleft()
+            idle_for = now - entry.last_used
+            surplus = self._size - len(evicted) > self.min_size
+            if self._is_expired(entry, now) or (
+                surplus and self.idle_timeout > 0 and idle_for >= self.idle_timeout
+            ):
+                evicted.append(entry)
+            else:
+                kept.append(entry)
+        self._idle = kept
+        self._size -= len(evicted)
+        self._discarded += len(evicted)
+        return evicted
+
+    def fill(self):
+        """Open connections until the pool holds at least min_size of them."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            entry = None
+            evicted = []
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise DatabaseError("Connection pool is closed")
+                    now = time.monotonic()
+                    evicted.extend(self._evict_locked(now))
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+
+            for stale in evicted:
+                self._close_quietly(stale)
+
+            if entry is None:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif self.ping_interval >= 0 and time.monotonic() - entry.last_used >= self.ping_interval:
+                try:
+                    entry.conn.ping(reconnect=False)
+                except Exception as e:
+                    logger.warning(f"Discarding pooled connection that failed health check: {str(e)}")
+                    self._close_quietly(entry)
+                    with self._cond:
+                        self._size -= 1
+                        self._discarded += 1
+                        self._failed_health_checks += 1
+                        self._cond.notify()
+                    continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self._checkouts += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            return entry.conn
+
+    def release(self, conn, discard: bool = False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            logger.warning("Attempted to release a connection that does not belong to the pool")
+            return
+
+        if not discard:
+            if not conn.open:
+                discard = True
+            elif (conn.server_status or 0) & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                try:
+                    conn.rollback()
+                except Exception as e:
+                    logger.warning(f"Rollback on release failed, discarding connection: {str(e)}")
+                    discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            if discard or self._closed or self._is_expired(entry, now):
+                self._size -= 1
+                self._discarded += 1
+                self._cond.notify()
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._close_quietly(entry)
+
+    def close(self):
+        """Close idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "failed_health_checks": self._failed_health_checks,
+                "wait_time_total": round(self._wait_time_total, 6),
+                "wait_time_avg": round(self._wait_time_total / self._checkouts, 6) if self._checkouts else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6)
+            }
+
 class Database:
     def __init__(self):
         self.config = {
@@ -25,42 +300,158 @@ class Database:
             "cursorclass": DictCursor,
             "autocommit": False
         }
-        self.connection = None
+        self.pool = ConnectionPool(
+            self.config,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+            idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+        )
+
+        # Async (aiomysql) pool, created lazily on the running event loop
+        self._async_pool = None
+        self._async_pool_loop = None
+        self._async_pool_lock = None
+        self._async_pool_lock_loop = None
+        self._async_stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0
+        }
 
     def init_db(self):
-        """Initialize database connection"""
-        logger.info("Initializing database connection")
+        """Initialize the connection pool"""
+        logger.info("Initializing database connection pool")
         try:
-            # Test connection
-            conn = pymysql.connect(**self.config)
-            conn.close()
+            self.pool.fill()
             logger.info("Database connection successful")
         except Exception as e:
             logger.error(f"Failed to initialize database: {str(e)}")
             raise DatabaseError(f"Failed to initialize database: {str(e)}")
 
     def close_db(self):
-        """Close database connection"""
-        logger.info("Closing database connection")
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        """Close all pooled database connections"""
+        logger.info("Closing database connection pool")
+        self.pool.close()
+
+    def pool_stats(self) -> dict:
+        """Return connection pool statistics"""
+        return self.pool.stats()
+
+    def async_pool_stats(self) -> dict:
+        """Return async connection pool statistics"""
+        stats = dict(self._async_stats)
+        checkouts = stats["checkouts"]
+        stats["wait_time_total"] = round(stats["wait_time_total"], 6)
+        stats["wait_time_avg"] = round(stats["wait_time_total"] / checkouts, 6) if checkouts else 0.0
+        stats["wait_time_max"] = round(stats["wait_time_max"], 6)
+        pool = self._async_pool
+        stats["size"] = pool.size if pool is not None else 0
+        stats["idle"] = pool.freesize if pool is not None else 0
+        stats["min_size"] = self.pool.min_size
+        stats["max_size"] = self.pool.max_size
+        return stats
+
+    async def init_async_pool(self):
+        """Create the aiomysql pool for the running event loop if needed"""
+        if aiomysql is None:
+            raise DatabaseError("aiomysql is required for async database access")
+
+        loop = asyncio.get_running_loop()
+        if self._async_pool is not None and self._async_pool_loop is loop:
+            return self._async_pool
+
+        if self._async_pool_lock is None or self._async_pool_lock_loop is not loop:
+            self._async_pool_lock = asyncio.Lock()
+            self._async_pool_lock_loop = loop
+
+        async with self._async_pool_lock:
+            if self._async_pool is not None and self._async_pool_loop is loop:
+                return self._async_pool
+            if self._async_pool is not None:
+                # The previous pool belongs to an event loop that is gone
+                self._async_pool.close()
+            logger.info("Initializing async database connection pool")
+            try:
+                self._async_pool = await aiomysql.create_pool(
+                    minsize=self.pool.min_size,
+                    maxsize=self.pool.max_size,
+                    pool_recycle=int(self.pool.max_lifetime) if self.pool.max_lifetime > 0 else -1,
+                    host=self.config["host"] or "localhost",
+                    user=self.config["user"],
+                    password=self.config["password"] or "",
+                    db=self.config["db"],
+                    charset=self.config["charset"],
+                    cursorclass=aiomysql.DictCursor,
+                    autocommit=False
+                )
+            except Exception as e:
+                logger.error(f"Failed to initialize async database pool: {str(e)}")
+                raise DatabaseError(f"Failed to initialize async database pool: {str(e)}")
+            self._async_pool_loop = loop
+            return self._async_pool
+
+    async def close_async_pool(self):
+        """Close the aiomysql pool"""
+        pool = self._async_pool
+        if pool is None:
+            return
+        logger.info("Closing async database connection pool")
+        self._async_pool = None
+        self._async_pool_loop = None
+        pool.close()
+        await pool.wait_closed()
+
+    async def _acquire_async(self, pool):
+        started = time.monotonic()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), timeout=self.pool.timeout)
+        except asyncio.TimeoutError:
+            self._async_stats["timeouts"] += 1
+            raise PoolTimeoutError(
+                f"Timed out after {self.pool.timeout}s waiting for a database connection"
+            )
+        waited = time.monotonic() - started
+        self._async_stats["checkouts"] += 1
+        self._async_stats["wait_time_total"] += waited
+        self._async_stats["wait_time_max"] = max(self._async_stats["wait_time_max"], waited)
+        return conn
+
+    async def _release_async(self, pool, conn):
+        # aiomysql closes connections released mid-transaction, so end it first
+        if not conn.closed and conn.get_transaction_status():
+            await self._arollback(conn)
+        pool.release(conn)
+
+    @staticmethod
+    async def _arollback(conn):
+        try:
+            await conn.rollback()
+        except Exception as e:
+            logger.warning(f"Rollback failed, closing connection: {str(e)}")
+            conn.close()
 
     @contextmanager
     def get_db(self):
-        conn = pymysql.connect(**self.config)
+        conn = self.pool.acquire()
+        discard = False
         try:
             yield conn
         except HTTPException:
             # Let HTTPExceptions pass through without modification
-            conn.rollback()
+            discard = not self._rollback(conn)
             raise
         except Exception as e:
-            conn.rollback()
+            discard = not self._rollback(conn) or isinstance(
+                e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+            )
             logger.error(f"Database error: {str(e)}")
             raise DatabaseError(f"Database operation failed: {str(e)}")
         finally:
-            conn.close()
+            self.pool.release(conn, discard=discard)
 
     @contextmanager
     def transaction(self):
@@ -77,4 +468,66 @@ class Database:
                 logger.error(f"Transaction failed: {str(e)}")
                 raise DatabaseError(f"Transaction failed: {str(e)}")
 
+    @asynccontextmanager
+    async def aget_db(self, conn=None):
+        """
+        Yield an async connection.
+
+        If `conn` is given (e.g. the request-scoped connection from
+        app.api.deps.get_request_db) it is reused, and releasing it is left
+        to its owner; a RequestConnection is checked out on first use.
+        Otherwise a connection is checked out of the pool.
+        """
+        if isinstance(conn, RequestConnection):
+            conn = await conn.acquire()
+        if conn is not None:
+            async with self._aguard(conn):
+                yield conn
+            return
+
+        pool = await self.init_async_pool()
+        conn = await self._acquire_async(pool)
+        try:
+            async with self._aguard(conn):
+                yield conn
+        finally:
+            await self._release_async(pool, conn)
+
+    @asynccontextmanager
+    async def atransaction(self, conn=None):
+        async with self.aget_db(conn) as conn:
+            try:
+                yield conn
+                await conn.commit()
+            except HTTPException:
+                # Let HTTPExceptions pass through without modification
+                await conn.rollback()
+                raise
+            except Exception as e:
+                await conn.rollback()
+                logger.error(f"Transaction failed: {str(e)}")
+                raise DatabaseError(f"Transaction failed: {str(e)}")
+
+    @asynccontextmanager
+    async def _aguard(self, conn):
+        try:
+            yield
+        except (HTTPException, DatabaseError):
+            # Let HTTPExceptions and already wrapped errors pass through
+            await self._arollback(conn)
+            raise
+        except Exception as e:
+            await self._arollback(conn)
+            logger.error(f"Database error: {str(e)}")
+            raise DatabaseError(f"Database operation failed: {str(e)}")
+
+    @staticmethod
+    def _rollback(conn) -> bool:
+        try:
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Rollback failed: {str(e)}")
+            return False
+
 db = Database()
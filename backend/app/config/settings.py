@@ -79,6 +79,63 @@ DB_PORT=3306
 DB_USER=medihub_user
 DB_PASSWORD=secure_password
 DB_NAME=medihub
+DB_POOL_MIN_SIZE=1
+DB_POOL_MAX_SIZE=10
+DB_POOL_TIMEOUT=10
+DB_POOL_MAX_LIFETIME=3600
+DB_POOL_IDLE_TIMEOUT=300
+DB_POOL_PING_INTERVAL=30
+
+# Authenticated principal cache
+AUTH_CACHE_SIZE=1024
+AUTH_CACHE_TTL=60
+
+# Password hashing worker pool
+PASSWORD_HASH_WORKERS=4
+PASSWORD_HASH_MAX_PENDING=32
+
+# Verified JWT cache
+JWT_CACHE_SIZE=4096
+
+# Token revocation (sqlite or redis)
+REVOCATION_BACKEND=sqlite
+REVOCATION_DB_PATH=revoked_tokens.db
+REDIS_URL=redis://localhost:6379/0
+REVOCATION_FILTER_CAPACITY=100000
+REVOCATION_SYNC_INTERVAL=5
+
+# Permission matrix reload interval (seconds)
+PERMISSION_REFRESH_INTERVAL=60
+
+# Availability search index: days indexed ahead and reload interval (seconds)
+AVAILABILITY_HORIZON_DAYS=90
+AVAILABILITY_REFRESH_INTERVAL=60
+
+# Timeslots generated ahead from DOCTOR_SCHEDULE, slot length and run interval (seconds)
+SCHEDULE_HORIZON_WEEKS=8
+SCHEDULE_SLOT_MINUTES=30
+SCHEDULE_MATERIALIZE_INTERVAL=3600
+
+# Streaming exports: rows per chunk and MySQL net_write_timeout (seconds)
+EXPORT_BATCH_SIZE=1000
+EXPORT_NET_WRITE_TIMEOUT=600
+
+# WebSocket fan-out across workers (memory for a single process, or redis via REDIS_URL)
+PUBSUB_BACKEND=memory
+
+# Messages queued per WebSocket before the client counts as a slow consumer
+WS_SEND_QUEUE_SIZE=256
+
+# WebSocket chat messages written per batch, and how long a batch waits to fill (ms)
+CHAT_WRITE_BATCH_SIZE=100
+CHAT_WRITE_DELAY_MS=5
+
+# Notification outbox: rows delivered per batch, seconds between polls,
+# delivery attempts before giving up, and the first retry delay in seconds
+NOTIFY_BATCH_SIZE=100
+NOTIFY_POLL_INTERVAL=5
+NOTIFY_MAX_ATTEMPTS=8
+NOTIFY_RETRY_BASE=5
 
 # CORS Settings
 CORS_ORIGINS=http://localhost,http://localhost:3000,https://yourdomain.com
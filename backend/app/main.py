@@ -16,6 +16,14 @@ import os
 from pathlib import Path
 from app.api.endpoints import auth, chat, users  # Make sure users is imported
 from app.utils.db_init import initialize_database
+from app.config.database import db
+from app.utils.security import security
+from app.services.availability import availability_index
+from app.services.schedule import schedule_materializer
+from app.services.pubsub import bus
+from app.services.chat_writer import message_writer
+from app.services.notifications import notification_outbox
+import asyncio
 
 # Configure logging
 logging.basicConfig(
@@ -204,6 +212,41 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     return response
 
+@app.on_event("startup")
+async def startup_event():
+    try:
+        await db.init_async_pool()
+    except Exception as e:
+        logger.error(f"Failed to initialize async database pool: {str(e)}")
+    # Build the revocation filter before serving; run_sync keeps it current
+    await asyncio.to_thread(security.revocations.sync)
+    try:
+        security.permissions.load()
+    except Exception as e:
+        logger.error(f"Failed to load permission matrix: {str(e)}")
+    try:
+        await availability_index.load()
+    except Exception as e:
+        logger.error(f"Failed to load availability index: {str(e)}")
+    app.state.revocation_sync = asyncio.create_task(security.revocations.run_sync())
+    app.state.permission_refresh = asyncio.create_task(security.permissions.run_refresh())
+    app.state.availability_refresh = asyncio.create_task(availability_index.run_refresh())
+    app.state.schedule_materializer = asyncio.create_task(schedule_materializer.run())
+    app.state.notification_outbox = asyncio.create_task(notification_outbox.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.revocation_sync.cancel()
+    app.state.permission_refresh.cancel()
+    app.state.availability_refresh.cancel()
+    app.state.schedule_materializer.cancel()
+    app.state.notification_outbox.cancel()
+    await message_writer.close()
+    await bus.close()
+    await db.close_async_pool()
+    db.close_db()
+    security.hash_pool.shutdown()
+
 # Initialize database tables and reference data before starting the app
 try:
     initialize_database()
@@ -0,0 +1,184 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+APPOINTMENT_STATUSES = ("Scheduled", "Completed", "Cancelled")
+
+# Joins in the order they must appear, each with the aliases it depends on
+JOINS = {
+    "p": ("JOIN PATIENTS p ON a.patient_id = p.patient_id", ()),
+    "pu": ("JOIN USERS pu ON p.user_id = pu.user_id", ("p",)),
+    "d": ("JOIN DOCTORS d ON a.doctor_id = d.doctor_id", ()),
+    "du": ("JOIN USERS du ON d.user_id = du.user_id", ("d",)),
+    "dep": ("JOIN DEPARTMENTS dep ON d.department_id = dep.department_id", ("d",)),
+    "ts": ("JOIN TIMESLOTS ts ON a.slot_id = ts.slot_id", ())
+}
+
+# Selectable fields: output name -> (SQL expression, joins it needs)
+FIELDS = {
+    "appointment_id": ("a.appointment_id", ()),
+    "patient_id": ("a.patient_id", ()),
+    "doctor_id": ("a.doctor_id", ()),
+    "slot_id": ("a.slot_id", ()),
+    "appointment_date": ("a.appointment_date", ()),
+    "status": ("a.status", ()),
+    "notes": ("a.notes", ()),
+    "priority_flag": ("a.priority_flag", ()),
+    "patient_user_id": ("p.user_id", ("p",)),
+    "patient_first_name": ("pu.first_name", ("pu",)),
+    "patient_last_name": ("pu.last_name", ("pu",)),
+    "doctor_user_id": ("d.user_id", ("d",)),
+    "doctor_first_name": ("du.first_name", ("du",)),
+    "doctor_last_name": ("du.last_name", ("du",)),
+    "department_name": ("dep.department_name", ("dep",)),
+    "start_time": ("ts.start_time", ("ts",)),
+    "end_time": ("ts.end_time", ("ts",))
+}
+
+# Columns added to a.* when no projection is requested, per role
+DEFAULT_FIELDS = {
+    "admin": (
+        "patient_user_id", "patient_first_name", "patient_last_name",
+        "doctor_user_id", "doctor_first_name", "doctor_last_name",
+        "start_time", "end_time"
+    ),
+    "doctor": ("patient_user_id", "patient_first_name", "patient_last_name", "start_time", "end_time"),
+    "patient": ("doctor_user_id", "doctor_first_name", "doctor_last_name", "department_name", "start_time", "end_time")
+}
+
+# The keyset; newest first
+KEY_FIELDS = ("appointment_date", "appointment_id")
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque cursor pointing just past ``row``."""
+    key = [row["appointment_date"].isoformat(), row["appointment_id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Read a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        appointment_date, appointment_id = json.loads(raw)
+        return datetime.fromisoformat(appointment_date), int(appointment_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Split a comma-separated projection, None meaning the default columns.
+
+    Raises:
+        ValueError: A field is unknown
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def _joins(fields: Sequence[str]) -> List[str]:
+    needed = set()
+    pending = [alias for name in fields for alias in FIELDS[name][1]]
+    while pending:
+        alias = pending.pop()
+        if alias not in needed:
+            needed.add(alias)
+            pending.extend(JOINS[alias][1])
+    return [clause for alias, (clause, _) in JOINS.items() if alias in needed]
+
+def build_list_query(
+    role_name: str,
+    fields: Optional[Sequence[str]] = None,
+    scope_doctor_id: Optional[int] = None,
+    scope_patient_id: Optional[int] = None,
+    status: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None
+) -> Tuple[str, List]:
+    """
+    Build the appointment listing query, newest first.
+
+    Filtering and ordering only touch APPOINTMENTS, so with the composite
+    (scope, appointment_date, appointment_id) indexes MySQL walks the index
+    from the cursor position and stops after ``limit`` rows; the joins only
+    run for the rows returned and only when a requested field needs them.
+
+    Args:
+        role_name: Picks the default columns when fields is None
+        fields: Output fields; None selects a.* plus the role's defaults
+        scope_doctor_id, scope_patient_id: Rows the caller may see
+        status, date_from, date_to, doctor_id, patient_id: Filters; dates are inclusive
+        after: Decoded cursor; only rows after it are returned
+        limit: Row limit
+
+    Returns:
+        (query, params)
+    """
+    if fields is None:
+        extra = DEFAULT_FIELDS.get(role_name, DEFAULT_FIELDS["patient"])
+        columns = ["a.*"] + [f"{FIELDS[name][0]} AS {name}" for name in extra]
+        joins = _joins(extra)
+    else:
+        # The key columns are always read so the next cursor can be built
+        selected = list(fields) + [name for name in KEY_FIELDS if name not in fields]
+        columns = [f"{FIELDS[name][0]} AS {name}" for name in selected]
+        joins = _joins(selected)
+
+    conditions, params = [], []
+    for column, value in (
+        ("a.doctor_id", scope_doctor_id),
+        ("a.patient_id", scope_patient_id),
+        ("a.doctor_id", doctor_id),
+        ("a.patient_id", patient_id),
+        ("a.status", status)
+    ):
+        if value is not None:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+    if date_from is not None:
+        conditions.append("a.appointment_date >= %s")
+        params.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        conditions.append("a.appointment_date < %s")
+        params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if after is not None:
+        conditions.append("(a.appointment_date < %s OR (a.appointment_date = %s AND a.appointment_id < %s))")
+        params.extend([after[0], after[0], after[1]])
+
+    query = f"SELECT {', '.join(columns)} FROM APPOINTMENTS a"
+    if joins:
+        query += " " + " ".join(joins)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY a.appointment_date DESC, a.appointment_id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+def page(rows: List[Dict], limit: int, fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Trim a result fetched with limit + 1 rows into one page.
+
+    Returns:
+        (rows, next cursor or None on the last page)
+    """
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    if fields is not None:
+        hidden = [name for name in KEY_FIELDS if name not in fields]
+        if hidden:
+            rows = [{k: v for k, v in row.items() if k not in hidden} for row in rows]
+    return rows, next_cursor
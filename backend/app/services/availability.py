@@ -0,0 +1,396 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from app.config.database import db
+
+logger = logging.getLogger(__name__)
+
+DOCTORS_QUERY = """
+    SELECT d.doctor_id, u.first_name, u.last_name,
+           d.department_id, dep.department_name,
+           d.spec_id, s.spec_name
+    FROM DOCTORS d
+    JOIN USERS u ON d.user_id = u.user_id
+    JOIN DEPARTMENTS dep ON d.department_id = dep.department_id
+    JOIN SPECIALIZATIONS s ON d.spec_id = s.spec_id
+"""
+
+# Range read on idx_timeslots_start
+SLOTS_QUERY = """
+    SELECT ts.slot_id, ts.calendar_id, dc.doctor_id,
+           ts.start_time, ts.end_time, ts.is_available
+    FROM TIMESLOTS ts
+    JOIN DOCTOR_CALENDAR dc ON ts.calendar_id = dc.calendar_id
+    WHERE ts.start_time >= %(start)s AND ts.start_time < %(end)s
+"""
+
+# A free slot as yielded by DaySchedule.free_slots
+FreeSlot = Tuple[datetime, datetime, int, int, int]
+
+class DaySchedule:
+    """
+    The slots of one doctor on one day, sorted by start time.
+
+    Bit i of ``free`` is set when slot i is available, so flipping a slot
+    between booked and free is a single bit operation and scanning a day
+    for openings only visits free slots.
+    """
+
+    __slots__ = ("starts", "ends", "slot_ids", "calendar_ids", "free")
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.slot_ids: List[int] = []
+        self.calendar_ids: List[int] = []
+        self.free = 0
+
+    def insert(self, slot_id: int, calendar_id: int, start: datetime, end: datetime, available: bool):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.slot_ids.insert(i, slot_id)
+        self.calendar_ids.insert(i, calendar_id)
+        low = self.free & ((1 << i) - 1)
+        self.free = low | ((self.free >> i) << (i + 1)) | (int(bool(available)) << i)
+
+    def remove(self, slot_id: int):
+        i = self.slot_ids.index(slot_id)
+        del self.starts[i], self.ends[i], self.slot_ids[i], self.calendar_ids[i]
+        low = self.free & ((1 << i) - 1)
+        self.free = low | ((self.free >> (i + 1)) << i)
+
+    def set_available(self, slot_id: int, available: bool):
+        bit = 1 << self.slot_ids.index(slot_id)
+        self.free = self.free | bit if available else self.free & ~bit
+
+    def free_slots(self, doctor_id: int, after: datetime) -> Iterator[FreeSlot]:
+        """Yield the free slots starting at or after ``after`` in start order."""
+        i = bisect_left(self.starts, after)
+        bits = self.free >> i
+        while bits:
+            lowest = bits & -bits
+            i += lowest.bit_length() - 1
+            bits >>= lowest.bit_length()
+            yield self.starts[i], self.ends[i], self.slot_ids[i], self.calendar_ids[i], doctor_id
+            i += 1
+
+    def __len__(self) -> int:
+        return len(self.slot_ids)
+
+class AvailabilityIndex:
+    """
+    In-memory free/busy index of every doctor's slots over the next
+    ``horizon_days`` days, answering availability searches without a query.
+
+    Slots are grouped by day and doctor into DaySchedule bitmaps. Writes in
+    this worker update the index right after they commit (mark, upsert_slot,
+    remove_slot, refresh_doctor); changes made by other workers show up at
+    the next full reload, every ``refresh_interval`` seconds. Searches are
+    therefore a hint: booking still checks the slot in the database.
+    """
+
+    def __init__(self, horizon_days: int = 90, refresh_interval: float = 60):
+        self.horizon_days = horizon_days
+        self.refresh_interval = refresh_interval
+        self.horizon_start: Optional[date] = None
+        self.doctors: Dict[int, Dict] = {}
+        self.by_department: Dict[int, Set[int]] = {}
+        self.by_specialization: Dict[int, Set[int]] = {}
+        self.days: Dict[date, Dict[int, DaySchedule]] = {}
+        self.slot_days: Dict[int, Tuple[date, int]] = {}
+        # Updates applied while a reload is reading, replayed onto its result
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+        # One load at a time, so each replays exactly the journal it started
+        self._load_lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None
+        self._searches = 0
+        self._reloads = 0
+        self._reload_errors = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def horizon_end(self) -> Optional[date]:
+        """First day past the indexed window."""
+        if self.horizon_start is None:
+            return None
+        return self.horizon_start + timedelta(days=self.horizon_days)
+
+    def _record(self, method: str, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def _set_doctor(self, doctor: Dict):
+        doctor_id = doctor["doctor_id"]
+        previous = self.doctors.get(doctor_id)
+        if previous:
+            self.by_department.get(previous["department_id"], set()).discard(doctor_id)
+            self.by_specialization.get(previous["spec_id"], set()).discard(doctor_id)
+        self.doctors[doctor_id] = doctor
+        self.by_department.setdefault(doctor["department_id"], set()).add(doctor_id)
+        self.by_specialization.setdefault(doctor["spec_id"], set()).add(doctor_id)
+
+    def _insert(self, slot_id: int, doctor_id: int, calendar_id: int, start: datetime, end: datetime, available: bool):
+        day = start.date()
+        if self.horizon_start is None or not self.horizon_start <= day < self.horizon_end:
+            return
+        self.days.setdefault(day, {}).setdefault(doctor_id, DaySchedule()).insert(
+            slot_id, calendar_id, start, end, available
+        )
+        self.slot_days[slot_id] = (day, doctor_id)
+
+    def _remove(self, slot_id: int) -> bool:
+        location = self.slot_days.pop(slot_id, None)
+        if location is None:
+            return False
+        day, doctor_id = location
+        schedules = self.days[day]
+        schedules[doctor_id].remove(slot_id)
+        if not schedules[doctor_id]:
+            del schedules[doctor_id]
+            if not schedules:
+                del self.days[day]
+        return True
+
+    def mark(self, slot_id: int, available: bool):
+        """Flip a slot between free and booked."""
+        self._record("mark", slot_id, available)
+        location = self.slot_days.get(slot_id)
+        if location is not None:
+            day, doctor_id = location
+            self.days[day][doctor_id].set_available(slot_id, available)
+
+    def upsert_slot(self, slot_id: int, doctor_id: int, calendar_id: int, start: datetime, end: datetime, available: bool):
+        """Add a slot, or move and update one already indexed."""
+        self._record("upsert_slot", slot_id, doctor_id, calendar_id, start, end, available)
+        self._remove(slot_id)
+        self._insert(slot_id, doctor_id, calendar_id, start, end, available)
+
+    def remove_slot(self, slot_id: int):
+        """Drop a deleted slot."""
+        self._record("remove_slot", slot_id)
+        self._remove(slot_id)
+
+    def _replace_doctor(self, doctor: Optional[Dict], doctor_id: int, slots: List[Dict]):
+        self._record("_replace_doctor", doctor, doctor_id, slots)
+        if doctor:
+            self._set_doctor(doctor)
+        stale = [slot_id for slot_id, (_, owner) in self.slot_days.items() if owner == doctor_id]
+        for slot_id in stale:
+            self._remove(slot_id)
+        for row in slots:
+            self._insert(
+                row["slot_id"], doctor_id, row["calendar_id"],
+                row["start_time"], row["end_time"], row["is_available"]
+            )
+
+    def _window(self, today: date) -> Dict:
+        return {
+            "start": datetime.combine(today, datetime.min.time()),
+            "end": datetime.combine(today + timedelta(days=self.horizon_days), datetime.min.time())
+        }
+
+    async def load(self, today: Optional[date] = None):
+        """Rebuild the index from the database and swap it in."""
+        async with self._load_lock:
+            await self._load(today or date.today())
+
+    async def _load(self, today: date):
+        fresh = AvailabilityIndex(self.horizon_days, self.refresh_interval)
+        fresh.horizon_start = today
+        self._journal = []
+        try:
+            async with db.aget_db() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(DOCTORS_QUERY)
+                    for doctor in await cursor.fetchall():
+                        fresh._set_doctor(doctor)
+                    await cursor.execute(SLOTS_QUERY, self._window(today))
+                    for row in await cursor.fetchall():
+                        fresh._insert(
+                            row["slot_id"], row["doctor_id"], row["calendar_id"],
+                            row["start_time"], row["end_time"], row["is_available"]
+                        )
+            for method, args in self._journal:
+                getattr(fresh, method)(*args)
+        finally:
+            self._journal = None
+
+        self.horizon_start = fresh.horizon_start
+        self.doctors = fresh.doctors
+        self.by_department = fresh.by_department
+        self.by_specialization = fresh.by_specialization
+        self.days = fresh.days
+        self.slot_days = fresh.slot_days
+        self._loaded_at = time.monotonic()
+        self._reloads += 1
+        logger.info(f"Availability index loaded: {len(self.doctors)} doctors, {len(self.slot_days)} slots")
+
+    async def refresh_doctor(self, doctor_id: int):
+        """
+        Reload one doctor's details and slots, e.g. after bulk slot
+        generation. Failures are logged; the next full reload catches up.
+        """
+        if not self.loaded:
+            return
+        try:
+            async with db.aget_db() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(DOCTORS_QUERY + " WHERE d.doctor_id = %(doctor_id)s", {"doctor_id": doctor_id})
+                    doctor = await cursor.fetchone()
+                    await cursor.execute(
+                        SLOTS_QUERY + " AND dc.doctor_id = %(doctor_id)s",
+                        {**self._window(self.horizon_start), "doctor_id": doctor_id}
+                    )
+                    slots = await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Availability refresh of doctor {doctor_id} failed: {str(e)}")
+            return
+        self._replace_doctor(doctor, doctor_id, slots)
+
+    async def run_refresh(self):
+        """Reload the index every refresh_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                # Keep serving the previous index; retry after another interval
+                self._reload_errors += 1
+                logger.error(f"Availability index reload failed: {str(e)}")
+
+    def _doctor_filter(self, department_id: Optional[int], spec_id: Optional[int], doctor_id: Optional[int]) -> Optional[Set[int]]:
+        selected = None
+        if department_id is not None:
+            selected = set(self.by_department.get(department_id, ()))
+        if spec_id is not None:
+            matching = self.by_specialization.get(spec_id, set())
+            selected = selected & matching if selected is not None else set(matching)
+        if doctor_id is not None:
+            selected = {doctor_id} & selected if selected is not None else {doctor_id}
+        return selected
+
+    def search(
+        self,
+        department_id: Optional[int] = None,
+        spec_id: Optional[int] = None,
+        doctor_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: int = 50,
+        now: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Find free slots, earliest first.
+
+        Args:
+            department_id, spec_id, doctor_id: Optional filters, combined with AND
+            date_from, date_to: Inclusive day window, clipped to today and the horizon
+            limit: Maximum number of slots returned
+            now: Slots starting before this are skipped (defaults to the current time)
+
+        Returns:
+            Slot dicts shaped like the rows of GET /timeslots, plus the
+            doctor's specialization
+        """
+        self._searches += 1
+        now = now or datetime.now()
+        if self.horizon_start is None:
+            return []
+        first = max(date_from or now.date(), now.date(), self.horizon_start)
+        last = min(date_to or self.horizon_end, self.horizon_end - timedelta(days=1))
+        selected = self._doctor_filter(department_id, spec_id, doctor_id)
+
+        results = []
+        day = first
+        while day <= last and len(results) < limit:
+            schedules = self.days.get(day)
+            if schedules:
+                if selected is None:
+                    doctor_ids = [d for d, schedule in schedules.items() if schedule.free and d in self.doctors]
+                else:
+                    doctor_ids = [
+                        d for d in selected
+                        if d in schedules and schedules[d].free and d in self.doctors
+                    ]
+                merged = heapq.merge(*(schedules[d].free_slots(d, now) for d in doctor_ids))
+                results.extend(islice(merged, limit - len(results)))
+            day += timedelta(days=1)
+
+        return [self._to_dict(slot) for slot in results]
+
+    def next_available(
+        self,
+        doctor_id: Optional[int] = None,
+        department_id: Optional[int] = None,
+        spec_id: Optional[int] = None,
+        count: int = 5,
+        now: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        The next ``count`` free slots matching the filters, earliest first.
+
+        Days are walked forward from today and stop as soon as enough slots
+        were found; days without a free slot for the matched doctors cost one
+        bitmap test per doctor. The work therefore depends on the count and
+        the number of doctors matched, not on how many slots lie ahead.
+        """
+        return self.search(
+            department_id=department_id,
+            spec_id=spec_id,
+            doctor_id=doctor_id,
+            limit=count,
+            now=now
+        )
+
+    def _to_dict(self, slot: FreeSlot) -> Dict:
+        start, end, slot_id, calendar_id, doctor_id = slot
+        doctor = self.doctors[doctor_id]
+        return {
+            "slot_id": slot_id,
+            "calendar_id": calendar_id,
+            "start_time": start,
+            "end_time": end,
+            "is_available": True,
+            "doctor_id": doctor_id,
+            "doctor_first_name": doctor["first_name"],
+            "doctor_last_name": doctor["last_name"],
+            "department_id": doctor["department_id"],
+            "department_name": doctor["department_name"],
+            "spec_id": doctor["spec_id"],
+            "spec_name": doctor["spec_name"]
+        }
+
+    def stats(self) -> Dict:
+        loaded_at = self._loaded_at
+        return {
+            "doctors": len(self.doctors),
+            "days": len(self.days),
+            "slots": len(self.slot_days),
+            "free_slots": sum(
+                bin(schedule.free).count("1")
+                for schedules in self.days.values()
+                for schedule in schedules.values()
+            ),
+            "horizon_start": self.horizon_start.isoformat() if self.horizon_start else None,
+            "horizon_days": self.horizon_days,
+            "age": round(time.monotonic() - loaded_at, 3) if loaded_at is not None else None,
+            "refresh_interval": self.refresh_interval,
+            "searches": self._searches,
+            "reloads": self._reloads,
+            "reload_errors": self._reload_errors
+        }
+
+availability_index = AvailabilityIndex(
+    horizon_days=int(os.getenv("AVAILABILITY_HORIZON_DAYS", "90")),
+    refresh_interval=float(os.getenv("AVAILABILITY_REFRESH_INTERVAL", "60"))
+)
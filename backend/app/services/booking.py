@@ -0,0 +1,62 @@
+from typing import Optional
+
+# Claim a slot: of several concurrent bookings only one sees a row change,
+# because InnoDB re-checks the condition after taking the row lock
+CLAIM_SLOT_QUERY = """
+    UPDATE TIMESLOTS
+    SET is_available = FALSE
+    WHERE slot_id = %s AND is_available = TRUE
+"""
+
+# Doctor and appointment date come from the claimed slot in the same statement
+INSERT_APPOINTMENT_QUERY = """
+    INSERT INTO APPOINTMENTS (
+        patient_id, doctor_id, slot_id,
+        appointment_date, status, notes,
+        priority_flag
+    )
+    SELECT %s, dc.doctor_id, ts.slot_id, ts.start_time, 'Scheduled', %s, %s
+    FROM TIMESLOTS ts
+    JOIN DOCTOR_CALENDAR dc ON ts.calendar_id = dc.calendar_id
+    WHERE ts.slot_id = %s
+"""
+
+class SlotUnavailable(Exception):
+    """The slot does not exist or was already booked."""
+
+async def aclaim_slot(cursor, slot_id: int):
+    """
+    Mark a free slot as booked, or raise SlotUnavailable.
+
+    The claim holds the slot's row lock until the transaction ends, so
+    callers should commit or roll back promptly.
+    """
+    await cursor.execute(CLAIM_SLOT_QUERY, (slot_id,))
+    if cursor.rowcount != 1:
+        raise SlotUnavailable(slot_id)
+
+async def abook_slot(cursor, slot_id: int, patient_id: int, notes: Optional[str] = None, priority_flag: bool = False) -> int:
+    """
+    Book a slot for a patient in two statements: claim, then insert.
+
+    Must run inside a transaction; when the insert fails the caller's
+    rollback releases the claim as well.
+
+    Args:
+        cursor: aiomysql cursor of the open transaction
+        slot_id: Slot to book
+        patient_id: Patient the appointment is for
+        notes, priority_flag: Stored on the appointment
+
+    Returns:
+        The new appointment_id
+
+    Raises:
+        SlotUnavailable: The slot does not exist or is already booked
+    """
+    await aclaim_slot(cursor, slot_id)
+    await cursor.execute(INSERT_APPOINTMENT_QUERY, (patient_id, notes, bool(priority_flag), slot_id))
+    if cursor.rowcount != 1:
+        # A slot always belongs to a calendar, so this means broken data
+        raise ValueError(f"Time slot {slot_id} has no doctor calendar")
+    return cursor.lastrowid
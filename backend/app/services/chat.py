@@ -0,0 +1,221 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# CONVERSATIONS holds one row per user and counterpart: the newest message
+# either way and how many of the counterpart's messages the user has not
+# read. A message touches both rows of its pair in the transaction that
+# inserts it, so reads never aggregate CHAT_MESSAGES.
+
+# Rows are written in key order so two users messaging each other at the
+# same time lock them in the same order. Rows of one statement that share a
+# key are applied one after the other, so a batch adds up correctly.
+RECORD_MESSAGES_QUERY = """
+    INSERT INTO CONVERSATIONS (user_id, contact_id, last_message_id, last_sent_at, unread_count)
+    VALUES {values}
+    ON DUPLICATE KEY UPDATE
+        last_sent_at = IF(VALUES(last_message_id) > last_message_id, VALUES(last_sent_at), last_sent_at),
+        last_message_id = GREATEST(last_message_id, VALUES(last_message_id)),
+        unread_count = unread_count + VALUES(unread_count)
+"""
+
+MARK_READ_QUERY = """
+    UPDATE CONVERSATIONS
+    SET unread_count = GREATEST(unread_count - %s, 0)
+    WHERE user_id = %s AND contact_id = %s
+"""
+
+# Rebuilds the rows of a range of users from their message history
+BACKFILL_QUERY = """
+    INSERT INTO CONVERSATIONS (user_id, contact_id, last_message_id, last_sent_at, unread_count)
+    SELECT t.user_id, t.contact_id, t.last_message_id, m.sent_at, t.unread_count
+    FROM (
+        SELECT user_id, contact_id, MAX(message_id) AS last_message_id, SUM(unread) AS unread_count
+        FROM (
+            SELECT sender_id AS user_id, receiver_id AS contact_id, message_id, 0 AS unread
+            FROM CHAT_MESSAGES
+            WHERE sender_id BETWEEN %s AND %s
+            UNION ALL
+            SELECT receiver_id AS user_id, sender_id AS contact_id, message_id, read_status = FALSE AS unread
+            FROM CHAT_MESSAGES
+            WHERE receiver_id BETWEEN %s AND %s
+        ) pair
+        GROUP BY user_id, contact_id
+    ) t
+    JOIN CHAT_MESSAGES m ON m.message_id = t.last_message_id
+    ON DUPLICATE KEY UPDATE
+        last_message_id = VALUES(last_message_id),
+        last_sent_at = VALUES(last_sent_at),
+        unread_count = VALUES(unread_count)
+"""
+
+MESSAGE_COLUMNS = """
+    message_id, sender_id, receiver_id, message, message_type,
+    sent_at, read_status, is_urgent
+"""
+
+CONTACT_COLUMNS = """
+    u.user_id, u.first_name, u.last_name, u.email,
+    COALESCE(c.unread_count, 0) AS unread_count,
+    m.message AS last_message, m.sent_at AS last_message_time
+"""
+
+async def arecord_messages(cursor, messages: Iterable[Tuple[int, int, int, datetime]]):
+    """
+    Update both CONVERSATIONS rows of each new message in one statement.
+
+    Run in the transaction that inserts the messages. The receiver's unread
+    count goes up by one per message; the sender's does not.
+
+    Args:
+        messages: (sender_id, receiver_id, message_id, sent_at) tuples
+    """
+    rows = sorted(
+        row
+        for sender_id, receiver_id, message_id, sent_at in messages
+        for row in (
+            (sender_id, receiver_id, message_id, sent_at, 0),
+            (receiver_id, sender_id, message_id, sent_at, 1)
+        )
+    )
+    if not rows:
+        return
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    await cursor.execute(RECORD_MESSAGES_QUERY.format(values=values), [value for row in rows for value in row])
+
+async def arecord_message(cursor, sender_id: int, receiver_id: int, message_id: int, sent_at: datetime):
+    """Update both CONVERSATIONS rows of a new message; see arecord_messages."""
+    await arecord_messages(cursor, [(sender_id, receiver_id, message_id, sent_at)])
+
+async def amark_read(cursor, user_id: int, contact_id: int, count: int):
+    """
+    Take ``count`` newly read messages from contact_id off the user's unread count.
+
+    Run in the transaction whose UPDATE of CHAT_MESSAGES read_status
+    affected those ``count`` rows.
+    """
+    if count:
+        await cursor.execute(MARK_READ_QUERY, (count, user_id, contact_id))
+
+async def amark_page_read(cursor, user_id: int, contact_id: int, messages: List[Dict]) -> int:
+    """
+    Mark the unread messages from contact_id in one page of history as read.
+
+    One UPDATE by primary key for the whole page, followed by the matching
+    CONVERSATIONS decrement; run both in the transaction serving the page.
+
+    Returns:
+        Number of messages marked read
+    """
+    unread = [
+        row["message_id"] for row in messages
+        if row["sender_id"] == contact_id and row["receiver_id"] == user_id and not row["read_status"]
+    ]
+    if not unread:
+        return 0
+    await cursor.execute(
+        f"UPDATE CHAT_MESSAGES SET read_status = TRUE "
+        f"WHERE message_id IN ({', '.join(['%s'] * len(unread))}) AND read_status = FALSE",
+        unread
+    )
+    marked = cursor.rowcount
+    await amark_read(cursor, user_id, contact_id, marked)
+    return marked
+
+def backfill_conversations(cursor, first_user_id: int, last_user_id: int) -> int:
+    """
+    Rebuild the CONVERSATIONS rows of users first_user_id..last_user_id.
+
+    Safe to rerun; existing rows are overwritten with the recomputed values.
+
+    Returns:
+        Rows affected as reported by MySQL (2 per updated row)
+    """
+    cursor.execute(BACKFILL_QUERY, (first_user_id, last_user_id, first_user_id, last_user_id))
+    return cursor.rowcount
+
+def build_contacts_query(user_id: int, conversations_only: bool = False, limit: int = 50, offset: int = 0) -> Tuple[str, List]:
+    """
+    Build the contact list of a user with unread counts and last messages.
+
+    Args:
+        user_id: The user whose contacts are listed
+        conversations_only: Only users with at least one message either way,
+            most recent conversation first, read as one range of the user's
+            CONVERSATIONS rows; otherwise every other user by name
+        limit, offset: The page
+
+    Returns:
+        (query, params)
+    """
+    if conversations_only:
+        query = f"""
+            SELECT {CONTACT_COLUMNS}
+            FROM CONVERSATIONS c
+            JOIN USERS u ON u.user_id = c.contact_id
+            JOIN CHAT_MESSAGES m ON m.message_id = c.last_message_id
+            WHERE c.user_id = %s
+            ORDER BY c.last_message_id DESC
+        """
+        params: List = [user_id]
+    else:
+        query = f"""
+            SELECT {CONTACT_COLUMNS}
+            FROM USERS u
+            LEFT JOIN CONVERSATIONS c ON c.user_id = %s AND c.contact_id = u.user_id
+            LEFT JOIN CHAT_MESSAGES m ON m.message_id = c.last_message_id
+            WHERE u.user_id != %s
+            ORDER BY u.first_name, u.last_name, u.user_id
+        """
+        params = [user_id, user_id]
+    query += " LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    return query, params
+
+def build_history_query(
+    user_id: int,
+    contact_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = 50
+) -> Tuple[str, List]:
+    """
+    Build one page of the messages between two users.
+
+    Each direction of the conversation is read from the (sender_id,
+    receiver_id, message_id) index starting at the cursor and stopping after
+    ``limit`` rows, so the cost of a page does not grow with the thread.
+
+    Args:
+        user_id, contact_id: The two sides of the conversation
+        before: Only messages older than this message id, newest first
+        after: Only messages newer than this message id; the page holds
+            the ones right after the cursor and is returned oldest first
+        limit: Page size
+
+    Returns:
+        (query, params)
+    """
+    if after is not None:
+        bound, order = ("message_id > %s", after), "ASC"
+    elif before is not None:
+        bound, order = ("message_id < %s", before), "DESC"
+    else:
+        bound, order = None, "DESC"
+
+    pairs = [(user_id, contact_id)]
+    if contact_id != user_id:
+        pairs.append((contact_id, user_id))
+
+    branches, params = [], []
+    for sender_id, receiver_id in pairs:
+        branch = f"SELECT {MESSAGE_COLUMNS} FROM CHAT_MESSAGES WHERE sender_id = %s AND receiver_id = %s"
+        params.extend([sender_id, receiver_id])
+        if bound is not None:
+            branch += f" AND {bound[0]}"
+            params.append(bound[1])
+        branches.append(f"({branch} ORDER BY message_id {order} LIMIT %s)")
+        params.append(limit)
+
+    query = f"SELECT * FROM ({' UNION ALL '.join(branches)}) page ORDER BY message_id {order} LIMIT %s"
+    params.append(limit)
+    return query, params
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from time import monotonic
+from typing import Dict, List, Optional
+from app.config.database import db
+from app.services.chat import arecord_messages
+
+logger = logging.getLogger(__name__)
+
+INSERT_MESSAGES_QUERY = """
+    INSERT INTO CHAT_MESSAGES (
+        sender_id, receiver_id, message, sent_at,
+        is_urgent, read_status, message_type
+    ) VALUES {values}
+"""
+
+class MessageWriter:
+    """
+    Write-behind batching of chat messages received over WebSocket.
+
+    submit() queues a message and waits for it to be committed. A single
+    writer task collects what arrives within ``max_delay`` seconds of the
+    first message, up to ``max_batch`` messages, and persists the batch in
+    one transaction: one multi-row INSERT into CHAT_MESSAGES and one
+    CONVERSATIONS update.
+
+    With innodb_autoinc_lock_mode 0 or 1, a multi-row INSERT with a VALUES
+    list reserves its auto-increment values in one step, so the ids are
+    consecutive from the first id the server reports, spaced by
+    auto_increment_increment. Mode 2 (the MySQL 8 default) makes no such
+    promise, so there each message gets its own INSERT, still in the
+    batch's single transaction. If a batch fails, its messages are retried
+    one by one so a bad message (e.g. an unknown receiver) only fails its
+    own submit().
+    """
+
+    def __init__(self, max_batch: int = 100, max_delay: float = 0.005):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._increment: Optional[int] = None
+        self._consecutive_ids: Optional[bool] = None
+        self._stopping = False
+        self._batches = 0
+        self._messages = 0
+        self._retried = 0
+        self._errors = 0
+        self._flush_time = 0.0
+
+    async def submit(
+        self,
+        sender_id: int,
+        receiver_id: int,
+        message: str,
+        is_urgent: bool = False,
+        message_type: str = "Text"
+    ) -> Dict:
+        """
+        Persist a message with the next batch.
+
+        Returns:
+            The stored message, once its transaction has committed
+
+        Raises:
+            DatabaseError: The message could not be stored
+        """
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self.run())
+        row = {
+            "message_id": None,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "message": message,
+            "message_type": message_type,
+            "sent_at": datetime.now().replace(microsecond=0),
+            "read_status": False,
+            "is_urgent": bool(is_urgent)
+        }
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, done))
+        return await done
+
+    async def _collect(self) -> List:
+        """
+        Wait for a batch. The None that close() queues ends the batch and
+        stops the writer once it is flushed.
+        """
+        item = await self._queue.get()
+        batch = []
+        deadline = monotonic() + self.max_delay
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch
+            # Take whatever is already waiting before waiting for more
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+                continue
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return batch
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return batch
+        self._stopping = True
+        return batch
+
+    async def _insert(self, rows: List[Dict]):
+        async with db.atransaction() as conn:
+            async with conn.cursor() as cursor:
+                if self._increment is None:
+                    await cursor.execute(
+                        "SELECT @@auto_increment_increment AS step, @@innodb_autoinc_lock_mode AS lock_mode"
+                    )
+                    settings = await cursor.fetchone()
+                    self._increment = settings["step"]
+                    self._consecutive_ids = settings["lock_mode"] in (0, 1)
+                if self._consecutive_ids:
+                    ids = await self._insert_rows(cursor, rows)
+                else:
+                    ids = []
+                    for row in rows:
+                        ids.extend(await self._insert_rows(cursor, [row]))
+                await arecord_messages(cursor, [
+                    (row["sender_id"], row["receiver_id"], message_id, row["sent_at"])
+                    for row, message_id in zip(rows, ids)
+                ])
+        for row, message_id in zip(rows, ids):
+            row["message_id"] = message_id
+
+    async def _insert_rows(self, cursor, rows: List[Dict]) -> List[int]:
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+        params = []
+        for row in rows:
+            params.extend([
+                row["sender_id"], row["receiver_id"], row["message"], row["sent_at"],
+                row["is_urgent"], row["read_status"], row["message_type"]
+            ])
+        await cursor.execute(INSERT_MESSAGES_QUERY.format(values=values), params)
+        first_id = cursor.lastrowid
+        return [first_id + i * self._increment for i in range(len(rows))]
+
+    async def flush(self, batch: List):
+        """Persist a batch and resolve each submit() with its message or error."""
+        started = monotonic()
+        try:
+            await self._insert([row for row, _ in batch])
+            results = [(done, row, None) for row, done in batch]
+        except Exception as e:
+            if len(batch) == 1:
+                results = [(batch[0][1], None, e)]
+            else:
+                logger.warning(f"Chat batch of {len(batch)} failed, retrying one by one: {str(e)}")
+                self._retried += 1
+                results = []
+                for row, done in batch:
+                    try:
+                        await self._insert([row])
+                        results.append((done, row, None))
+                    except Exception as single_error:
+                        results.append((done, None, single_error))
+
+        for done, row, error in results:
+            if done.done():
+                continue
+            if error is None:
+                done.set_result(row)
+            else:
+                self._errors += 1
+                done.set_exception(error)
+        self._batches += 1
+        self._messages += len(batch)
+        self._flush_time += monotonic() - started
+
+    async def run(self):
+        """Collect and flush batches until cancelled or closed."""
+        self._stopping = False
+        while not self._stopping:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                await self.flush(batch)
+            except asyncio.CancelledError:
+                for _, done in batch:
+                    done.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Chat message writer failed: {str(e)}")
+                for _, done in batch:
+                    if not done.done():
+                        done.set_exception(e)
+
+    async def close(self):
+        """Flush what is queued and stop the writer task."""
+        if self._writer is None:
+            return
+        if not self._writer.done():
+            # Queued behind every pending message, so the writer finishes
+            # its batches, including one mid-commit, before it stops
+            self._queue.put_nowait(None)
+            await self._writer
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        if batch:
+            await self.flush(batch)
+        self._writer = None
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_delay": self.max_delay,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "messages": self._messages,
+            "avg_batch_size": round(self._messages / self._batches, 2) if self._batches else 0,
+            "avg_flush_time": round(self._flush_time / self._batches, 6) if self._batches else 0,
+            "batch_retries": self._retried,
+            "errors": self._errors,
+            "consecutive_ids": self._consecutive_ids
+        }
+
+message_writer = MessageWriter(
+    max_batch=int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100")),
+    max_delay=float(os.getenv("CHAT_WRITE_DELAY_MS", "5")) / 1000
+)
@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from app.config.database import db, aiomysql
+
+logger = logging.getLogger(__name__)
+
+# Rows read from the server-side cursor per chunk sent to the client
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# MySQL aborts an unbuffered result when the client stops reading for this
+# long; a slow download keeps the server waiting, so allow more than the default
+EXPORT_NET_WRITE_TIMEOUT = int(os.getenv("EXPORT_NET_WRITE_TIMEOUT", "600"))
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (timedelta, Decimal)):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+def _json_default(value):
+    plain = _plain(value)
+    if plain is value:
+        raise TypeError(f"Cannot export {type(value).__name__}")
+    return plain
+
+class NDJSONEncoder:
+    """One JSON object per line."""
+
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def header(self, columns: Sequence[str]) -> bytes:
+        return b""
+
+    def encode(self, rows: List[Dict]) -> bytes:
+        return "".join(json.dumps(row, default=_json_default) + "\n" for row in rows).encode()
+
+class CSVEncoder:
+    """RFC 4180 CSV with a header row taken from the cursor description."""
+
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self.columns: List[str] = []
+
+    def _write(self, records) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+
+    def header(self, columns: Sequence[str]) -> bytes:
+        self.columns = list(columns)
+        return self._write([self.columns])
+
+    def encode(self, rows: List[Dict]) -> bytes:
+        return self._write([_plain(row.get(column)) for column in self.columns] for row in rows)
+
+ENCODERS = {
+    "ndjson": NDJSONEncoder,
+    "csv": CSVEncoder
+}
+
+def get_encoder(fmt: str):
+    """
+    Create the encoder for an export format.
+
+    Raises:
+        ValueError: The format is not supported
+    """
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unsupported format. Use one of: {', '.join(ENCODERS)}")
+    return ENCODERS[fmt]()
+
+async def stream_query(
+    query: str,
+    params: Optional[Sequence],
+    encoder,
+    batch_size: Optional[int] = None,
+    conn=None
+) -> AsyncIterator[bytes]:
+    """
+    Run a query on a server-side cursor and yield the encoded result in chunks.
+
+    Only one batch of rows is held in memory at a time. The connection is
+    held for the whole stream; if the client goes away before the end, it
+    is closed rather than drained.
+
+    Args:
+        query, params: The SELECT to export
+        encoder: NDJSONEncoder or CSVEncoder instance
+        batch_size: Rows per chunk, EXPORT_BATCH_SIZE by default
+        conn: The request connection. Pass it so an export holds a single
+            connection; checking out a second one while the request holds
+            its own deadlocks once the pool is exhausted by exports.
+
+    Yields:
+        Encoded chunks, starting with the header if the format has one
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    async with db.aget_db(conn) as conn:
+        cursor = await conn.cursor(aiomysql.SSDictCursor)
+        finished = False
+        try:
+            await cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+            await cursor.execute(query, params)
+            header = encoder.header([column[0] for column in cursor.description or ()])
+            if header:
+                yield header
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield encoder.encode(rows)
+            finished = True
+        finally:
+            if finished:
+                await cursor.close()
+            else:
+                # Closing the cursor would read every remaining row first
+                logger.warning("Export aborted before the end; closing its connection")
+                conn.close()
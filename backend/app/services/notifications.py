@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+import smtplib
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from time import monotonic
+from typing import Dict, List, Optional
+from app.config.database import db
+from app.config.settings import settings
+from app.services.pubsub import bus as pubsub_bus
+from app.services.websockets import SocketManager
+
+logger = logging.getLogger(__name__)
+
+class NotificationManager(SocketManager):
+    """
+    Notification sockets of the users connected to this worker. When a
+    socket falls WS_SEND_QUEUE_SIZE messages behind, its backlog is replaced
+    by one overflow message and the client refetches GET /notifications.
+    """
+
+    def __init__(self, bus=pubsub_bus):
+        super().__init__("medihub:notifications", bus, policy="coalesce")
+
+    async def send_notification(self, user_id: int, message: Dict) -> int:
+        return await self.publish(user_id, message)
+
+notification_manager = NotificationManager()
+
+# Queues a notification for the outbox; run in the transaction that inserts it
+ENQUEUE_QUERY = """
+    INSERT INTO NOTIFICATION_DELIVERY (notif_id, next_attempt_at)
+    VALUES (%s, %s)
+"""
+
+# Due deliveries, oldest first. Rows locked by another worker's claim are
+# skipped, so every worker can run the outbox.
+CLAIM_BATCH_QUERY = """
+    SELECT d.notif_id, d.attempts, n.user_id, n.notification_type, n.content,
+           u.email, u.phone
+    FROM NOTIFICATION_DELIVERY d
+    JOIN NOTIFICATIONS n ON n.notif_id = d.notif_id
+    JOIN USERS u ON u.user_id = n.user_id
+    WHERE d.delivered_at IS NULL AND d.next_attempt_at <= %s
+    ORDER BY d.next_attempt_at, d.notif_id
+    LIMIT %s
+    FOR UPDATE OF d SKIP LOCKED
+"""
+
+# Counts the attempt and hides the claimed rows from other workers until
+# the lease ends; if this worker dies mid-send they are retried after it
+LEASE_QUERY = """
+    UPDATE NOTIFICATION_DELIVERY
+    SET attempts = attempts + 1, next_attempt_at = %s
+    WHERE notif_id IN ({ids})
+"""
+
+DELIVERED_QUERY = """
+    UPDATE NOTIFICATION_DELIVERY
+    SET delivered_at = %s, next_attempt_at = NULL, last_error = NULL
+    WHERE notif_id IN ({ids})
+"""
+
+# One row per failed delivery: (notif_id, next_attempt_at, last_error),
+# with a NULL next_attempt_at once the attempts are used up
+FAILED_QUERY = """
+    UPDATE NOTIFICATION_DELIVERY d
+    JOIN ({rows}) f ON f.notif_id = d.notif_id
+    SET d.next_attempt_at = f.next_attempt_at, d.last_error = f.last_error
+"""
+
+def _placeholders(count: int) -> str:
+    return ", ".join(["%s"] * count)
+
+class WebSocketChannel:
+    """Push to the user's notification sockets on any worker; fails while they are offline."""
+
+    def __init__(self, manager: NotificationManager = notification_manager):
+        self.manager = manager
+
+    async def send(self, notification: Dict) -> bool:
+        reached = await self.manager.send_notification(notification["user_id"], {
+            "type": "notification",
+            "data": {
+                "id": notification["notif_id"],
+                "content": notification["content"],
+                "type": notification["notification_type"]
+            }
+        })
+        return reached > 0
+
+class SMTPChannel:
+    """Email through the SMTP server of the SMTP_* settings."""
+
+    def _send(self, notification: Dict):
+        message = EmailMessage()
+        message["From"] = f"{settings.EMAILS_FROM_NAME} <{settings.EMAILS_FROM_EMAIL}>"
+        message["To"] = notification["email"]
+        message["Subject"] = f"{settings.PROJECT_NAME} notification"
+        message.set_content(notification["content"] or "")
+        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30) as server:
+            if settings.SMTP_TLS:
+                server.starttls()
+            if settings.SMTP_USER:
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+            server.send_message(message)
+
+    async def send(self, notification: Dict) -> bool:
+        if not notification.get("email"):
+            raise ValueError("User has no email address")
+        await asyncio.to_thread(self._send, notification)
+        return True
+
+class LogChannel:
+    """
+    Writes the notification to the log instead of sending it; the default
+    for SMS, and for email when SMTP_HOST is not set.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def send(self, notification: Dict) -> bool:
+        logger.info(f"{self.name} notification {notification['notif_id']} for user {notification['user_id']}: {notification['content']}")
+        return True
+
+class StubChannel:
+    """Records what it is asked to send; for tests and benchmarks."""
+
+    def __init__(self, result: bool = True):
+        self.result = result
+        self.sent: List[Dict] = []
+
+    async def send(self, notification: Dict) -> bool:
+        self.sent.append(notification)
+        return self.result
+
+def default_channels() -> Dict:
+    """Channels per NOTIFICATIONS.notification_type; anything else is pushed."""
+    return {
+        "Push": WebSocketChannel(),
+        "Email": SMTPChannel() if settings.SMTP_HOST else LogChannel("Email"),
+        "SMS": LogChannel("SMS")
+    }
+
+class NotificationOutbox:
+    """
+    Delivers the notifications queued in NOTIFICATION_DELIVERY.
+
+    Writers insert the NOTIFICATIONS row and its NOTIFICATION_DELIVERY row
+    (ENQUEUE_QUERY) in one transaction, then call wake() so delivery starts
+    right away. Each batch is claimed in a short transaction that leases
+    the rows for ``lease`` seconds, sent concurrently over the channel of
+    its notification_type with no transaction open, and settled in a second
+    transaction: one UPDATE sets delivered_at for everything delivered and
+    one schedules the rest for another attempt after an exponential
+    backoff. After ``max_attempts`` a notification is left undelivered and
+    only shows up in GET /notifications. NOTIFICATIONS.sent_status is the
+    user's read flag and is never touched here.
+    """
+
+    def __init__(
+        self,
+        channels: Optional[Dict] = None,
+        batch_size: int = 100,
+        interval: float = 5,
+        max_attempts: int = 8,
+        retry_base: float = 5,
+        retry_max: float = 3600,
+        lease: float = 120
+    ):
+        self._channels = channels
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self._wake = asyncio.Event()
+        self._delivered = 0
+        self._retried = 0
+        self._abandoned = 0
+        self._batches = 0
+        self._errors = 0
+        self._busy_time = 0.0
+        self._last_rate = 0.0
+
+    @property
+    def channels(self) -> Dict:
+        if self._channels is None:
+            self._channels = default_channels()
+        return self._channels
+
+    def wake(self):
+        """Deliver now instead of at the next poll."""
+        self._wake.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before attempt number ``attempts + 1``."""
+        return min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+
+    async def _send(self, notification: Dict) -> Optional[str]:
+        channel = self.channels.get(notification["notification_type"], self.channels["Push"])
+        try:
+            if await channel.send(notification):
+                return None
+            return "Recipient not connected"
+        except Exception as e:
+            return str(e)[:255]
+
+    async def _claim(self, now: datetime) -> List[Dict]:
+        async with db.atransaction() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(CLAIM_BATCH_QUERY, (now, self.batch_size))
+                batch = await cursor.fetchall()
+                if batch:
+                    await cursor.execute(
+                        LEASE_QUERY.format(ids=_placeholders(len(batch))),
+                        [now + timedelta(seconds=self.lease)] + [n["notif_id"] for n in batch]
+                    )
+        return batch
+
+    async def _settle(self, now: datetime, sent: List[int], failed: List):
+        params = []
+        for notification, error in failed:
+            attempts = notification["attempts"] + 1
+            next_attempt_at = None
+            if attempts < self.max_attempts:
+                next_attempt_at = now + timedelta(seconds=self.backoff(attempts))
+            params.extend([notification["notif_id"], next_attempt_at, error])
+        rows = " UNION ALL ".join(
+            ["SELECT %s AS notif_id, %s AS next_attempt_at, %s AS last_error"]
+            + ["SELECT %s, %s, %s"] * (len(failed) - 1)
+        )
+
+        async with db.atransaction() as conn:
+            async with conn.cursor() as cursor:
+                if sent:
+                    await cursor.execute(DELIVERED_QUERY.format(ids=_placeholders(len(sent))), [now] + sent)
+                if failed:
+                    await cursor.execute(FAILED_QUERY.format(rows=rows), params)
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """
+        Deliver one batch.
+
+        Returns:
+            Number of notifications claimed
+        """
+        now = now or datetime.now()
+        started = monotonic()
+        batch = await self._claim(now)
+        if not batch:
+            return 0
+
+        errors = await asyncio.gather(*(self._send(notification) for notification in batch))
+        sent = [n["notif_id"] for n, error in zip(batch, errors) if error is None]
+        failed = [(n, error) for n, error in zip(batch, errors) if error is not None]
+        # Back off from when the sends finished, not from the claim
+        await self._settle(now + timedelta(seconds=monotonic() - started), sent, failed)
+
+        elapsed = monotonic() - started
+        self._batches += 1
+        self._delivered += len(sent)
+        self._retried += len(failed)
+        self._abandoned += sum(n["attempts"] + 1 >= self.max_attempts for n, _ in failed)
+        self._busy_time += elapsed
+        self._last_rate = len(batch) / elapsed if elapsed > 0 else 0.0
+        return len(batch)
+
+    async def run(self):
+        """Deliver until cancelled; full batches are followed immediately by the next."""
+        while True:
+            self._wake.clear()
+            claimed = 0
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Notification outbox run failed: {str(e)}")
+            if claimed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_size,
+            "interval": self.interval,
+            "max_attempts": self.max_attempts,
+            "lease": self.lease,
+            "batches": self._batches,
+            "delivered": self._delivered,
+            "failed_attempts": self._retried,
+            "abandoned": self._abandoned,
+            "errors": self._errors,
+            "notifications_per_second": round(self._delivered / self._busy_time, 1) if self._busy_time else 0.0,
+            "last_batch_per_second": round(self._last_rate, 1)
+        }
+
+notification_outbox = NotificationOutbox(
+    batch_size=int(os.getenv("NOTIFY_BATCH_SIZE", "100")),
+    interval=float(os.getenv("NOTIFY_POLL_INTERVAL", "5")),
+    max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8")),
+    retry_base=float(os.getenv("NOTIFY_RETRY_BASE", "5"))
+)
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is only needed when PUBSUB_BACKEND=redis
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Called with each message published on a channel this process subscribed to
+Handler = Callable[[str], Awaitable[None]]
+
+class InMemoryBus:
+    """
+    Channels within this process. Messages are strings, normally JSON
+    encoded once by the publisher.
+
+    Enough for a single worker: a published message goes straight to the
+    local subscriber of its channel, if there is one.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._published = 0
+        self._delivered = 0
+        self._errors = 0
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+
+    async def _deliver(self, channel: str, message: str) -> int:
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return 0
+        try:
+            await handler(message)
+            self._delivered += 1
+            return 1
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Delivery on channel {channel} failed: {str(e)}")
+            return 0
+
+    async def publish(self, channel: str, message: str) -> int:
+        """
+        Publish a message on a channel.
+
+        Returns:
+            Number of subscribed processes it reached; 0 if nobody listens
+        """
+        self._published += 1
+        return await self._deliver(channel, message)
+
+    async def close(self):
+        self._handlers.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self).__name__,
+            "channels": len(self._handlers),
+            "published": self._published,
+            "delivered": self._delivered,
+            "errors": self._errors
+        }
+
+class RedisBus(InMemoryBus):
+    """
+    Channels shared by every worker and host through Redis pub/sub.
+
+    Each process subscribes only to the channels of the users connected to
+    it, so Redis forwards a message to the one worker holding the recipient
+    instead of broadcasting it to all of them. If Redis cannot be reached,
+    a publish still reaches a local subscriber.
+    """
+
+    # Seconds between reconnect attempts of the reader
+    RETRY_DELAY = 1.0
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("PUBSUB_BACKEND=redis requires the redis package")
+        super().__init__()
+        self.client = aioredis.Redis.from_url(url)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+
+    async def subscribe(self, channel: str, handler: Handler):
+        await super().subscribe(channel, handler)
+        await self._pubsub.subscribe(channel)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, channel: str):
+        await super().unsubscribe(channel)
+        await self._pubsub.unsubscribe(channel)
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py reconnects and resubscribes on the next read
+                self._errors += 1
+                logger.error(f"Redis pub/sub read failed: {str(e)}")
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            await self._deliver(message["channel"].decode(), message["data"].decode())
+
+    async def publish(self, channel: str, message: str) -> int:
+        self._published += 1
+        try:
+            return await self.client.publish(channel, message)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Redis publish on {channel} failed, delivering locally only: {str(e)}")
+            return await self._deliver(channel, message)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await super().close()
+        await self._pubsub.close()
+        await self.client.close()
+
+def create_bus():
+    """Build the bus configured by the PUBSUB_BACKEND setting."""
+    if os.getenv("PUBSUB_BACKEND", "memory").lower() == "redis":
+        return RedisBus(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryBus()
+
+bus = create_bus()
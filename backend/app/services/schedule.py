@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.config.database import db
+from app.services.availability import availability_index
+from app.services.timeslots import Interval, acreate_slots, alock_calendar, generate_candidates
+
+logger = logging.getLogger(__name__)
+
+# (day_of_week, start, end) of one weekly DOCTOR_SCHEDULE rule, 0=Monday
+Rule = Tuple[int, time, time]
+
+SCHEDULE_RULES_QUERY = """
+    SELECT doctor_id, day_of_week, start_time, end_time
+    FROM DOCTOR_SCHEDULE
+    WHERE is_available = TRUE
+    ORDER BY doctor_id
+"""
+
+MATERIALIZATION_QUERY = """
+    SELECT doctor_id, materialized_through
+    FROM SCHEDULE_MATERIALIZATION
+"""
+
+LOCK_MATERIALIZATION_QUERY = """
+    SELECT materialized_through
+    FROM SCHEDULE_MATERIALIZATION
+    WHERE doctor_id = %s
+    FOR UPDATE
+"""
+
+SAVE_MATERIALIZATION_QUERY = """
+    INSERT INTO SCHEDULE_MATERIALIZATION (doctor_id, materialized_through)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE materialized_through = VALUES(materialized_through)
+"""
+
+# Run in the transaction that replaces a doctor's rules
+RESET_MATERIALIZATION_QUERY = """
+    DELETE FROM SCHEDULE_MATERIALIZATION
+    WHERE doctor_id = %s
+"""
+
+def as_time(value) -> time:
+    """TIME columns come back as timedelta from the MySQL drivers."""
+    if isinstance(value, timedelta):
+        return (datetime.min + value).time()
+    return value
+
+def schedule_candidates(rules: Iterable[Rule], start_date: date, end_date: date, slot_duration: timedelta) -> List[Interval]:
+    """
+    Lay out the slots of weekly rules over a date range.
+
+    Where rules of one day overlap, the earlier slot wins so the result
+    never contains overlapping candidates.
+
+    Returns:
+        Sorted, non-overlapping (start, end) pairs
+    """
+    candidates = []
+    for day_of_week, start, end in rules:
+        candidates.extend(generate_candidates(start_date, end_date, start, end, slot_duration, [day_of_week]))
+    candidates.sort()
+
+    result = []
+    for start, end in candidates:
+        if not result or start >= result[-1][1]:
+            result.append((start, end))
+    return result
+
+class ScheduleMaterializer:
+    """
+    Keeps a rolling ``horizon_days`` window of TIMESLOTS generated from each
+    doctor's DOCTOR_SCHEDULE rules.
+
+    SCHEDULE_MATERIALIZATION records the last day generated per doctor, so
+    each run only adds the days that entered the window since the previous
+    one. A doctor's calendar row is locked while their slots are generated,
+    so workers running the job at the same time do not duplicate slots; the
+    overlap check in acreate_slots makes reruns after a crash harmless.
+    Replacing a doctor's rules resets their row and the next run fills the
+    whole window with slots that do not clash with existing ones.
+    """
+
+    def __init__(self, horizon_days: int = 56, slot_minutes: int = 30, interval: float = 3600):
+        self.horizon_days = horizon_days
+        self.slot_duration = timedelta(minutes=slot_minutes)
+        self.interval = interval
+        self._wake = asyncio.Event()
+        self._last_run: Optional[float] = None
+        self._runs = 0
+        self._slots_created = 0
+        self._errors = 0
+
+    def wake(self):
+        """Start the next run now, e.g. after a doctor's rules changed."""
+        self._wake.set()
+
+    def _window_end(self, today: date) -> date:
+        return today + timedelta(days=self.horizon_days - 1)
+
+    async def materialize_doctor(self, doctor_id: int, rules: List[Rule], today: Optional[date] = None) -> int:
+        """
+        Generate the doctor's slots for the days not materialized yet.
+
+        Returns:
+            Number of slots created
+        """
+        today = today or date.today()
+        last = self._window_end(today)
+        async with db.atransaction() as conn:
+            async with conn.cursor() as cursor:
+                calendar_id = await alock_calendar(cursor, doctor_id)
+                await cursor.execute(LOCK_MATERIALIZATION_QUERY, (doctor_id,))
+                state = await cursor.fetchone()
+                first = today
+                if state:
+                    first = max(today, state["materialized_through"] + timedelta(days=1))
+                if first > last:
+                    return 0
+
+                candidates = schedule_candidates(rules, first, last, self.slot_duration)
+                created, _ = await acreate_slots(cursor, calendar_id, candidates)
+                await cursor.execute(SAVE_MATERIALIZATION_QUERY, (doctor_id, last))
+
+        if created:
+            await availability_index.refresh_doctor(doctor_id)
+        return len(created)
+
+    async def run_once(self, today: Optional[date] = None) -> int:
+        """
+        Materialize every doctor whose window is behind.
+
+        Returns:
+            Number of slots created
+        """
+        today = today or date.today()
+        last = self._window_end(today)
+        async with db.aget_db() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(SCHEDULE_RULES_QUERY)
+                rule_rows = await cursor.fetchall()
+                await cursor.execute(MATERIALIZATION_QUERY)
+                done = {row["doctor_id"]: row["materialized_through"] for row in await cursor.fetchall()}
+
+        rules: Dict[int, List[Rule]] = {}
+        for row in rule_rows:
+            rules.setdefault(row["doctor_id"], []).append(
+                (row["day_of_week"], as_time(row["start_time"]), as_time(row["end_time"]))
+            )
+
+        created = 0
+        for doctor_id, doctor_rules in rules.items():
+            if doctor_id in done and done[doctor_id] >= last:
+                continue
+            try:
+                created += await self.materialize_doctor(doctor_id, doctor_rules, today)
+            except Exception as e:
+                # Other doctors still get their slots; this one is retried next run
+                self._errors += 1
+                logger.error(f"Schedule materialization failed for doctor {doctor_id}: {str(e)}")
+
+        self._runs += 1
+        self._slots_created += created
+        self._last_run = monotonic()
+        if created:
+            logger.info(f"Schedule materializer created {created} timeslots")
+        return created
+
+    async def run(self):
+        """Run every interval seconds, or sooner when woken, until cancelled."""
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_once()
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Schedule materializer run failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict:
+        last_run = self._last_run
+        return {
+            "horizon_days": self.horizon_days,
+            "slot_minutes": int(self.slot_duration.total_seconds() // 60),
+            "interval": self.interval,
+            "runs": self._runs,
+            "slots_created": self._slots_created,
+            "errors": self._errors,
+            "last_run_age": round(monotonic() - last_run, 3) if last_run is not None else None
+        }
+
+schedule_materializer = ScheduleMaterializer(
+    horizon_days=int(os.getenv("SCHEDULE_HORIZON_WEEKS", "8")) * 7,
+    slot_minutes=int(os.getenv("SCHEDULE_SLOT_MINUTES", "30")),
+    interval=float(os.getenv("SCHEDULE_MATERIALIZE_INTERVAL", "3600"))
+)
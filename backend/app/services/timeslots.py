@@ -0,0 +1,255 @@
+import logging
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[datetime, datetime]
+
+# Rows per multi-row INSERT when writing generated slots
+INSERT_BATCH_SIZE = 500
+
+# Overlap detection relies on slots of one calendar never overlapping each
+# other, which every write path enforces. Then only slots starting inside the
+# range and the single slot starting just before it can intersect the range,
+# so both halves below are bounded seeks on idx_timeslots_calendar_start
+# (calendar_id, start_time, end_time) instead of a scan of the calendar. The
+# outer WHERE is the plain overlap predicate start < :end AND end > :start.
+
+# Existing slots of a calendar intersecting [range_start, range_end)
+EXISTING_SLOTS_QUERY = """
+    SELECT slot_id, start_time, end_time
+    FROM (
+        (SELECT slot_id, start_time, end_time FROM TIMESLOTS
+         WHERE calendar_id = %(calendar_id)s
+           AND start_time >= %(start)s AND start_time < %(end)s)
+        UNION ALL
+        (SELECT slot_id, start_time, end_time FROM TIMESLOTS
+         WHERE calendar_id = %(calendar_id)s AND start_time < %(start)s
+         ORDER BY start_time DESC LIMIT 1)
+    ) nearby
+    WHERE start_time < %(end)s AND end_time > %(start)s
+    ORDER BY start_time
+"""
+
+# First slot of a calendar overlapping [start, end), ignoring exclude_slot_id
+OVERLAP_QUERY = """
+    SELECT slot_id, start_time, end_time
+    FROM (
+        (SELECT slot_id, start_time, end_time FROM TIMESLOTS
+         WHERE calendar_id = %(calendar_id)s AND slot_id <> %(exclude_slot_id)s
+           AND start_time >= %(start)s AND start_time < %(end)s
+         ORDER BY start_time LIMIT 1)
+        UNION ALL
+        (SELECT slot_id, start_time, end_time FROM TIMESLOTS
+         WHERE calendar_id = %(calendar_id)s AND slot_id <> %(exclude_slot_id)s
+           AND start_time < %(start)s
+         ORDER BY start_time DESC LIMIT 1)
+    ) nearby
+    WHERE start_time < %(end)s AND end_time > %(start)s
+    LIMIT 1
+"""
+
+LOCK_CALENDAR_QUERY = """
+    SELECT calendar_id FROM DOCTOR_CALENDAR
+    WHERE doctor_id = %s
+    FOR UPDATE
+"""
+
+INSERT_CALENDAR_QUERY = """
+    INSERT INTO DOCTOR_CALENDAR (doctor_id, availability)
+    VALUES (%s, TRUE)
+"""
+
+INSERT_SLOTS_QUERY = """
+    INSERT INTO TIMESLOTS (calendar_id, start_time, end_time, is_available)
+    VALUES (%s, %s, %s, %s)
+"""
+
+def generate_candidates(
+    start_date: date,
+    end_date: date,
+    day_start: time,
+    day_end: time,
+    slot_duration: timedelta,
+    weekdays: Optional[Iterable[int]] = None,
+    exclude_dates: Iterable[date] = ()
+) -> List[Interval]:
+    """
+    Lay out back-to-back slots for every selected day of a date range.
+
+    Args:
+        start_date, end_date: Inclusive date range
+        day_start, day_end: Working hours of each day; a slot must end by day_end
+        slot_duration: Length of each slot
+        weekdays: Days to include (0=Monday, 6=Sunday), all days when None
+        exclude_dates: Dates to skip
+
+    Returns:
+        Sorted, non-overlapping (start, end) pairs
+    """
+    if slot_duration <= timedelta(0):
+        raise ValueError("Slot duration must be positive")
+
+    weekdays = set(weekdays) if weekdays is not None else None
+    exclude_dates = set(exclude_dates)
+    candidates = []
+    current_date = start_date
+    while current_date <= end_date:
+        if (weekdays is None or current_date.weekday() in weekdays) and current_date not in exclude_dates:
+            slot_start = datetime.combine(current_date, day_start)
+            last_end = datetime.combine(current_date, day_end)
+            while slot_start + slot_duration <= last_end:
+                candidates.append((slot_start, slot_start + slot_duration))
+                slot_start += slot_duration
+        current_date += timedelta(days=1)
+    return candidates
+
+class IntervalIndex:
+    """
+    Static index answering "does anything overlap [start, end)?" in O(log n).
+
+    Intervals are kept sorted by start with a running maximum of their ends,
+    so the last interval starting before ``end`` tells whether any interval
+    reaching past ``start`` exists. Unlike the SQL overlap check this does not
+    assume the indexed intervals are disjoint.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._intervals = sorted(intervals)
+        self._starts = [start for start, _ in self._intervals]
+        self._max_ends = []
+        self._rebuild(0)
+
+    def _rebuild(self, offset: int):
+        del self._max_ends[offset:]
+        running = self._max_ends[-1] if self._max_ends else None
+        for _, end in self._intervals[offset:]:
+            running = end if running is None or end > running else running
+            self._max_ends.append(running)
+
+    def add(self, start: datetime, end: datetime):
+        """Add an interval; O(n), meant for occasional additions."""
+        position = bisect_left(self._intervals, (start, end))
+        insort(self._intervals, (start, end))
+        self._starts.insert(position, start)
+        self._rebuild(position)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        last = bisect_left(self._starts, end) - 1
+        return last >= 0 and self._max_ends[last] > start
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+def split_candidates(candidates: Sequence[Interval], existing: Iterable[Interval]) -> Tuple[List[Interval], List[Interval]]:
+    """
+    Separate candidates that overlap an existing slot from free ones.
+
+    Two slots overlap when each starts before the other ends, so
+    back-to-back slots do not conflict.
+
+    Returns:
+        (free, skipped) candidate lists, both in input order
+    """
+    index = IntervalIndex(existing)
+    free, skipped = [], []
+    for start, end in candidates:
+        if index.overlaps(start, end):
+            skipped.append((start, end))
+        else:
+            free.append((start, end))
+    return free, skipped
+
+def batched(rows: Sequence, size: int = INSERT_BATCH_SIZE):
+    """Yield consecutive chunks of at most size rows."""
+    for offset in range(0, len(rows), size):
+        yield rows[offset:offset + size]
+
+def slot_rows(calendar_id: int, slots: Iterable[Interval], is_available: bool = True) -> List[tuple]:
+    """Parameters for INSERT_SLOTS_QUERY."""
+    return [(calendar_id, start, end, is_available) for start, end in slots]
+
+def bounds(candidates: Sequence[Interval]) -> Optional[Interval]:
+    """Earliest start and latest end of the candidates, None when empty."""
+    if not candidates:
+        return None
+    return min(start for start, _ in candidates), max(end for _, end in candidates)
+
+def create_slots(cursor, calendar_id: Optional[int], candidates: Sequence[Interval], dry_run: bool = False) -> Tuple[List[Interval], List[Interval]]:
+    """
+    Insert the candidates that do not overlap a slot already in the calendar.
+
+    Existing slots in the candidates' range are read with one query and the
+    free ones are written with multi-row inserts. With dry_run nothing is
+    written. calendar_id may be None for a calendar that does not exist yet.
+
+    Returns:
+        (created, skipped) candidate lists
+    """
+    existing = []
+    span = bounds(candidates)
+    if span and calendar_id is not None:
+        cursor.execute(EXISTING_SLOTS_QUERY, {"calendar_id": calendar_id, "start": span[0], "end": span[1]})
+        existing = [(row["start_time"], row["end_time"]) for row in cursor.fetchall()]
+
+    created, skipped = split_candidates(candidates, existing)
+    if not dry_run:
+        for chunk in batched(slot_rows(calendar_id, created), INSERT_BATCH_SIZE):
+            cursor.executemany(INSERT_SLOTS_QUERY, chunk)
+    return created, skipped
+
+async def acreate_slots(cursor, calendar_id: Optional[int], candidates: Sequence[Interval], dry_run: bool = False) -> Tuple[List[Interval], List[Interval]]:
+    """Async variant of create_slots for aiomysql cursors."""
+    existing = []
+    span = bounds(candidates)
+    if span and calendar_id is not None:
+        await cursor.execute(EXISTING_SLOTS_QUERY, {"calendar_id": calendar_id, "start": span[0], "end": span[1]})
+        existing = [(row["start_time"], row["end_time"]) for row in await cursor.fetchall()]
+
+    created, skipped = split_candidates(candidates, existing)
+    if not dry_run:
+        for chunk in batched(slot_rows(calendar_id, created), INSERT_BATCH_SIZE):
+            await cursor.executemany(INSERT_SLOTS_QUERY, chunk)
+    return created, skipped
+
+def lock_calendar(cursor, doctor_id: int, create: bool = True) -> Optional[int]:
+    """
+    Get the doctor's calendar id, locking the row so concurrent slot
+    generation for the same calendar cannot insert overlapping slots.
+    Creates the calendar when it is missing and create is set.
+    """
+    cursor.execute(LOCK_CALENDAR_QUERY, (doctor_id,))
+    calendar = cursor.fetchone()
+    if calendar:
+        return calendar["calendar_id"]
+    if not create:
+        return None
+    cursor.execute(INSERT_CALENDAR_QUERY, (doctor_id,))
+    return cursor.lastrowid
+
+async def alock_calendar(cursor, doctor_id: int, create: bool = True) -> Optional[int]:
+    """Async variant of lock_calendar for aiomysql cursors."""
+    await cursor.execute(LOCK_CALENDAR_QUERY, (doctor_id,))
+    calendar = await cursor.fetchone()
+    if calendar:
+        return calendar["calendar_id"]
+    if not create:
+        return None
+    await cursor.execute(INSERT_CALENDAR_QUERY, (doctor_id,))
+    return cursor.lastrowid
+
+def _overlap_params(calendar_id: int, start: datetime, end: datetime, exclude_slot_id: Optional[int]) -> dict:
+    # slot ids start at 1, so 0 excludes nothing
+    return {"calendar_id": calendar_id, "start": start, "end": end, "exclude_slot_id": exclude_slot_id or 0}
+
+def find_overlap(cursor, calendar_id: int, start: datetime, end: datetime, exclude_slot_id: Optional[int] = None) -> Optional[dict]:
+    """Return a slot of the calendar overlapping [start, end), or None."""
+    cursor.execute(OVERLAP_QUERY, _overlap_params(calendar_id, start, end, exclude_slot_id))
+    return cursor.fetchone()
+
+async def afind_overlap(cursor, calendar_id: int, start: datetime, end: datetime, exclude_slot_id: Optional[int] = None) -> Optional[dict]:
+    """Async variant of find_overlap for aiomysql cursors."""
+    await cursor.execute(OVERLAP_QUERY, _overlap_params(calendar_id, start, end, exclude_slot_id))
+    return await cursor.fetchone()
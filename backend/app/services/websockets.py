@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from app.services.pubsub import bus as pubsub_bus
+
+try:
+    import orjson
+except ImportError:  # Optional; the json module is used without it
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Messages queued per socket before it counts as a slow consumer
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+
+# Seconds allowed to close an evicted socket
+CLOSE_TIMEOUT = 5.0
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (timedelta, Decimal)):
+        return str(value)
+    raise TypeError(f"Cannot send {type(value).__name__} over a WebSocket")
+
+def encode_message(message: Dict) -> str:
+    """
+    Encode a message once for every socket it goes to.
+
+    Datetimes come out in ISO format, natively with orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(message, default=_default).decode()
+    return json.dumps(message, default=_default, separators=(",", ":"))
+
+class SocketSender:
+    """
+    Outbound queue of one WebSocket, drained by its own writer task.
+
+    The queue holds encoded text frames. send() never waits on the network,
+    so a stalled client only holds up its own queue. Once the queue reaches
+    ``max_size`` the client is a slow consumer and ``policy`` applies:
+
+    - "evict": close the socket; the client reconnects and reloads
+    - "coalesce": replace the backlog with one {"type": "overflow"} message
+      telling the client how many messages it missed
+    """
+
+    def __init__(
+        self,
+        websocket,
+        max_size: int = WS_SEND_QUEUE_SIZE,
+        policy: str = "evict",
+        counters: Optional[Dict[str, int]] = None,
+        on_close: Optional[Callable[["SocketSender"], Awaitable[None]]] = None
+    ):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        self.counters = counters if counters is not None else {"sent": 0, "dropped": 0, "evicted": 0}
+        self.on_close = on_close
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.closed = False
+        self.evicting = False
+        self._writer: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    def send(self, message: Union[str, Dict]) -> bool:
+        """
+        Queue a message for the socket, either a dict or a frame made by
+        encode_message.
+
+        Returns:
+            False if the message was not queued
+        """
+        if self.closed or self.evicting:
+            return False
+        if not isinstance(message, str):
+            message = encode_message(message)
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "coalesce":
+            dropped = 0
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                dropped += 1
+            self.counters["dropped"] += dropped + 1
+            self.queue.put_nowait(encode_message({"type": "overflow", "dropped": dropped + 1}))
+            return False
+
+        # Refuse further messages right away; the close runs in its own task
+        self.evicting = True
+        self.counters["dropped"] += self.depth + 1
+        self.counters["evicted"] += 1
+        logger.warning(f"Evicting slow WebSocket consumer with {self.depth} queued messages")
+        self._closer = asyncio.create_task(self.close(code=1013, reason="Too slow"))
+        return False
+
+    async def _write(self):
+        while True:
+            frame = await self.queue.get()
+            try:
+                await self.websocket.send_text(frame)
+                self.counters["sent"] += 1
+            except Exception as e:
+                logger.info(f"WebSocket send failed, dropping connection: {str(e)}")
+                asyncio.create_task(self.close())
+                return
+
+    async def close(self, code: Optional[int] = None, reason: str = ""):
+        """Stop the writer, close the socket if a code is given, and detach."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None:
+            try:
+                await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=CLOSE_TIMEOUT)
+            except Exception:
+                pass
+        if self.on_close is not None:
+            await self.on_close(self)
+
+class SocketManager:
+    """
+    WebSockets of the users connected to this worker.
+
+    Messages are encoded once and published on a pub/sub bus channel per
+    user; the worker holding a user's sockets subscribes to that channel
+    and queues the same frame on every socket's SocketSender.
+    """
+
+    def __init__(self, prefix: str, bus=pubsub_bus, policy: str = "evict", queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.active_connections: Dict[int, List[SocketSender]] = {}
+        self.prefix = prefix
+        self.bus = bus
+        self.policy = policy
+        self.queue_size = queue_size
+        self.counters = {"sent": 0, "dropped": 0, "evicted": 0}
+
+    def channel(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def connect(self, websocket, user_id: int) -> SocketSender:
+        """Accept the socket and start its writer; send through the returned sender."""
+        await websocket.accept()
+
+        async def detach(sender: SocketSender):
+            await self._remove(sender, user_id)
+
+        sender = SocketSender(websocket, self.queue_size, self.policy, self.counters, detach)
+        sender.start()
+        if user_id not in self.active_connections:
+            self.active_connections[user_id] = []
+            await self.bus.subscribe(self.channel(user_id), lambda frame: self.deliver(user_id, frame))
+        self.active_connections[user_id].append(sender)
+        return sender
+
+    async def _remove(self, sender: SocketSender, user_id: int):
+        senders = self.active_connections.get(user_id)
+        if senders is None or sender not in senders:
+            return
+        senders.remove(sender)
+        if not senders:
+            del self.active_connections[user_id]
+            await self.bus.unsubscribe(self.channel(user_id))
+
+    async def disconnect(self, websocket, user_id: int):
+        for sender in list(self.active_connections.get(user_id, ())):
+            if sender.websocket is websocket:
+                await sender.close()
+
+    async def publish(self, user_id: int, message: Dict) -> int:
+        """
+        Send to every socket of the user, on whichever worker they are connected.
+
+        Returns:
+            Number of workers holding sockets of the user; 0 if they are offline
+        """
+        return await self.bus.publish(self.channel(user_id), encode_message(message))
+
+    async def deliver(self, user_id: int, frame: str):
+        """Queue a frame from the bus on the user's sockets on this worker."""
+        for sender in list(self.active_connections.get(user_id, ())):
+            sender.send(frame)
+
+    def stats(self) -> Dict:
+        depths = [sender.depth for senders in self.active_connections.values() for sender in senders]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "policy": self.policy,
+            **self.counters
+        }
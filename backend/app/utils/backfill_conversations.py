@@ -0,0 +1,46 @@
+"""
+Fill the CONVERSATIONS inbox table from existing CHAT_MESSAGES.
+
+Run once after upgrading, from the backend directory:
+
+    python -m app.utils.backfill_conversations --batch-size 1000
+
+Users are processed in ranges of --batch-size user ids, one transaction
+per range, so the job can run while the application is serving traffic.
+Rerunning it recomputes the rows from scratch.
+"""
+import argparse
+import logging
+import time
+from app.config.database import db
+from app.services.chat import backfill_conversations
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000, help="user ids per transaction")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with db.get_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT MIN(user_id) AS first_id, MAX(user_id) AS last_id FROM USERS")
+            bounds = cursor.fetchone()
+    if not bounds or bounds["first_id"] is None:
+        logger.info("No users, nothing to backfill")
+        return
+
+    started = time.perf_counter()
+    affected = 0
+    for first in range(bounds["first_id"], bounds["last_id"] + 1, args.batch_size):
+        last = min(first + args.batch_size - 1, bounds["last_id"])
+        with db.transaction() as conn:
+            with conn.cursor() as cursor:
+                affected += backfill_conversations(cursor, first, last)
+        logger.info(f"Backfilled conversations of users {first}-{last}")
+
+    logger.info(f"Backfill done in {time.perf_counter() - started:.1f}s, {affected} rows affected")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,53 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Secondary indexes added after the initial schema, as
+# (table, index name, columns). Mirrored in schema.sql for new installs.
+INDEXES = [
+    # Overlap checks and range reads of a calendar's slots
+    ("TIMESLOTS", "idx_timeslots_calendar_start", "calendar_id, start_time, end_time"),
+    # Availability index loads: every slot in the upcoming window
+    ("TIMESLOTS", "idx_timeslots_start", "start_time"),
+    # Keyset pagination of appointment listings, newest first
+    ("APPOINTMENTS", "idx_appointments_date", "appointment_date, appointment_id"),
+    ("APPOINTMENTS", "idx_appointments_doctor_date", "doctor_id, appointment_date, appointment_id"),
+    ("APPOINTMENTS", "idx_appointments_patient_date", "patient_id, appointment_date, appointment_id"),
+    # Chat contact lists: unread counts and last message per conversation
+    ("CHAT_MESSAGES", "idx_chat_messages_receiver_sender_read", "receiver_id, sender_id, read_status"),
+    ("CHAT_MESSAGES", "idx_chat_messages_sender_receiver_sent", "sender_id, receiver_id, sent_at"),
+    # Cursor-paginated message history per direction of a conversation
+    ("CHAT_MESSAGES", "idx_chat_messages_sender_receiver_id", "sender_id, receiver_id, message_id"),
+]
+
+def ensure_indexes(cursor):
+    """Create every index in INDEXES that does not exist yet."""
+    for table, name, columns in INDEXES:
+        cursor.execute(
+            """
+            SELECT TABLE_NAME FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND LOWER(TABLE_NAME) = LOWER(%s)
+            """,
+            (table,)
+        )
+        found = cursor.fetchone()
+        if not found:
+            logger.warning(f"Skipping index {name}: table {table} does not exist")
+            continue
+        
+        cursor.execute(
+            """
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+            LIMIT 1
+            """,
+            (found["TABLE_NAME"], name)
+        )
+        if cursor.fetchone():
+            continue
+        
+        cursor.execute(f"CREATE INDEX {name} ON {found['TABLE_NAME']} ({columns})")
+        logger.info(f"Created index {name} on {found['TABLE_NAME']} ({columns})")
+
 def initialize_database():
     """Initialize the database with required reference data."""
     try:
@@ -34,6 +81,78 @@ def initialize_database():
                     )
                     logger.info("Roles initialized successfully")
                 
+                # Permission grants per role and per user, read by the
+                # in-process permission matrix
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS PERMISSIONS (
+                        perm_id INT PRIMARY KEY AUTO_INCREMENT,
+                        resource VARCHAR(50) NOT NULL,
+                        action VARCHAR(50) NOT NULL,
+                        UNIQUE KEY uq_permissions_resource_action (resource, action)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS ROLE_PERMISSIONS (
+                        role_id INT NOT NULL,
+                        perm_id INT NOT NULL,
+                        PRIMARY KEY (role_id, perm_id),
+                        FOREIGN KEY (role_id) REFERENCES ROLES(role_id) ON DELETE CASCADE,
+                        FOREIGN KEY (perm_id) REFERENCES PERMISSIONS(perm_id) ON DELETE CASCADE
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS USER_PERMISSIONS (
+                        user_id INT NOT NULL,
+                        perm_id INT NOT NULL,
+                        PRIMARY KEY (user_id, perm_id),
+                        FOREIGN KEY (user_id) REFERENCES USERS(user_id) ON DELETE CASCADE,
+                        FOREIGN KEY (perm_id) REFERENCES PERMISSIONS(perm_id) ON DELETE CASCADE
+                    )
+                """)
+                
+                # Last day of TIMESLOTS generated from each doctor's
+                # DOCTOR_SCHEDULE by the schedule materializer
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS SCHEDULE_MATERIALIZATION (
+                        doctor_id INT PRIMARY KEY,
+                        materialized_through DATE NOT NULL,
+                        FOREIGN KEY (doctor_id) REFERENCES DOCTORS(doctor_id) ON DELETE CASCADE
+                    )
+                """)
+                
+                # Per-user inbox rows kept up to date by the chat endpoints;
+                # fill from existing messages with app.utils.backfill_conversations
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS CONVERSATIONS (
+                        user_id INT NOT NULL,
+                        contact_id INT NOT NULL,
+                        last_message_id INT NOT NULL,
+                        last_sent_at DATETIME NOT NULL,
+                        unread_count INT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (user_id, contact_id),
+                        INDEX idx_conversations_user_last (user_id, last_message_id),
+                        FOREIGN KEY (user_id) REFERENCES USERS(user_id) ON DELETE CASCADE,
+                        FOREIGN KEY (contact_id) REFERENCES USERS(user_id) ON DELETE CASCADE
+                    )
+                """)
+                
+                # Notification outbox: one row per notification to deliver,
+                # written with it; next_attempt_at is NULL once it is
+                # delivered or out of attempts
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS NOTIFICATION_DELIVERY (
+                        notif_id INT PRIMARY KEY,
+                        attempts INT NOT NULL DEFAULT 0,
+                        next_attempt_at DATETIME,
+                        delivered_at DATETIME,
+                        last_error VARCHAR(255),
+                        INDEX idx_notification_delivery_due (delivered_at, next_attempt_at),
+                        FOREIGN KEY (notif_id) REFERENCES NOTIFICATIONS(notif_id) ON DELETE CASCADE
+                    )
+                """)
+                
+                ensure_indexes(cursor)
+                
         logger.info("Database initialization complete")
     except Exception as e:
         logger.error(f"Database initialization error: {str(e)}")
@@ -0,0 +1,123 @@
+from app.config.database import db
+from typing import Dict, FrozenSet, Optional
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Permission names are "<action>_<resource>", e.g. "manage_departments"
+ROLE_PERMISSIONS_QUERY = """
+    SELECT rp.role_id, CONCAT(p.action, '_', p.resource) AS permission_name
+    FROM ROLE_PERMISSIONS rp
+    JOIN PERMISSIONS p ON p.perm_id = rp.perm_id
+"""
+
+USER_PERMISSIONS_QUERY = """
+    SELECT up.user_id, CONCAT(p.action, '_', p.resource) AS permission_name
+    FROM USER_PERMISSIONS up
+    JOIN PERMISSIONS p ON p.perm_id = up.perm_id
+"""
+
+class PermissionMatrix:
+    """
+    In-process copy of the role and per-user permission grants.
+
+    Checks are set lookups with no database round trip. run_refresh()
+    reloads the whole matrix in the background every ``refresh_interval``
+    seconds so grants made by other workers show up; a worker that changes
+    grants itself calls refresh_role() or refresh_user() to apply them
+    immediately.
+    """
+
+    def __init__(self, refresh_interval: float = 60):
+        self.refresh_interval = refresh_interval
+        self.role_permissions: Dict[int, FrozenSet[str]] = {}
+        self.user_permissions: Dict[int, FrozenSet[str]] = {}
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._reload_errors = 0
+
+    @staticmethod
+    def _group(rows, key) -> Dict[int, FrozenSet[str]]:
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[key], set()).add(row["permission_name"])
+        return {k: frozenset(v) for k, v in grouped.items()}
+
+    def load(self):
+        """Load every role and user grant."""
+        with db.get_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ROLE_PERMISSIONS_QUERY)
+                role_permissions = self._group(cursor.fetchall(), "role_id")
+                cursor.execute(USER_PERMISSIONS_QUERY)
+                user_permissions = self._group(cursor.fetchall(), "user_id")
+
+        with self._lock:
+            self.role_permissions = role_permissions
+            self.user_permissions = user_permissions
+            self._loaded_at = time.monotonic()
+        logger.info(
+            f"Permission matrix loaded: {len(role_permissions)} roles, {len(user_permissions)} users"
+        )
+
+    def refresh_role(self, role_id: int):
+        """Reload the grants of one role."""
+        with db.get_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ROLE_PERMISSIONS_QUERY + " WHERE rp.role_id = %s", (role_id,))
+                permissions = frozenset(row["permission_name"] for row in cursor.fetchall())
+
+        with self._lock:
+            role_permissions = dict(self.role_permissions)
+            if permissions:
+                role_permissions[role_id] = permissions
+            else:
+                role_permissions.pop(role_id, None)
+            self.role_permissions = role_permissions
+
+    def refresh_user(self, user_id: int):
+        """Reload the direct grants of one user."""
+        with db.get_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(USER_PERMISSIONS_QUERY + " WHERE up.user_id = %s", (user_id,))
+                permissions = frozenset(row["permission_name"] for row in cursor.fetchall())
+
+        with self._lock:
+            user_permissions = dict(self.user_permissions)
+            if permissions:
+                user_permissions[user_id] = permissions
+            else:
+                user_permissions.pop(user_id, None)
+            self.user_permissions = user_permissions
+
+    async def run_refresh(self):
+        """Reload the matrix every refresh_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                # PyMySQL blocks, so keep the reload off the event loop
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                # Keep serving the previous matrix; retry after another interval
+                self._reload_errors += 1
+                logger.error(f"Permission matrix reload failed: {str(e)}")
+
+    def has(self, user_id: int, role_id: Optional[int], permission: str) -> bool:
+        """Check whether a user holds a permission through their role or directly."""
+        return (
+            permission in self.role_permissions.get(role_id, ())
+            or permission in self.user_permissions.get(user_id, ())
+        )
+
+    def stats(self) -> Dict:
+        loaded_at = self._loaded_at
+        return {
+            "roles": len(self.role_permissions),
+            "users": len(self.user_permissions),
+            "age": round(time.monotonic() - loaded_at, 3) if loaded_at is not None else None,
+            "refresh_interval": self.refresh_interval,
+            "reload_errors": self._reload_errors
+        }
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+try:
+    import redis
+except ImportError:  # Redis is only needed when REVOCATION_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Membership tests can return false positives (at roughly ``error_rate``
+    once ``capacity`` items were added) but never false negatives.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class SQLiteRevocationStore:
+    """
+    Revoked token ids in a local SQLite file.
+
+    Every worker on the host opens the same file, so this is shared across
+    processes and survives restarts. Use Redis for multi-host deployments.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    jti TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    revoked_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens (revoked_at)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def revoke(self, jti: str, expires_at: float):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO revoked_tokens (jti, expires_at, revoked_at) VALUES (?, ?, ?)",
+                (jti, expires_at, now)
+            )
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM revoked_tokens WHERE jti = ? AND expires_at > ?",
+                (jti, time.time())
+            ).fetchone()
+        return row is not None
+
+    def revoked_since(self, since: float) -> Iterable[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT jti FROM revoked_tokens WHERE revoked_at >= ? AND expires_at > ?",
+                (since, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def active(self) -> Iterable[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT jti FROM revoked_tokens WHERE expires_at > ?",
+                (time.time(),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class RedisRevocationStore:
+    """
+    Revoked token ids in Redis, shared by every worker and host.
+
+    Two sorted sets hold the same members: one scored by token expiry (for
+    lookups and pruning) and one by revocation time (for incremental sync).
+    """
+
+    def __init__(self, url: str, prefix: str = "medihub:revoked"):
+        if redis is None:
+            raise RuntimeError("REVOCATION_BACKEND=redis requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.expiry_key = f"{prefix}:expiry"
+        self.revoked_at_key = f"{prefix}:revoked_at"
+
+    def revoke(self, jti: str, expires_at: float):
+        now = time.time()
+        expired = self.client.zrangebyscore(self.expiry_key, "-inf", now)
+        pipe = self.client.pipeline()
+        if expired:
+            pipe.zrem(self.expiry_key, *expired)
+            pipe.zrem(self.revoked_at_key, *expired)
+        pipe.zadd(self.expiry_key, {jti: expires_at})
+        pipe.zadd(self.revoked_at_key, {jti: now})
+        pipe.execute()
+
+    def is_revoked(self, jti: str) -> bool:
+        expires_at = self.client.zscore(self.expiry_key, jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoked_since(self, since: float) -> Iterable[str]:
+        return [jti.decode() for jti in self.client.zrangebyscore(self.revoked_at_key, since, "+inf")]
+
+    def active(self) -> Iterable[str]:
+        return [jti.decode() for jti in self.client.zrangebyscore(self.expiry_key, time.time(), "+inf")]
+
+    def close(self):
+        self.client.close()
+
+class RevocationList:
+    """
+    Revocation checks backed by a shared store with a local Bloom filter.
+
+    A token id that is not in the filter is definitely not revoked, so the
+    common case needs no I/O. Filter hits are confirmed against the store.
+    run_sync() pulls in revocations made by other workers every
+    ``sync_interval`` seconds in the background, and rebuilds the filter
+    from the live entries every ``rebuild_interval`` seconds so that
+    expired ids stop matching. A failed sync keeps the last filter.
+    """
+
+    # Overlap between incremental syncs, covering writes that commit late
+    SYNC_OVERLAP = 1.0
+
+    def __init__(
+        self,
+        store,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        sync_interval: float = 5,
+        rebuild_interval: float = 600
+    ):
+        self.store = store
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._next_rebuild = 0.0
+        self._checks = 0
+        self._store_lookups = 0
+        self._revoked_hits = 0
+        self._syncs = 0
+        self._sync_errors = 0
+        self._lookup_errors = 0
+
+    def sync(self):
+        """
+        Pull revocations from the store into the filter, rebuilding it when
+        it was never built or ``rebuild_interval`` has passed. Blocking; the
+        app runs it through run_sync().
+        """
+        now = time.monotonic()
+        started = time.time()
+        try:
+            if self._synced_at is None or now >= self._next_rebuild:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                for jti in self.store.active():
+                    bloom.add(jti)
+                with self._lock:
+                    self.bloom = bloom
+                self._next_rebuild = now + self.rebuild_interval
+            else:
+                revoked = self.store.revoked_since(self._synced_at - self.SYNC_OVERLAP)
+                with self._lock:
+                    for jti in revoked:
+                        self.bloom.add(jti)
+            self._synced_at = started
+            self._syncs += 1
+        except Exception as e:
+            # Keep checking against the last filter; retry at the next sync
+            self._sync_errors += 1
+            logger.error(f"Revocation list sync failed: {str(e)}")
+
+    async def run_sync(self):
+        """Sync every sync_interval seconds, off the event loop, until cancelled."""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await asyncio.to_thread(self.sync)
+
+    def revoke(self, jti: str, expires_at: float):
+        self.store.revoke(jti, expires_at)
+        with self._lock:
+            self.bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            self._checks += 1
+            if jti not in self.bloom:
+                return False
+            self._store_lookups += 1
+        try:
+            revoked = self.store.is_revoked(jti)
+        except Exception as e:
+            # A filter hit is most likely a revoked token, so reject it
+            with self._lock:
+                self._lookup_errors += 1
+            logger.error(f"Revocation lookup failed, rejecting token: {str(e)}")
+            return True
+        if revoked:
+            with self._lock:
+                self._revoked_hits += 1
+        return revoked
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": type(self.store).__name__,
+                "filter_entries": self.bloom.count,
+                "filter_capacity": self.capacity,
+                "checks": self._checks,
+                "store_lookups": self._store_lookups,
+                "revoked_hits": self._revoked_hits,
+                "syncs": self._syncs,
+                "sync_errors": self._sync_errors,
+                "lookup_errors": self._lookup_errors
+            }
+
+def create_revocation_list() -> RevocationList:
+    """Build the revocation list configured by the REVOCATION_* settings."""
+    backend = os.getenv("REVOCATION_BACKEND", "sqlite").lower()
+    if backend == "redis":
+        store = RedisRevocationStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        store = SQLiteRevocationStore(os.getenv("REVOCATION_DB_PATH", "revoked_tokens.db"))
+    return RevocationList(
+        store,
+        capacity=int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000")),
+        sync_interval=float(os.getenv("REVOCATION_SYNC_INTERVAL", "5"))
+    )
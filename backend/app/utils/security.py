@@ -7,11 +7,19 @@ from fastapi import HTTPException, status
 import secrets
 import logging
 from ..config.database import db
+from .revocation import create_revocation_list
+from .permissions import PermissionMatrix
 import re
 import base64
 import hashlib
 from cryptography.fernet import Fernet
 import json
+import uuid
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,6 +27,94 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+class HashingPool:
+    """
+    Bounded thread pool for bcrypt hashing and verification.
+
+    bcrypt releases the GIL while it works, so a few threads keep password
+    checks off the event loop without starving other requests. At most
+    ``max_pending`` calls may be running or queued; beyond that callers get a
+    503 immediately instead of piling up behind a login storm.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._run_time_total = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+            return self._executor
+
+    def _call(self, submitted: float, fn, args):
+        started = time.monotonic()
+        with self._lock:
+            self._active += 1
+            waited = started - submitted
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._run_time_total += time.monotonic() - started
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, rejecting with 503 when it is saturated."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service busy, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), self._call, time.monotonic(), fn, args
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "active": self._active,
+                "queued": max(self._pending - self._active, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_time_avg": round(self._wait_time_total / self._completed, 6) if self._completed else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6),
+                "run_time_avg": round(self._run_time_total / self._completed, 6) if self._completed else 0.0
+            }
+
 class SecurityManager:
     def __init__(self):
         # Create a password context for hashing and verifying
@@ -47,8 +143,26 @@ class SecurityManager:
             )
         self.fernet = Fernet(self.encryption_key)
 
-        # Token blacklist cache
-        self.token_blacklist = set()
+        # Revoked token ids, shared across workers through the configured store
+        self.revocations = create_revocation_list()
+
+        # Verified token payloads keyed by token digest, bounded LRU
+        self.TOKEN_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 4096))
+        self._token_cache = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        self._token_cache_hits = 0
+        self._token_cache_misses = 0
+
+        # Role and user permission grants, checked in process
+        self.permissions = PermissionMatrix(
+            refresh_interval=float(os.getenv("PERMISSION_REFRESH_INTERVAL", 60))
+        )
+
+        # Worker pool keeping bcrypt off the event loop
+        self.hash_pool = HashingPool(
+            max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))),
+            max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+        )
 
     def create_access_token(self, data: Dict, expires_delta: Optional[timedelta] = None) -> str:
         to_encode = data.copy()
@@ -57,15 +171,60 @@ class SecurityManager:
         else:
             expire = datetime.utcnow() + timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode.update({"exp": expire})
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         return jwt.encode(to_encode, self.SECRET_KEY, algorithm="HS256")
 
     def verify_token(self, token: str) -> Dict:
+        payload = self._decode_token(token)
+        if payload is None:
+            return None
+        if self.revocations.is_revoked(self._revocation_id(token, payload)):
+            return None
+        return payload
+
+    def _decode_token(self, token: str) -> Optional[Dict]:
+        key = hashlib.sha256(token.encode()).digest()
+        with self._token_cache_lock:
+            entry = self._token_cache.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._token_cache.move_to_end(key)
+                    self._token_cache_hits += 1
+                    return dict(entry[1])
+                del self._token_cache[key]
+            self._token_cache_misses += 1
+
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=["HS256"])
-            return payload
         except JWTError:
             return None
 
+        # Only tokens with an expiry are cached; the entry dies with the token
+        exp = payload.get("exp")
+        if self.TOKEN_CACHE_SIZE > 0 and isinstance(exp, (int, float)):
+            with self._token_cache_lock:
+                self._token_cache[key] = (exp, dict(payload))
+                self._token_cache.move_to_end(key)
+                while len(self._token_cache) > self.TOKEN_CACHE_SIZE:
+                    self._token_cache.popitem(last=False)
+        return payload
+
+    @staticmethod
+    def _revocation_id(token: str, payload: Dict) -> str:
+        # Tokens issued before jti was added are tracked by their digest
+        return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+    def token_cache_stats(self) -> Dict:
+        with self._token_cache_lock:
+            lookups = self._token_cache_hits + self._token_cache_misses
+            return {
+                "size": len(self._token_cache),
+                "max_size": self.TOKEN_CACHE_SIZE,
+                "hits": self._token_cache_hits,
+                "misses": self._token_cache_misses,
+                "hit_ratio": round(self._token_cache_hits / lookups, 4) if lookups else 0.0
+            }
+
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         try:
             return self.pwd_context.verify(plain_password, hashed_password)
@@ -82,6 +241,12 @@ class SecurityManager:
             # Fallback to simple hash if bcrypt fails
             return hashlib.sha256(password.encode()).hexdigest()
 
+    async def averify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.hash_pool.run(self.verify_password, plain_password, hashed_password)
+
+    async def aget_password_hash(self, password: str) -> str:
+        return await self.hash_pool.run(self.get_password_hash, password)
+
     def _is_password_strong(self, password: str) -> bool:
         if len(password) < 8:
             return False
@@ -112,28 +277,31 @@ class SecurityManager:
                 detail="Failed to decrypt data"
             )
 
-    def check_permissions(self, user_id: int, required_permission: str) -> bool:
+    def check_permissions(self, user_id: int, required_permission: str, role_id: Optional[int] = None) -> bool:
         try:
-            with db.get_db() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT p.permission_name 
-                        FROM PERMISSIONS p
-                        JOIN USER_PERMISSIONS up ON p.permission_id = up.permission_id
-                        WHERE up.user_id = %s AND p.permission_name = %s
-                        """,
-                        (user_id, required_permission)
-                    )
-                    return bool(cursor.fetchone())
+            if role_id is None:
+                with db.get_db() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT role_id FROM USERS WHERE user_id = %s",
+                            (user_id,)
+                        )
+                        user = cursor.fetchone()
+                role_id = user["role_id"] if user else None
+            return self.permissions.has(user_id, role_id, required_permission)
         except Exception as e:
             logger.error(f"Permission check failed: {str(e)}")
             return False
 
     def blacklist_token(self, token: str) -> None:
         try:
-            payload = self.verify_token(token)
-            self.token_blacklist.add(token)
+            payload = self._decode_token(token)
+            if payload is None:
+                return
+            self.revocations.revoke(
+                self._revocation_id(token, payload),
+                payload.get("exp") or time.time() + self.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            )
             
             # Log token blacklisting
             with db.get_db() as conn:
@@ -164,6 +332,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return security.get_password_hash(password)
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await security.hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    return await security.hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
     return security.create_access_token(data, expires_delta)
 
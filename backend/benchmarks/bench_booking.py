@@ -0,0 +1,172 @@
+"""
+Fire concurrent bookings at a few hot slots and check for double bookings.
+
+Needs a MySQL database with the MediHub schema, configured through the
+usual DB_* environment variables, and at least one doctor calendar and one
+patient. Run from the backend directory:
+
+    DB_POOL_MAX_SIZE=64 python -m benchmarks.bench_booking --slots 10 --bookings 5000 --concurrency 64
+
+Each round creates --slots fresh slots far in the future, then starts
+--bookings booking attempts spread evenly over them, at most --concurrency
+in flight. Exactly one attempt per slot may succeed. After the last round
+the benchmark counts appointments per slot, reports any slot that was
+booked more than once, and deletes everything it created.
+
+--mode legacy replays the old read-check-insert-update sequence for
+comparison; it is expected to report double bookings under load. Keep
+--concurrency at or below DB_POOL_MAX_SIZE or attempts queue on the pool.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from app.config.database import db
+from app.services.booking import SlotUnavailable, abook_slot
+
+# Far enough ahead that the benchmark slots never collide with real ones
+BASE_TIME = datetime(2099, 1, 1, 9, 0)
+
+async def legacy_book(cursor, slot_id, patient_id):
+    await cursor.execute("SELECT * FROM TIMESLOTS WHERE slot_id = %s AND is_available = TRUE", (slot_id,))
+    slot = await cursor.fetchone()
+    if not slot:
+        raise SlotUnavailable(slot_id)
+    await cursor.execute(
+        """
+        SELECT dc.doctor_id FROM TIMESLOTS ts
+        JOIN DOCTOR_CALENDAR dc ON ts.calendar_id = dc.calendar_id
+        WHERE ts.slot_id = %s
+        """,
+        (slot_id,)
+    )
+    doctor = await cursor.fetchone()
+    await cursor.execute(
+        """
+        INSERT INTO APPOINTMENTS (patient_id, doctor_id, slot_id, appointment_date, status, notes, priority_flag)
+        VALUES (%s, %s, %s, %s, 'Scheduled', %s, FALSE)
+        """,
+        (patient_id, doctor["doctor_id"], slot_id, slot["start_time"], "bench_booking")
+    )
+    await cursor.execute("UPDATE TIMESLOTS SET is_available = FALSE WHERE slot_id = %s", (slot_id,))
+    return cursor.lastrowid
+
+async def setup(calendar_id, round_no, count):
+    """Create the hot slots of one round and return their ids."""
+    slot_ids = []
+    async with db.atransaction() as conn:
+        async with conn.cursor() as cursor:
+            for i in range(count):
+                start = BASE_TIME + timedelta(days=round_no, minutes=30 * i)
+                await cursor.execute(
+                    "INSERT INTO TIMESLOTS (calendar_id, start_time, end_time, is_available) VALUES (%s, %s, %s, TRUE)",
+                    (calendar_id, start, start + timedelta(minutes=30))
+                )
+                slot_ids.append(cursor.lastrowid)
+    return slot_ids
+
+async def attempt(mode, slot_id, patient_id, gate, latencies, outcome):
+    async with gate:
+        started = time.perf_counter()
+        try:
+            async with db.atransaction() as conn:
+                async with conn.cursor() as cursor:
+                    try:
+                        if mode == "legacy":
+                            await legacy_book(cursor, slot_id, patient_id)
+                        else:
+                            await abook_slot(cursor, slot_id, patient_id, "bench_booking")
+                        outcome["booked"] += 1
+                    except SlotUnavailable:
+                        outcome["rejected"] += 1
+        except Exception:
+            # Deadlocks and lock wait timeouts roll back like a rejection
+            outcome["errors"] += 1
+        latencies.append(time.perf_counter() - started)
+
+async def double_bookings(slot_ids):
+    async with db.aget_db() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                f"""
+                SELECT slot_id, COUNT(*) AS bookings FROM APPOINTMENTS
+                WHERE slot_id IN ({", ".join(["%s"] * len(slot_ids))})
+                GROUP BY slot_id HAVING COUNT(*) > 1
+                """,
+                slot_ids
+            )
+            return await cursor.fetchall()
+
+async def cleanup(slot_ids):
+    placeholders = ", ".join(["%s"] * len(slot_ids))
+    async with db.atransaction() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"DELETE FROM APPOINTMENTS WHERE slot_id IN ({placeholders})", slot_ids)
+            await cursor.execute(f"DELETE FROM TIMESLOTS WHERE slot_id IN ({placeholders})", slot_ids)
+
+async def first_id(query):
+    async with db.aget_db() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query)
+            row = await cursor.fetchone()
+    if not row:
+        raise SystemExit(f"No row for: {query}")
+    return next(iter(row.values()))
+
+async def main_async(args):
+    calendar_id = args.calendar_id or await first_id("SELECT MIN(calendar_id) AS id FROM DOCTOR_CALENDAR")
+    patient_id = args.patient_id or await first_id("SELECT MIN(patient_id) AS id FROM PATIENTS")
+
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    outcome = {"booked": 0, "rejected": 0, "errors": 0}
+    all_slots = []
+    elapsed = 0.0
+    try:
+        for round_no in range(args.rounds):
+            slot_ids = await setup(calendar_id, round_no, args.slots)
+            all_slots.extend(slot_ids)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                attempt(args.mode, slot_ids[i % len(slot_ids)], patient_id, gate, latencies, outcome)
+                for i in range(args.bookings)
+            ))
+            elapsed += time.perf_counter() - started
+
+        doubled = await double_bookings(all_slots)
+    finally:
+        if all_slots and not args.keep:
+            await cleanup(all_slots)
+        await db.close_async_pool()
+
+    attempts = args.bookings * args.rounds
+    latencies.sort()
+    print(f"mode            {args.mode}")
+    print(f"attempts        {attempts} over {len(all_slots)} slots, concurrency {args.concurrency}")
+    print(f"booked          {outcome['booked']} (expected {len(all_slots)})")
+    print(f"rejected        {outcome['rejected']}")
+    print(f"errors          {outcome['errors']}")
+    print(f"throughput      {attempts / elapsed:,.0f} attempts/s")
+    print(f"latency p50     {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"latency p99     {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+    print(f"double-booked   {len(doubled)} slots")
+    for row in doubled:
+        print(f"  slot {row['slot_id']}: {row['bookings']} appointments")
+    return 1 if doubled else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=10, help="hot slots per round")
+    parser.add_argument("--bookings", type=int, default=5000, help="booking attempts per round")
+    parser.add_argument("--rounds", type=int, default=1, help="rounds, each with fresh slots")
+    parser.add_argument("--concurrency", type=int, default=10, help="attempts in flight at once")
+    parser.add_argument("--mode", choices=["atomic", "legacy"], default="atomic", help="booking path to exercise")
+    parser.add_argument("--calendar-id", type=int, help="calendar to create slots in (default: first one)")
+    parser.add_argument("--patient-id", type=int, help="patient to book for (default: first one)")
+    parser.add_argument("--keep", action="store_true", help="leave the created slots and appointments in place")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Measure WebSocket fan-out cost per broadcast for 1, 10 and 1000 sockets.
+
+No database or network is involved; sockets are stand-ins whose send
+methods only do the work Starlette does before handing a frame to the
+server. Run from the backend directory:
+
+    python -m benchmarks.bench_fanout --sockets 1,10,1000 --broadcasts 2000
+
+"legacy" replays the old per-socket path: json.dumps with DateTimeEncoder,
+json.loads, then send_json, which encodes once more. "single" goes
+through SocketManager: the message is encoded once, published on the
+in-memory bus and the same frame is queued on every socket's writer,
+which sends it with send_text. --no-orjson measures the json module
+fallback of encode_message.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from unittest.mock import patch
+from app.services.pubsub import InMemoryBus
+from app.services.websockets import SocketManager
+
+MESSAGE = {
+    "type": "chat_message",
+    "data": {
+        "message_id": 123456,
+        "sender_id": 42,
+        "receiver_id": 7,
+        "message": "Please bring your previous lab results to the appointment on Friday.",
+        "message_type": "Text",
+        "sent_at": datetime(2024, 3, 1, 10, 15, 30),
+        "read_status": False,
+        "is_urgent": False
+    }
+}
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+class FakeSocket:
+    def __init__(self):
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+    async def send_json(self, data):
+        # What starlette.websockets.WebSocket.send_json does before sending
+        json.dumps(data, separators=(",", ":"))
+        self.received += 1
+
+    async def send_text(self, data):
+        self.received += 1
+
+async def legacy(sockets, broadcasts):
+    started = time.perf_counter()
+    for _ in range(broadcasts):
+        for socket in sockets:
+            serialized_message = json.loads(json.dumps(MESSAGE, cls=DateTimeEncoder))
+            await socket.send_json(serialized_message)
+    return time.perf_counter() - started
+
+async def single(sockets, broadcasts):
+    manager = SocketManager("bench", InMemoryBus(), queue_size=broadcasts + 1)
+    for socket in sockets:
+        await manager.connect(socket, 1)
+
+    started = time.perf_counter()
+    for n in range(1, broadcasts + 1):
+        await manager.publish(1, MESSAGE)
+        # Wait for every writer to send the frame
+        while any(socket.received < n for socket in sockets):
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    for socket in sockets:
+        await manager.disconnect(socket, 1)
+    return elapsed
+
+async def main_async(args):
+    counts = [int(count) for count in args.sockets.split(",")]
+    print(f"{'sockets':>8} {'legacy us':>12} {'single us':>12} {'speedup':>8}")
+    for count in counts:
+        # Fewer broadcasts for large fan-outs so every row takes similar time
+        broadcasts = max(args.broadcasts // count, 20)
+        old = await legacy([FakeSocket() for _ in range(count)], broadcasts)
+        new = await single([FakeSocket() for _ in range(count)], broadcasts)
+        print(
+            f"{count:>8} {old / broadcasts * 1e6:>12.1f} {new / broadcasts * 1e6:>12.1f} "
+            f"{old / new:>7.1f}x"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", default="1,10,1000", help="comma-separated socket counts")
+    parser.add_argument("--broadcasts", type=int, default=2000, help="broadcasts for a single socket, divided by the socket count")
+    parser.add_argument("--no-orjson", action="store_true", help="encode with the json module")
+    args = parser.parse_args()
+    if args.no_orjson:
+        with patch("app.services.websockets.orjson", None):
+            asyncio.run(main_async(args))
+    else:
+        asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure notification outbox throughput in notifications per second.
+
+The database and channels are stand-ins: every statement costs
+--db-latency-ms, as a round trip to MySQL would, and every send costs
+--send-latency-ms. Each batch size drains the same backlog through
+NotificationOutbox.run_once (claim, send, settle); batch size 1 is the
+cost of delivering and updating notifications one row at a time. Run from the backend directory:
+
+    python -m benchmarks.bench_outbox --notifications 5000 --batch-sizes 1,10,100,500
+"""
+import argparse
+import asyncio
+import time
+from unittest.mock import patch
+from app.services.notifications import NotificationOutbox
+
+TYPES = ["Push", "Email", "SMS"]
+
+class SlowChannel:
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def send(self, notification):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return True
+
+class FakeCursor:
+    """Serves the backlog to claims, skipping leased rows, and drops delivered ones."""
+
+    def __init__(self, pending, latency):
+        self.pending = pending
+        self.latency = latency
+        self.leased = set()
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        await asyncio.sleep(self.latency)
+        if "FOR UPDATE" in query:
+            self.rows = [n for n in self.pending if n["notif_id"] not in self.leased][:params[-1]]
+        elif "attempts = attempts + 1" in query:
+            self.leased.update(params[1:])
+        elif "SET delivered_at" in query:
+            delivered = set(params[1:])
+            self.pending[:] = [n for n in self.pending if n["notif_id"] not in delivered]
+
+    async def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self._cursor
+
+def backlog(count):
+    return [
+        {
+            "notif_id": n,
+            "user_id": n % 100,
+            "notification_type": TYPES[n % len(TYPES)],
+            "content": "Your appointment is confirmed.",
+            "email": "patient@example.com",
+            "phone": "555-0100",
+            "attempts": 0
+        }
+        for n in range(1, count + 1)
+    ]
+
+async def drain(args, batch_size):
+    channel = SlowChannel(args.send_latency_ms / 1000)
+    outbox = NotificationOutbox({name: channel for name in TYPES}, batch_size=batch_size)
+    cursor = FakeCursor(backlog(args.notifications), args.db_latency_ms / 1000)
+
+    started = time.perf_counter()
+    with patch("app.services.notifications.db.atransaction", return_value=FakeConnection(cursor)):
+        while await outbox.run_once():
+            pass
+    elapsed = time.perf_counter() - started
+    assert channel.sent == args.notifications
+    return elapsed
+
+async def main_async(args):
+    print(f"{'batch':>6} {'seconds':>9} {'notif/s':>10}")
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        elapsed = await drain(args, batch_size)
+        print(f"{batch_size:>6} {elapsed:>9.2f} {args.notifications / elapsed:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=5000, help="backlog size")
+    parser.add_argument("--batch-sizes", default="1,10,100,500", help="comma-separated batch sizes")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="cost of one SQL statement")
+    parser.add_argument("--send-latency-ms", type=float, default=2.0, help="cost of one channel send")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
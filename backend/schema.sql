@@ -92,12 +92,20 @@ CREATE TABLE DOCTOR_SCHEDULE (
     FOREIGN KEY (doctor_id) REFERENCES DOCTORS(doctor_id)
 );
 
+CREATE TABLE SCHEDULE_MATERIALIZATION (
+    doctor_id INT PRIMARY KEY,
+    materialized_through DATE NOT NULL,
+    FOREIGN KEY (doctor_id) REFERENCES DOCTORS(doctor_id) ON DELETE CASCADE
+);
+
 CREATE TABLE TIMESLOTS (
     slot_id INT PRIMARY KEY AUTO_INCREMENT,
     calendar_id INT NOT NULL,
     start_time DATETIME NOT NULL,
     end_time DATETIME NOT NULL,
     is_available BOOLEAN DEFAULT TRUE,
+    INDEX idx_timeslots_calendar_start (calendar_id, start_time, end_time),
+    INDEX idx_timeslots_start (start_time),
     FOREIGN KEY (calendar_id) REFERENCES DOCTOR_CALENDAR(calendar_id)
 );
 
@@ -110,6 +118,9 @@ CREATE TABLE APPOINTMENTS (
     status ENUM('Scheduled', 'Completed', 'Cancelled') NOT NULL,
     notes TEXT,
     priority_flag BOOLEAN DEFAULT FALSE,
+    INDEX idx_appointments_date (appointment_date, appointment_id),
+    INDEX idx_appointments_doctor_date (doctor_id, appointment_date, appointment_id),
+    INDEX idx_appointments_patient_date (patient_id, appointment_date, appointment_id),
     FOREIGN KEY (patient_id) REFERENCES PATIENTS(patient_id),
     FOREIGN KEY (doctor_id) REFERENCES DOCTORS(doctor_id),
     FOREIGN KEY (slot_id) REFERENCES TIMESLOTS(slot_id)
@@ -199,7 +210,24 @@ CREATE TABLE PATIENT_MEDS (
 CREATE TABLE PERMISSIONS (
     perm_id INT PRIMARY KEY AUTO_INCREMENT,
     resource VARCHAR(50) NOT NULL,
-    action VARCHAR(50) NOT NULL
+    action VARCHAR(50) NOT NULL,
+    UNIQUE KEY uq_permissions_resource_action (resource, action)
+);
+
+CREATE TABLE ROLE_PERMISSIONS (
+    role_id INT NOT NULL,
+    perm_id INT NOT NULL,
+    PRIMARY KEY (role_id, perm_id),
+    FOREIGN KEY (role_id) REFERENCES ROLES(role_id) ON DELETE CASCADE,
+    FOREIGN KEY (perm_id) REFERENCES PERMISSIONS(perm_id) ON DELETE CASCADE
+);
+
+CREATE TABLE USER_PERMISSIONS (
+    user_id INT NOT NULL,
+    perm_id INT NOT NULL,
+    PRIMARY KEY (user_id, perm_id),
+    FOREIGN KEY (user_id) REFERENCES USERS(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (perm_id) REFERENCES PERMISSIONS(perm_id) ON DELETE CASCADE
 );
 
 CREATE TABLE AUDIT_LOGS (
@@ -222,6 +250,16 @@ CREATE TABLE NOTIFICATIONS (
     FOREIGN KEY (user_id) REFERENCES USERS(user_id)
 );
 
+CREATE TABLE NOTIFICATION_DELIVERY (
+    notif_id INT PRIMARY KEY,
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME,
+    delivered_at DATETIME,
+    last_error VARCHAR(255),
+    INDEX idx_notification_delivery_due (delivered_at, next_attempt_at),
+    FOREIGN KEY (notif_id) REFERENCES NOTIFICATIONS(notif_id) ON DELETE CASCADE
+);
+
 CREATE TABLE CHAT_MESSAGES (
     message_id INT PRIMARY KEY AUTO_INCREMENT,
     sender_id INT NOT NULL,
@@ -231,10 +269,25 @@ CREATE TABLE CHAT_MESSAGES (
     is_urgent BOOLEAN DEFAULT FALSE,
     read_status BOOLEAN DEFAULT FALSE,
     message_type ENUM('Text', 'Image', 'File'),
+    INDEX idx_chat_messages_receiver_sender_read (receiver_id, sender_id, read_status),
+    INDEX idx_chat_messages_sender_receiver_sent (sender_id, receiver_id, sent_at),
+    INDEX idx_chat_messages_sender_receiver_id (sender_id, receiver_id, message_id),
     FOREIGN KEY (sender_id) REFERENCES USERS(user_id),
     FOREIGN KEY (receiver_id) REFERENCES USERS(user_id)
 );
 
+CREATE TABLE CONVERSATIONS (
+    user_id INT NOT NULL,
+    contact_id INT NOT NULL,
+    last_message_id INT NOT NULL,
+    last_sent_at DATETIME NOT NULL,
+    unread_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, contact_id),
+    INDEX idx_conversations_user_last (user_id, last_message_id),
+    FOREIGN KEY (user_id) REFERENCES USERS(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (contact_id) REFERENCES USERS(user_id) ON DELETE CASCADE
+);
+
 CREATE TABLE CHATBOT_LOGS (
     log_id INT PRIMARY KEY AUTO_INCREMENT,
     patient_id INT NOT NULL,
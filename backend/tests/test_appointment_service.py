@@ -0,0 +1,64 @@
+import pytest
+from datetime import date, datetime
+from app.services.appointments import build_list_query, decode_cursor, encode_cursor, page, parse_fields
+
+def test_cursor_round_trip():
+    row = {"appointment_date": datetime(2023, 12, 1, 9, 30), "appointment_id": 17}
+
+    assert decode_cursor(encode_cursor(row)) == (datetime(2023, 12, 1, 9, 30), 17)
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_parse_fields_rejects_unknown_names():
+    assert parse_fields(None) is None
+    assert parse_fields("status, appointment_date") == ["status", "appointment_date"]
+
+    with pytest.raises(ValueError):
+        parse_fields("status,password")
+
+def test_list_query_filters_and_seeks_past_cursor():
+    query, params = build_list_query(
+        "doctor",
+        scope_doctor_id=4,
+        status="Scheduled",
+        date_from=date(2023, 12, 1),
+        date_to=date(2023, 12, 31),
+        after=(datetime(2023, 12, 20, 9), 55),
+        limit=51
+    )
+
+    assert "a.doctor_id = %s" in query
+    assert "a.status = %s" in query
+    assert "(a.appointment_date < %s OR (a.appointment_date = %s AND a.appointment_id < %s))" in query
+    assert query.endswith("ORDER BY a.appointment_date DESC, a.appointment_id DESC LIMIT %s")
+    assert params == [
+        4, "Scheduled",
+        datetime(2023, 12, 1), datetime(2024, 1, 1),
+        datetime(2023, 12, 20, 9), datetime(2023, 12, 20, 9), 55,
+        51
+    ]
+    # Doctors get patient columns by default
+    assert "JOIN USERS pu" in query and "JOIN USERS du" not in query
+
+def test_list_query_projection_only_joins_what_it_needs():
+    query, _ = build_list_query("admin", fields=["status"])
+    assert "JOIN" not in query
+    assert "a.appointment_date AS appointment_date" in query
+
+    query, _ = build_list_query("admin", fields=["department_name"])
+    assert "JOIN DOCTORS d" in query and "JOIN DEPARTMENTS dep" in query
+    assert query.index("JOIN DOCTORS d") < query.index("JOIN DEPARTMENTS dep")
+
+def test_page_trims_extra_row_and_hidden_keys():
+    rows = [
+        {"appointment_id": i, "appointment_date": datetime(2023, 12, 10 - i), "status": "Scheduled"}
+        for i in range(1, 4)
+    ]
+
+    items, next_cursor = page(rows, 2, ["status"])
+    assert items == [{"status": "Scheduled"}, {"status": "Scheduled"}]
+    assert decode_cursor(next_cursor) == (datetime(2023, 12, 8), 2)
+
+    items, next_cursor = page(rows, 3)
+    assert len(items) == 3 and next_cursor is None
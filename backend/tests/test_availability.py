@@ -0,0 +1,197 @@
+import asyncio
+import pytest
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.availability import AvailabilityIndex, DaySchedule
+
+TODAY = date(2023, 12, 1)
+NOW = datetime(2023, 12, 1, 8, 0)
+
+def dt(day, hour, minute=0):
+    return datetime(2023, 12, day, hour, minute)
+
+def doctor(doctor_id, department_id, spec_id):
+    return {
+        "doctor_id": doctor_id,
+        "first_name": f"Doc{doctor_id}",
+        "last_name": "Test",
+        "department_id": department_id,
+        "department_name": f"Dept{department_id}",
+        "spec_id": spec_id,
+        "spec_name": f"Spec{spec_id}"
+    }
+
+def slot(slot_id, doctor_id, start, end, available=True):
+    return {
+        "slot_id": slot_id,
+        "calendar_id": doctor_id * 10,
+        "doctor_id": doctor_id,
+        "start_time": start,
+        "end_time": end,
+        "is_available": available
+    }
+
+def mock_db(*results):
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchall = AsyncMock(side_effect=list(results))
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+    return patch('app.services.availability.db.aget_db', return_value=conn)
+
+async def loaded_index(doctors, slots, horizon_days=30):
+    index = AvailabilityIndex(horizon_days=horizon_days)
+    with mock_db(doctors, slots):
+        await index.load(today=TODAY)
+    return index
+
+def test_day_schedule_bitmap_tracks_inserts_and_removals():
+    schedule = DaySchedule()
+    schedule.insert(2, 10, dt(1, 10), dt(1, 11), True)
+    schedule.insert(1, 10, dt(1, 9), dt(1, 10), False)
+    schedule.insert(3, 10, dt(1, 11), dt(1, 12), True)
+
+    assert schedule.slot_ids == [1, 2, 3]
+    assert schedule.free == 0b110
+
+    schedule.remove(2)
+    assert schedule.slot_ids == [1, 3]
+    assert schedule.free == 0b10
+
+    schedule.set_available(1, True)
+    assert [s[2] for s in schedule.free_slots(7, dt(1, 0))] == [1, 3]
+    assert [s[2] for s in schedule.free_slots(7, dt(1, 10))] == [3]
+
+@pytest.mark.asyncio
+async def test_search_filters_and_orders_earliest_first():
+    index = await loaded_index(
+        [doctor(1, 1, 1), doctor(2, 1, 2), doctor(3, 2, 1)],
+        [
+            slot(1, 1, dt(2, 10), dt(2, 11)),
+            slot(2, 2, dt(2, 9), dt(2, 10)),
+            slot(3, 3, dt(1, 15), dt(1, 16)),
+            slot(4, 1, dt(1, 9), dt(1, 10)),              # already started
+            slot(5, 2, dt(3, 9), dt(3, 10), available=False)
+        ]
+    )
+
+    assert [s["slot_id"] for s in index.search(now=NOW.replace(hour=12))] == [3, 2, 1]
+    assert [s["slot_id"] for s in index.search(department_id=1, now=NOW)] == [4, 2, 1]
+    assert [s["slot_id"] for s in index.search(department_id=1, spec_id=2, now=NOW)] == [2]
+    assert [s["slot_id"] for s in index.search(date_from=date(2023, 12, 2), now=NOW)] == [2, 1]
+    assert [s["slot_id"] for s in index.search(limit=2, now=NOW)] == [4, 3]
+
+    result = index.search(doctor_id=3, now=NOW)[0]
+    assert result["doctor_first_name"] == "Doc3"
+    assert result["department_name"] == "Dept2"
+    assert result["calendar_id"] == 30
+
+@pytest.mark.asyncio
+async def test_updates_apply_to_search_results():
+    index = await loaded_index([doctor(1, 1, 1)], [slot(1, 1, dt(2, 9), dt(2, 10))])
+
+    index.mark(1, False)
+    assert index.search(now=NOW) == []
+
+    index.mark(1, True)
+    index.upsert_slot(2, 1, 10, dt(2, 8), dt(2, 9), True)
+    index.upsert_slot(1, 1, 10, dt(3, 9), dt(3, 10), True)     # moved to the next day
+    assert [(s["slot_id"], s["start_time"]) for s in index.search(now=NOW)] == [
+        (2, dt(2, 8)), (1, dt(3, 9))
+    ]
+
+    index.remove_slot(2)
+    index.upsert_slot(3, 1, 10, datetime(2024, 6, 1, 9), datetime(2024, 6, 1, 10), True)  # past the horizon
+    assert [s["slot_id"] for s in index.search(now=NOW)] == [1]
+    assert index.stats()["slots"] == 1
+
+@pytest.mark.asyncio
+async def test_load_replays_updates_made_while_reading():
+    index = await loaded_index([doctor(1, 1, 1)], [slot(1, 1, dt(2, 9), dt(2, 10))])
+
+    results = [[doctor(1, 1, 1)], [slot(1, 1, dt(2, 9), dt(2, 10))]]
+
+    async def fetchall():
+        # The slot is booked after the reload read it as free
+        rows = results.pop(0)
+        if not results:
+            index.mark(1, False)
+        return rows
+
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchall = fetchall
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+
+    with patch('app.services.availability.db.aget_db', return_value=conn):
+        await index.load(today=TODAY)
+
+    assert index.search(now=NOW) == []
+    assert index.stats()["reloads"] == 2
+
+@pytest.mark.asyncio
+async def test_overlapping_loads_keep_updates_made_while_reading():
+    index = await loaded_index([doctor(1, 1, 1)], [slot(1, 1, dt(2, 9), dt(2, 10))])
+    booked = False
+    reads = 0
+
+    async def fetchall():
+        nonlocal booked, reads
+        await asyncio.sleep(0)
+        reads += 1
+        if reads % 2:
+            return [doctor(1, 1, 1)]
+        rows = [slot(1, 1, dt(2, 9), dt(2, 10), available=not booked)]
+        if not booked:
+            # The slot is booked after the first reload read it as free
+            booked = True
+            index.mark(1, False)
+        return rows
+
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchall = fetchall
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+
+    with patch('app.services.availability.db.aget_db', return_value=conn):
+        await asyncio.gather(index.load(today=TODAY), index.load(today=TODAY))
+
+    assert index.search(now=NOW) == []
+    assert index.stats()["reloads"] == 3
+
+@pytest.mark.asyncio
+async def test_refresh_doctor_replaces_its_slots():
+    index = await loaded_index(
+        [doctor(1, 1, 1), doctor(2, 1, 1)],
+        [slot(1, 1, dt(2, 9), dt(2, 10)), slot(2, 2, dt(2, 9), dt(2, 10))]
+    )
+
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchone = AsyncMock(return_value=doctor(1, 3, 1))
+    cursor.fetchall = AsyncMock(return_value=[slot(5, 1, dt(4, 9), dt(4, 10)), slot(6, 1, dt(4, 10), dt(4, 11))])
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+
+    with patch('app.services.availability.db.aget_db', return_value=conn):
+        await index.refresh_doctor(1)
+
+    assert [s["slot_id"] for s in index.search(now=NOW)] == [2, 5, 6]
+    assert [s["slot_id"] for s in index.search(department_id=3, now=NOW)] == [5, 6]
+    assert [s["slot_id"] for s in index.search(department_id=1, now=NOW)] == [2]
+
+@pytest.mark.asyncio
+async def test_next_available_skips_booked_days():
+    slots = [slot(i, 1, dt(2, 9 + i), dt(2, 10 + i), available=False) for i in range(1, 5)]
+    slots += [slot(10, 2, dt(5, 9), dt(5, 10)), slot(11, 1, dt(6, 9), dt(6, 10)), slot(12, 1, dt(7, 9), dt(7, 10))]
+    index = await loaded_index([doctor(1, 1, 4), doctor(2, 2, 4)], slots)
+
+    assert [s["slot_id"] for s in index.next_available(spec_id=4, count=2, now=NOW)] == [10, 11]
+    assert [s["slot_id"] for s in index.next_available(doctor_id=1, count=5, now=NOW)] == [11, 12]
+    assert index.next_available(department_id=9, now=NOW) == []
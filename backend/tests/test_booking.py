@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.booking import CLAIM_SLOT_QUERY, INSERT_APPOINTMENT_QUERY, SlotUnavailable, abook_slot
+
+def mock_cursor(*rowcounts):
+    cursor = MagicMock()
+    remaining = list(rowcounts)
+
+    async def execute(query, params=None):
+        cursor.rowcount = remaining.pop(0)
+
+    cursor.execute = AsyncMock(side_effect=execute)
+    cursor.lastrowid = 42
+    return cursor
+
+@pytest.mark.asyncio
+async def test_book_slot_claims_then_inserts():
+    cursor = mock_cursor(1, 1)
+
+    appointment_id = await abook_slot(cursor, 7, 3, "Checkup", True)
+
+    assert appointment_id == 42
+    claim, insert = cursor.execute.await_args_list
+    assert claim.args == (CLAIM_SLOT_QUERY, (7,))
+    assert insert.args == (INSERT_APPOINTMENT_QUERY, (3, "Checkup", True, 7))
+
+@pytest.mark.asyncio
+async def test_book_slot_rejects_taken_slot():
+    cursor = mock_cursor(0)
+
+    with pytest.raises(SlotUnavailable):
+        await abook_slot(cursor, 7, 3)
+
+    # Nothing is inserted once the claim fails
+    assert cursor.execute.await_count == 1
+
+@pytest.mark.asyncio
+async def test_book_slot_without_calendar_fails():
+    cursor = mock_cursor(1, 0)
+
+    with pytest.raises(ValueError):
+        await abook_slot(cursor, 7, 3)
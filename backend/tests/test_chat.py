@@ -215,4 +215,30 @@ def test_get_unread_count():
         )
         
         assert response.status_code == 200
-        assert response.json()["count"] == 3 
\ No newline at end of file
+        assert response.json()["count"] == 3 
+@pytest.mark.asyncio
+async def test_send_message_publishes_after_commit():
+    from unittest.mock import AsyncMock
+    from app.api.endpoints.chat import MessageCreate, manager, send_message
+
+    events = []
+    mock_cursor = MagicMock()
+    mock_cursor.execute = AsyncMock()
+    mock_cursor.fetchone = AsyncMock(side_effect=[
+        {"user_id": 2},
+        {"message_id": 5, "sender_id": 1, "receiver_id": 2, "message": "Hi", "message_type": "Text",
+         "sent_at": None, "read_status": False, "is_urgent": False}
+    ])
+    mock_cursor.lastrowid = 5
+    mock_conn = MagicMock()
+    mock_conn.__aenter__.return_value = mock_conn
+    mock_conn.__aexit__ = AsyncMock(side_effect=lambda *exc: events.append("commit"))
+    mock_conn.cursor.return_value.__aenter__.return_value = mock_cursor
+
+    with patch('app.api.endpoints.chat.db.atransaction', return_value=mock_conn), \
+         patch('app.api.endpoints.chat.arecord_message', AsyncMock()), \
+         patch.object(manager, "send_personal_message", AsyncMock(side_effect=lambda *args: events.append("publish"))):
+        result = await send_message(MessageCreate(receiver_id=2, message="Hi"), {"user_id": 1}, None)
+
+    assert result["message_id"] == 5
+    assert events == ["commit", "publish"]
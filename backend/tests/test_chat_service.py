@@ -0,0 +1,117 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from app.services.chat import (
+    BACKFILL_QUERY, MARK_READ_QUERY,
+    amark_page_read, amark_read, arecord_message, arecord_messages, backfill_conversations,
+    build_contacts_query, build_history_query
+)
+
+def test_contacts_query_lists_every_other_user_by_name():
+    query, params = build_contacts_query(7, limit=20, offset=40)
+
+    assert "FROM USERS u" in query
+    assert "LEFT JOIN CONVERSATIONS c ON c.user_id = %s AND c.contact_id = u.user_id" in query
+    assert "WHERE u.user_id != %s" in query
+    assert "ORDER BY u.first_name, u.last_name, u.user_id" in query
+    assert query.endswith("LIMIT %s OFFSET %s")
+    assert params == [7, 7, 20, 40]
+
+def test_conversations_only_reads_one_range_of_the_summary():
+    query, params = build_contacts_query(7, conversations_only=True)
+
+    assert "FROM CONVERSATIONS c" in query
+    assert "WHERE c.user_id = %s" in query
+    assert "ORDER BY c.last_message_id DESC" in query
+    assert "GROUP BY" not in query
+    assert params == [7, 50, 0]
+
+@pytest.mark.asyncio
+async def test_record_message_updates_both_sides_in_key_order():
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    sent_at = datetime(2024, 3, 1, 10, 0)
+
+    await arecord_message(cursor, 9, 4, 120, sent_at)
+
+    query, params = cursor.execute.await_args.args
+    assert query.count("(%s, %s, %s, %s, %s)") == 2
+    # The receiver's row comes first here and is the one counted unread
+    assert params == [4, 9, 120, sent_at, 1, 9, 4, 120, sent_at, 0]
+
+@pytest.mark.asyncio
+async def test_record_messages_writes_a_batch_in_one_statement():
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    sent_at = datetime(2024, 3, 1, 10, 0)
+
+    await arecord_messages(cursor, [(9, 4, 120, sent_at), (4, 9, 121, sent_at), (2, 4, 122, sent_at)])
+
+    query, params = cursor.execute.await_args.args
+    assert query.count("(%s, %s, %s, %s, %s)") == 6
+    keys = [tuple(params[i:i + 2]) for i in range(0, len(params), 5)]
+    assert keys == sorted(keys)
+
+@pytest.mark.asyncio
+async def test_mark_read_skips_when_nothing_changed():
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+
+    await amark_read(cursor, 4, 9, 0)
+    cursor.execute.assert_not_awaited()
+
+    await amark_read(cursor, 4, 9, 3)
+    cursor.execute.assert_awaited_once_with(MARK_READ_QUERY, (3, 4, 9))
+
+def test_backfill_covers_both_directions_of_the_range():
+    cursor = MagicMock()
+    cursor.rowcount = 6
+
+    assert backfill_conversations(cursor, 1, 1000) == 6
+    cursor.execute.assert_called_once_with(BACKFILL_QUERY, (1, 1000, 1, 1000))
+
+def test_history_query_seeks_before_cursor_in_both_directions():
+    query, params = build_history_query(7, 3, before=500, limit=30)
+
+    assert query.count("UNION ALL") == 1
+    assert query.count("AND message_id < %s ORDER BY message_id DESC LIMIT %s") == 2
+    assert query.endswith("ORDER BY message_id DESC LIMIT %s")
+    assert params == [7, 3, 500, 30, 3, 7, 500, 30, 30]
+
+def test_history_query_after_cursor_reads_oldest_first():
+    query, params = build_history_query(7, 3, after=500, limit=30)
+
+    assert "AND message_id > %s ORDER BY message_id ASC LIMIT %s" in query
+    assert query.endswith("ORDER BY message_id ASC LIMIT %s")
+
+    # A note to self has a single direction
+    query, params = build_history_query(7, 7)
+    assert "UNION ALL" not in query
+    assert params == [7, 7, 50, 50]
+
+@pytest.mark.asyncio
+async def test_mark_page_read_updates_only_unread_incoming_messages():
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.rowcount = 2
+    page = [
+        {"message_id": 12, "sender_id": 3, "receiver_id": 7, "read_status": False},
+        {"message_id": 11, "sender_id": 7, "receiver_id": 3, "read_status": False},
+        {"message_id": 10, "sender_id": 3, "receiver_id": 7, "read_status": True},
+        {"message_id": 9, "sender_id": 3, "receiver_id": 7, "read_status": False},
+    ]
+
+    assert await amark_page_read(cursor, 7, 3, page) == 2
+
+    update, decrement = cursor.execute.await_args_list
+    assert update.args[0].startswith("UPDATE CHAT_MESSAGES SET read_status = TRUE")
+    assert update.args[1] == [12, 9]
+    assert decrement.args == (MARK_READ_QUERY, (2, 7, 3))
+
+@pytest.mark.asyncio
+async def test_mark_page_read_without_unread_messages_runs_nothing():
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+
+    assert await amark_page_read(cursor, 7, 3, [{"message_id": 1, "sender_id": 7, "receiver_id": 3, "read_status": False}]) == 0
+    cursor.execute.assert_not_awaited()
@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config.database import DatabaseError
+from app.services.chat_writer import MessageWriter
+
+def mock_db(first_ids, fail_when=None, lock_mode=1):
+    """
+    Patch db.atransaction with a mock connection whose INSERTs report the
+    given first ids; ``fail_when(params)`` makes an INSERT raise.
+    """
+    cursor = MagicMock()
+    inserts = []
+    ids = iter(first_ids)
+
+    async def execute(query, params=None):
+        if "CHAT_MESSAGES" in query:
+            if fail_when and fail_when(params):
+                raise DatabaseError("Cannot add or update a child row")
+            inserts.append(params)
+            cursor.lastrowid = next(ids)
+
+    cursor.execute = AsyncMock(side_effect=execute)
+    cursor.fetchone = AsyncMock(return_value={"step": 1, "lock_mode": lock_mode})
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+    return patch("app.services.chat_writer.db.atransaction", return_value=conn), inserts
+
+@pytest.mark.asyncio
+async def test_concurrent_messages_share_one_insert_and_get_consecutive_ids():
+    writer = MessageWriter(max_batch=10, max_delay=0.01)
+    patcher, inserts = mock_db([40])
+
+    with patcher:
+        stored = await asyncio.gather(
+            writer.submit(1, 2, "first"),
+            writer.submit(3, 2, "second", is_urgent=True),
+            writer.submit(2, 1, "third")
+        )
+        await writer.close()
+
+    assert len(inserts) == 1
+    assert len(inserts[0]) == 3 * 7
+    assert [message["message_id"] for message in stored] == [40, 41, 42]
+    assert stored[1]["is_urgent"] is True
+    assert stored[0]["sent_at"].microsecond == 0
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["messages"] == 3
+
+@pytest.mark.asyncio
+async def test_batch_is_split_at_max_batch():
+    writer = MessageWriter(max_batch=2, max_delay=0.01)
+    patcher, inserts = mock_db([10, 12])
+
+    with patcher:
+        stored = await asyncio.gather(*(writer.submit(1, 2, f"m{n}") for n in range(3)))
+        await writer.close()
+
+    assert [len(params) // 7 for params in inserts] == [2, 1]
+    assert [message["message_id"] for message in stored] == [10, 11, 12]
+
+@pytest.mark.asyncio
+async def test_failed_batch_only_fails_the_bad_message():
+    writer = MessageWriter(max_batch=10, max_delay=0.01)
+    # The receiver 999 does not exist
+    patcher, inserts = mock_db([50, 51], fail_when=lambda params: 999 in params[1::7])
+
+    with patcher:
+        results = await asyncio.gather(
+            writer.submit(1, 2, "ok"),
+            writer.submit(1, 999, "bad"),
+            writer.submit(1, 3, "ok too"),
+            return_exceptions=True
+        )
+        await writer.close()
+
+    assert results[0]["message_id"] == 50
+    assert isinstance(results[1], DatabaseError)
+    assert results[2]["message_id"] == 51
+    assert writer.stats()["batch_retries"] == 1
+    assert writer.stats()["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_interleaved_lock_mode_inserts_each_message_on_its_own():
+    writer = MessageWriter(max_batch=10, max_delay=0.01)
+    # innodb_autoinc_lock_mode 2 may hand out non-consecutive ids
+    patcher, inserts = mock_db([70, 75, 76], lock_mode=2)
+
+    with patcher:
+        stored = await asyncio.gather(*(writer.submit(1, 2, f"m{n}") for n in range(3)))
+        await writer.close()
+
+    assert [len(params) // 7 for params in inserts] == [1, 1, 1]
+    assert [message["message_id"] for message in stored] == [70, 75, 76]
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["consecutive_ids"] is False
+
+@pytest.mark.asyncio
+async def test_close_lets_the_batch_in_flight_commit():
+    writer = MessageWriter(max_batch=10, max_delay=0)
+    patcher, inserts = mock_db([40, 41])
+    committing = asyncio.Event()
+    commit = asyncio.Event()
+
+    async def slow_record(cursor, messages):
+        committing.set()
+        await commit.wait()
+
+    with patcher, patch("app.services.chat_writer.arecord_messages", side_effect=slow_record):
+        first = asyncio.create_task(writer.submit(1, 2, "in flight"))
+        await committing.wait()
+        second = asyncio.create_task(writer.submit(1, 2, "queued"))
+        await asyncio.sleep(0)
+        closing = asyncio.create_task(writer.close())
+        await asyncio.sleep(0)
+        commit.set()
+        await closing
+
+    assert (await first)["message_id"] == 40
+    assert (await second)["message_id"] == 41
+    assert len(inserts) == 2
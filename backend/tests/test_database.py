@@ -0,0 +1,228 @@
+import pytest
+import threading
+import time
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi import HTTPException
+from pymysql.constants import SERVER_STATUS
+from app.config.database import ConnectionPool, Database, DatabaseError, PoolTimeoutError
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.server_status = 0
+        self.pings = 0
+        self.rollbacks = 0
+        self.fail_ping = False
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if self.fail_ping:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status &= ~SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+    def close(self):
+        self.open = False
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect(**config):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    options = {"min_size": 0, "max_size": 2, "timeout": 0.1, "ping_interval": 30}
+    options.update(kwargs)
+    return ConnectionPool({}, connect=connect, **options), created
+
+def test_pool_reuses_released_connections():
+    pool, created = make_pool()
+
+    conn = pool.acquire()
+    pool.release(conn)
+    again = pool.acquire()
+    pool.release(again)
+
+    assert again is conn
+    assert len(created) == 1
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["connections_created"] == 1
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+
+def test_pool_fill_opens_min_size():
+    pool, created = make_pool(min_size=2)
+
+    pool.fill()
+
+    assert len(created) == 2
+    assert pool.stats()["idle"] == 2
+
+def test_pool_times_out_when_exhausted():
+    pool, created = make_pool(max_size=1, timeout=0.05)
+
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    pool.release(conn)
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["size"] == 1
+
+def test_pool_waiter_gets_released_connection():
+    pool, created = make_pool(max_size=1, timeout=1)
+    conn = pool.acquire()
+    result = {}
+
+    def waiter():
+        result["conn"] = pool.acquire()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    pool.release(conn)
+    thread.join(timeout=1)
+
+    assert result["conn"] is conn
+    assert pool.stats()["wait_time_max"] > 0
+
+def test_pool_discards_connection_failing_health_check():
+    pool, created = make_pool(ping_interval=0)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.fail_ping = True
+    replacement = pool.acquire()
+
+    assert replacement is not conn
+    assert conn.open is False
+    assert pool.stats()["failed_health_checks"] == 1
+
+def test_pool_recycles_connections_past_max_lifetime():
+    pool, created = make_pool(max_lifetime=0.01)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.02)
+    replacement = pool.acquire()
+
+    assert replacement is not conn
+    assert conn.open is False
+
+def test_pool_evicts_idle_connections_above_min_size():
+    pool, created = make_pool(min_size=1, idle_timeout=0.01)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    time.sleep(0.02)
+    pool.acquire()
+
+    assert pool.stats()["size"] == 1
+    assert len([c for c in created if not c.open]) == 1
+
+def test_pool_rolls_back_open_transaction_on_release():
+    pool, created = make_pool()
+
+    conn = pool.acquire()
+    conn.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    pool.release(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+def test_pool_discards_closed_connections_on_release():
+    pool, created = make_pool()
+
+    conn = pool.acquire()
+    conn.open = False
+    pool.release(conn)
+
+    assert pool.stats()["size"] == 0
+
+def test_get_db_releases_connection_on_http_exception():
+    database = Database()
+    pool, created = make_pool()
+    database.pool = pool
+
+    with pytest.raises(HTTPException):
+        with database.get_db():
+            raise HTTPException(status_code=404, detail="Not found")
+
+    assert pool.stats()["in_use"] == 0
+    assert created[0].rollbacks == 1
+
+def test_get_db_wraps_errors():
+    database = Database()
+    pool, created = make_pool()
+    database.pool = pool
+
+    with pytest.raises(DatabaseError):
+        with database.get_db():
+            raise ValueError("boom")
+
+    assert pool.stats()["in_use"] == 0
+
+class FakeAsyncConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = True
+        self.commits = 0
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+    async def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    async def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.conn = FakeAsyncConnection()
+        self.released = []
+
+    async def acquire(self):
+        return self.conn
+
+    def release(self, conn):
+        self.released.append(conn)
+
+@pytest.mark.asyncio
+async def test_aget_db_ends_transaction_before_release():
+    database = Database()
+    pool = FakeAsyncPool()
+
+    with patch.object(database, "init_async_pool", AsyncMock(return_value=pool)):
+        async with database.aget_db() as conn:
+            assert conn is pool.conn
+
+    assert pool.conn.rollbacks == 1
+    assert pool.released == [pool.conn]
+    assert database.async_pool_stats()["checkouts"] == 1
+
+@pytest.mark.asyncio
+async def test_atransaction_commits():
+    database = Database()
+    pool = FakeAsyncPool()
+
+    with patch.object(database, "init_async_pool", AsyncMock(return_value=pool)):
+        async with database.atransaction():
+            pass
+
+    assert pool.conn.commits == 1
+    assert pool.conn.rollbacks == 0
+    assert pool.released == [pool.conn]
@@ -0,0 +1,26 @@
+from unittest.mock import MagicMock, patch
+from app.utils import db_init
+from app.utils.db_init import ensure_indexes
+
+def test_ensure_indexes_creates_missing_index():
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [{"TABLE_NAME": "TIMESLOTS"}, None]
+
+    with patch.object(db_init, "INDEXES", [("TIMESLOTS", "idx_test", "calendar_id, start_time")]):
+        ensure_indexes(cursor)
+
+    assert cursor.execute.call_args[0][0] == "CREATE INDEX idx_test ON TIMESLOTS (calendar_id, start_time)"
+
+def test_ensure_indexes_skips_existing_index_and_missing_table():
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [{"TABLE_NAME": "timeslots"}, {"1": 1}, None]
+
+    with patch.object(db_init, "INDEXES", [
+        ("TIMESLOTS", "idx_test", "calendar_id"),
+        ("MISSING", "idx_missing", "id")
+    ]):
+        ensure_indexes(cursor)
+
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    assert not any(statement.startswith("CREATE INDEX") for statement in statements)
+    assert len(statements) == 3
@@ -1,7 +1,7 @@
 import pytest
 from fastapi import HTTPException
-from unittest.mock import patch, MagicMock
-from app.api.deps import get_current_user, get_current_admin, get_current_doctor, get_current_patient
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.api.deps import get_current_user, get_current_admin, get_current_doctor, get_current_patient, PrincipalCache, principal_cache
 import pytest_asyncio
 import sys
 import os
@@ -9,19 +9,27 @@ import os
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
 @pytest.mark.asyncio
 async def test_get_current_user_success():
     # Mock the token verification and database response
     with patch('app.utils.security.security.verify_token') as mock_verify, \
-         patch('app.api.deps.db.get_db') as mock_db:
+         patch('app.api.deps.db.aget_db') as mock_db:
         
         # Setup mocks
         mock_verify.return_value = {"sub": "1"}
         
         mock_cursor = MagicMock()
+        mock_cursor.execute = AsyncMock()
+        mock_cursor.fetchone = AsyncMock()
         mock_conn = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_conn.__aenter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__aenter__.return_value = mock_cursor
         mock_db.return_value = mock_conn
         
         # Mock user query
@@ -60,15 +68,17 @@ async def test_get_current_user_invalid_token():
 async def test_get_current_user_not_found():
     # Mock the token verification and database response
     with patch('app.utils.security.security.verify_token') as mock_verify, \
-         patch('app.api.deps.db.get_db') as mock_db:
+         patch('app.api.deps.db.aget_db') as mock_db:
         
         # Setup mocks
         mock_verify.return_value = {"sub": "999"}
         
         mock_cursor = MagicMock()
+        mock_cursor.execute = AsyncMock()
+        mock_cursor.fetchone = AsyncMock()
         mock_conn = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_conn.__aenter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__aenter__.return_value = mock_cursor
         mock_db.return_value = mock_conn
         
         # Mock user query (user not found)
@@ -114,35 +124,37 @@ async def test_get_current_admin_not_admin():
 
 @pytest.mark.asyncio
 async def test_get_current_doctor_success():
-    # Mock the get_current_user dependency and database response
-    with patch('app.api.deps.db.get_db') as mock_db:
-        
-        # Setup mocks
-        mock_cursor = MagicMock()
-        mock_conn = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_db.return_value = mock_conn
-        
-        # Mock doctor query
-        mock_cursor.fetchone.return_value = {
-            "doctor_id": 1
-        }
-        
-        # Mock current user
-        current_user = {
-            "user_id": 2,
-            "email": "doctor@example.com",
-            "first_name": "Doctor",
-            "last_name": "User",
-            "role_id": 2,
-            "role_name": "doctor"
-        }
-        
-        # Test get_current_doctor
-        doctor = await get_current_doctor(current_user)
-        
-        assert doctor["doctor_id"] == 1
+    # Mock current user as loaded by get_current_user
+    current_user = {
+        "user_id": 2,
+        "email": "doctor@example.com",
+        "first_name": "Doctor",
+        "last_name": "User",
+        "role_id": 2,
+        "role_name": "doctor",
+        "doctor_id": 1,
+        "patient_id": None,
+        "management_id": None
+    }
+    
+    # Test get_current_doctor
+    doctor = await get_current_doctor(current_user)
+    
+    assert doctor["doctor_id"] == 1
+
+@pytest.mark.asyncio
+async def test_get_current_doctor_without_profile():
+    current_user = {
+        "user_id": 2,
+        "email": "doctor@example.com",
+        "role_name": "doctor",
+        "doctor_id": None
+    }
+    
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_doctor(current_user)
+    
+    assert excinfo.value.status_code == 403
 
 @pytest.mark.asyncio
 async def test_get_current_doctor_not_doctor():
@@ -165,35 +177,23 @@ async def test_get_current_doctor_not_doctor():
 
 @pytest.mark.asyncio
 async def test_get_current_patient_success():
-    # Mock the get_current_user dependency and database response
-    with patch('app.api.deps.db.get_db') as mock_db:
-        
-        # Setup mocks
-        mock_cursor = MagicMock()
-        mock_conn = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_db.return_value = mock_conn
-        
-        # Mock patient query
-        mock_cursor.fetchone.return_value = {
-            "patient_id": 1
-        }
-        
-        # Mock current user
-        current_user = {
-            "user_id": 3,
-            "email": "patient@example.com",
-            "first_name": "Patient",
-            "last_name": "User",
-            "role_id": 3,
-            "role_name": "patient"
-        }
-        
-        # Test get_current_patient
-        patient = await get_current_patient(current_user)
-        
-        assert patient["patient_id"] == 1
+    # Mock current user as loaded by get_current_user
+    current_user = {
+        "user_id": 3,
+        "email": "patient@example.com",
+        "first_name": "Patient",
+        "last_name": "User",
+        "role_id": 3,
+        "role_name": "patient",
+        "doctor_id": None,
+        "patient_id": 1,
+        "management_id": None
+    }
+    
+    # Test get_current_patient
+    patient = await get_current_patient(current_user)
+    
+    assert patient["patient_id"] == 1
 
 @pytest.mark.asyncio
 async def test_get_current_patient_not_patient():
@@ -212,4 +212,172 @@ async def test_get_current_patient_not_patient():
         await get_current_patient(current_user)
     
     assert excinfo.value.status_code == 403
-    assert "Not authorized to access this resource" in excinfo.value.detail 
\ No newline at end of file
+    assert "Not authorized to access this resource" in excinfo.value.detail 
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.queries.append(query)
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.closed = False
+        self.cursor_instance = FakeCursor(rows)
+
+    def cursor(self):
+        return self.cursor_instance
+
+    def get_transaction_status(self):
+        return False
+
+    async def rollback(self):
+        pass
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.acquired = 0
+        self.released = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return self.conn
+
+    def release(self, conn):
+        self.released += 1
+
+def test_request_shares_one_connection():
+    from fastapi import FastAPI, Depends
+    from fastapi.testclient import TestClient
+    from app.api.deps import get_request_db
+    from app.config.database import db
+
+    pool = FakePool(FakeConnection([
+        {
+            "user_id": 2,
+            "email": "doctor@example.com",
+            "first_name": "Doctor",
+            "last_name": "User",
+            "role_id": 2,
+            "role_name": "doctor",
+            "doctor_id": 7,
+            "patient_id": None,
+            "management_id": None
+        }
+    ]))
+    test_app = FastAPI()
+
+    @test_app.get("/whoami")
+    async def whoami(current_user = Depends(get_current_doctor), conn = Depends(get_request_db)):
+        async with db.aget_db(conn) as handler_conn:
+            return {"doctor_id": current_user["doctor_id"], "shared": handler_conn is pool.conn}
+
+    with patch.object(db, "init_async_pool", AsyncMock(return_value=pool)), \
+         patch('app.utils.security.security.verify_token') as mock_verify:
+        mock_verify.return_value = {"sub": "2"}
+        response = TestClient(test_app).get("/whoami", headers={"Authorization": "Bearer doctor_token"})
+
+    assert response.status_code == 200
+    assert response.json() == {"doctor_id": 7, "shared": True}
+    assert pool.acquired == 1
+    assert pool.released == 1
+    assert len(pool.conn.cursor_instance.queries) == 1
+
+def test_cached_principal_takes_no_connection():
+    from fastapi import FastAPI, Depends
+    from fastapi.testclient import TestClient
+    from app.config.database import db
+
+    pool = FakePool(FakeConnection([]))
+    principal_cache.set("2", {"user_id": 2, "role_id": 2, "role_name": "doctor", "doctor_id": 7})
+    test_app = FastAPI()
+
+    @test_app.get("/whoami")
+    async def whoami(current_user = Depends(get_current_doctor)):
+        return {"doctor_id": current_user["doctor_id"]}
+
+    with patch.object(db, "init_async_pool", AsyncMock(return_value=pool)), \
+         patch('app.utils.security.security.verify_token') as mock_verify:
+        mock_verify.return_value = {"sub": "2"}
+        response = TestClient(test_app).get("/whoami", headers={"Authorization": "Bearer doctor_token"})
+
+    assert response.json() == {"doctor_id": 7}
+    assert pool.acquired == 0
+    assert pool.released == 0
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_principal_cache():
+    with patch('app.utils.security.security.verify_token') as mock_verify, \
+         patch('app.api.deps.db.aget_db') as mock_db:
+        
+        mock_verify.return_value = {"sub": "1"}
+        
+        mock_cursor = MagicMock()
+        mock_cursor.execute = AsyncMock()
+        mock_cursor.fetchone = AsyncMock(return_value={"user_id": 1, "role_id": 1, "role_name": "admin"})
+        mock_conn = MagicMock()
+        mock_conn.__aenter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__aenter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        
+        before = principal_cache.stats()
+        first = await get_current_user("test_token")
+        first["role_name"] = "patient"
+        second = await get_current_user("test_token")
+        
+        assert mock_cursor.execute.await_count == 1
+        assert second["role_name"] == "admin"
+        stats = principal_cache.stats()
+        assert stats["hits"] - before["hits"] == 1
+        assert stats["misses"] - before["misses"] == 1
+
+def test_principal_cache_evicts_least_recently_used():
+    cache = PrincipalCache(max_size=2, ttl=60)
+    cache.set(1, {"user_id": 1})
+    cache.set(2, {"user_id": 2})
+    cache.get(1)
+    cache.set(3, {"user_id": 3})
+    
+    assert cache.get(2) is None
+    assert cache.get(1) == {"user_id": 1}
+    assert cache.stats()["evictions"] == 1
+
+def test_principal_cache_expires_entries():
+    cache = PrincipalCache(max_size=2, ttl=60)
+    cache.set(1, {"user_id": 1})
+    
+    with patch('app.api.deps.time.monotonic', return_value=10 ** 9):
+        assert cache.get(1) is None
+    assert cache.stats()["size"] == 0
+
+def test_principal_cache_invalidation():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.set(1, {"user_id": 1, "role_id": 2})
+    cache.set(2, {"user_id": 2, "role_id": 2})
+    cache.set(3, {"user_id": 3, "role_id": 3})
+    
+    cache.invalidate("1")
+    assert cache.get(1) is None
+    
+    cache.invalidate_role(2)
+    assert cache.get(2) is None
+    assert cache.get(3) is not None
+
+def test_principal_cache_skips_loads_older_than_invalidation():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.set(1, {"user_id": 1}, generation)
+    
+    assert cache.get(1) is None
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.exports import CSVEncoder, NDJSONEncoder, get_encoder, stream_query
+
+ROWS = [
+    {"record_id": 1, "created_at": datetime(2023, 12, 1, 9, 30), "amount": Decimal("12.50"), "notes": "a, \"b\""},
+    {"record_id": 2, "created_at": datetime(2023, 12, 2, 10, 0), "amount": None, "notes": "line\nbreak"}
+]
+
+def mock_db(batches):
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchmany = AsyncMock(side_effect=batches + [[]])
+    cursor.close = AsyncMock()
+    cursor.description = [("record_id",), ("created_at",), ("amount",), ("notes",)]
+    conn = MagicMock()
+    conn.cursor = AsyncMock(return_value=cursor)
+    cm = MagicMock()
+    cm.__aenter__ = AsyncMock(return_value=conn)
+    cm.__aexit__ = AsyncMock(return_value=False)
+    return patch('app.services.exports.db.aget_db', return_value=cm), conn, cursor
+
+def test_ndjson_encoder_writes_one_object_per_line():
+    lines = NDJSONEncoder().encode(ROWS).decode().splitlines()
+
+    assert [json.loads(line) for line in lines] == [
+        {"record_id": 1, "created_at": "2023-12-01T09:30:00", "amount": "12.50", "notes": "a, \"b\""},
+        {"record_id": 2, "created_at": "2023-12-02T10:00:00", "amount": None, "notes": "line\nbreak"}
+    ]
+
+def test_csv_encoder_quotes_values():
+    encoder = CSVEncoder()
+    output = (encoder.header(["record_id", "notes"]) + encoder.encode(ROWS)).decode()
+
+    assert output == 'record_id,notes\r\n1,"a, ""b"""\r\n2,"line\nbreak"\r\n'
+
+def test_get_encoder_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        get_encoder("xlsx")
+
+@pytest.mark.asyncio
+async def test_stream_query_yields_one_chunk_per_batch():
+    patcher, conn, cursor = mock_db([ROWS[:1], ROWS[1:]])
+
+    with patcher:
+        chunks = [chunk async for chunk in stream_query("SELECT 1", [], CSVEncoder(), batch_size=1)]
+
+    assert chunks[0] == b"record_id,created_at,amount,notes\r\n"
+    assert len(chunks) == 3
+    cursor.fetchmany.assert_awaited_with(1)
+    cursor.close.assert_awaited_once()
+    conn.close.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_stream_query_closes_connection_when_client_leaves():
+    patcher, conn, cursor = mock_db([ROWS[:1], ROWS[1:]])
+
+    with patcher:
+        stream = stream_query("SELECT 1", [], NDJSONEncoder(), batch_size=1)
+        await stream.__anext__()
+        await stream.aclose()
+
+    conn.close.assert_called_once()
+    cursor.close.assert_not_awaited()
+
+class PoolCursor:
+    """Cursor of PoolConnection: a principal lookup, then an export of two batches."""
+
+    description = [("record_id",)]
+
+    def __init__(self):
+        self.batches = [[{"record_id": 1}], [{"record_id": 2}], []]
+
+    def __await__(self):
+        async def cursor():
+            return self
+        return cursor().__await__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        pass
+
+    async def fetchone(self):
+        return {"user_id": 1, "role_id": 1, "role_name": "admin"}
+
+    async def fetchmany(self, size):
+        # Let the other exports run while this one is mid-stream
+        await asyncio.sleep(0.01)
+        return self.batches.pop(0)
+
+    async def close(self):
+        pass
+
+class PoolConnection:
+    closed = False
+
+    def cursor(self, cursor_class=None):
+        return PoolCursor()
+
+    def get_transaction_status(self):
+        return False
+
+class BoundedPool:
+    def __init__(self, size):
+        self.free = asyncio.Semaphore(size)
+        self.in_use = 0
+        self.peak = 0
+
+    async def acquire(self):
+        await self.free.acquire()
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+        return PoolConnection()
+
+    def release(self, conn):
+        self.in_use -= 1
+        self.free.release()
+
+@pytest.mark.asyncio
+async def test_concurrent_exports_beyond_pool_size_hold_one_connection_each():
+    import httpx
+    from fastapi import FastAPI
+    from app.api.deps import principal_cache
+    from app.api.endpoints.exports import router
+    from app.config.database import db
+
+    pool = BoundedPool(2)
+    test_app = FastAPI()
+    test_app.include_router(router, prefix="/exports")
+    principal_cache.clear()
+
+    with patch.object(db, "init_async_pool", AsyncMock(return_value=pool)), \
+         patch.object(db.pool, "timeout", 2), \
+         patch("app.utils.security.security.verify_token", return_value={"sub": "1"}):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=test_app), base_url="http://test") as client:
+            responses = await asyncio.wait_for(asyncio.gather(*(
+                client.get("/exports/audit-logs", headers={"Authorization": "Bearer admin_token"})
+                for _ in range(6)
+            )), timeout=5)
+
+    principal_cache.clear()
+    assert [response.status_code for response in responses] == [200] * 6
+    assert all(response.text.splitlines() == ['{"record_id": 1}', '{"record_id": 2}'] for response in responses)
+    assert pool.peak == 2
+    assert pool.in_use == 0
@@ -0,0 +1,170 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.notifications import NotificationManager, NotificationOutbox, StubChannel, WebSocketChannel
+from app.services.pubsub import InMemoryBus
+
+NOW = datetime(2024, 3, 1, 9, 0)
+
+def notification(notif_id, notification_type="Push", attempts=0, user_id=7):
+    return {
+        "notif_id": notif_id,
+        "user_id": user_id,
+        "notification_type": notification_type,
+        "content": f"Notification {notif_id}",
+        "email": "patient@example.com",
+        "phone": "555-0100",
+        "attempts": attempts
+    }
+
+class Transactions:
+    """
+    Stand-in for db.atransaction that claims ``batch`` and records the
+    statements of each transaction, and whether one is open.
+    """
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.statements = []
+        self.open = False
+
+    def __call__(self):
+        transactions = self
+        statements = []
+        self.statements.append(statements)
+
+        async def execute(query, params=None):
+            statements.append((query, params))
+
+        cursor = MagicMock()
+        cursor.execute = AsyncMock(side_effect=execute)
+        cursor.fetchall = AsyncMock(return_value=self.batch)
+
+        class Transaction:
+            async def __aenter__(self):
+                transactions.open = True
+                return conn
+
+            async def __aexit__(self, *exc):
+                transactions.open = False
+                return False
+
+        conn = MagicMock()
+        conn.cursor.return_value.__aenter__.return_value = cursor
+        return Transaction()
+
+class Recording(StubChannel):
+    """StubChannel that also records whether a transaction was open while sending."""
+
+    def __init__(self, transactions, result=True):
+        super().__init__(result)
+        self.transactions = transactions
+        self.during_transaction = []
+
+    async def send(self, notification):
+        self.during_transaction.append(self.transactions.open)
+        return await super().send(notification)
+
+@pytest.mark.asyncio
+async def test_batch_is_claimed_sent_outside_a_transaction_and_settled_in_bulk():
+    transactions = Transactions([notification(1), notification(2, "Email"), notification(3, "SMS")])
+    channels = {name: Recording(transactions) for name in ("Push", "Email", "SMS")}
+    outbox = NotificationOutbox(channels, lease=120)
+
+    with patch("app.services.notifications.db.atransaction", side_effect=transactions):
+        assert await outbox.run_once(NOW) == 3
+
+    assert [n["notif_id"] for n in channels["Push"].sent] == [1]
+    assert [n["notif_id"] for n in channels["Email"].sent] == [2]
+    assert [n["notif_id"] for n in channels["SMS"].sent] == [3]
+    assert not any(open for channel in channels.values() for open in channel.during_transaction)
+
+    claim, settle = transactions.statements
+    # The claim leases the rows and counts the attempt
+    assert "FOR UPDATE OF d SKIP LOCKED" in claim[0][0]
+    assert "attempts = attempts + 1" in claim[1][0]
+    assert claim[1][1] == [NOW + timedelta(seconds=120), 1, 2, 3]
+    # Delivery is tracked in NOTIFICATION_DELIVERY; sent_status is the read flag
+    assert len(settle) == 1
+    assert "SET delivered_at" in settle[0][0]
+    assert "sent_status" not in settle[0][0]
+    assert settle[0][1][1:] == [1, 2, 3]
+    assert outbox.stats()["delivered"] == 3
+
+@pytest.mark.asyncio
+async def test_failures_are_scheduled_for_retry_with_backoff():
+    class Failing:
+        async def send(self, notification):
+            raise ConnectionError("SMTP unavailable")
+
+    transactions = Transactions([
+        notification(1),
+        notification(2, "Email", attempts=2),
+        notification(3, "SMS"),
+        notification(4, attempts=7)
+    ])
+    channels = {"Push": StubChannel(result=False), "Email": Failing(), "SMS": StubChannel()}
+    outbox = NotificationOutbox(channels, retry_base=5, max_attempts=8)
+
+    with patch("app.services.notifications.db.atransaction", side_effect=transactions):
+        await outbox.run_once(NOW)
+
+    delivered, failed = transactions.statements[1]
+    assert delivered[1][1:] == [3]
+    assert "JOIN (SELECT %s AS notif_id" in failed[0]
+    params = failed[1]
+    assert params[0::3] == [1, 2, 4]
+    assert params[2::3] == ["Recipient not connected", "SMTP unavailable", "Recipient not connected"]
+    # Backoff counts from when the sends finished
+    assert timedelta(seconds=5) <= params[1] - NOW < timedelta(seconds=6)
+    assert timedelta(seconds=20) <= params[4] - NOW < timedelta(seconds=21)
+    # The eighth failed attempt is the last
+    assert params[7] is None
+    assert outbox.stats()["failed_attempts"] == 3
+    assert outbox.stats()["abandoned"] == 1
+
+@pytest.mark.asyncio
+async def test_empty_batch_writes_nothing():
+    transactions = Transactions([])
+    outbox = NotificationOutbox({"Push": StubChannel()})
+
+    with patch("app.services.notifications.db.atransaction", side_effect=transactions):
+        assert await outbox.run_once(NOW) == 0
+
+    assert len(transactions.statements) == 1
+    assert len(transactions.statements[0]) == 1
+    assert outbox.stats()["batches"] == 0
+
+def test_backoff_is_capped():
+    outbox = NotificationOutbox(retry_base=5, retry_max=60)
+    assert [outbox.backoff(attempts) for attempts in range(1, 6)] == [5, 10, 20, 40, 60]
+
+@pytest.mark.asyncio
+async def test_websocket_channel_fails_while_the_user_is_offline():
+    manager = NotificationManager(InMemoryBus())
+    channel = WebSocketChannel(manager)
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.send_text = AsyncMock()
+
+    assert await channel.send(notification(1)) is False
+
+    await manager.connect(websocket, 7)
+    assert await channel.send(notification(2)) is True
+    await asyncio.sleep(0)
+    assert '"id":2' in websocket.send_text.await_args.args[0]
+    await manager.disconnect(websocket, 7)
+
+@pytest.mark.asyncio
+async def test_wake_starts_delivery_before_the_poll_interval():
+    outbox = NotificationOutbox({"Push": StubChannel()}, interval=60)
+    outbox.run_once = AsyncMock(return_value=0)
+
+    task = asyncio.create_task(outbox.run())
+    await asyncio.sleep(0.01)
+    outbox.wake()
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    assert outbox.run_once.await_count == 2
@@ -2,7 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from datetime import datetime, date
 from app.api.deps import get_current_user
 
@@ -242,7 +242,7 @@ def test_add_patient_allergy():
     with patch('app.config.database.db.transaction') as mock_db, \
          patch('app.config.database.db.get_db') as mock_get_db, \
          patch('app.utils.security.security.verify_token') as mock_verify, \
-         patch('app.api.deps.db.get_db') as mock_deps_db:
+         patch('app.api.deps.db.aget_db') as mock_deps_db:
         
         # Setup mocks
         mock_cursor = MagicMock()
@@ -251,21 +251,29 @@ def test_add_patient_allergy():
         mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
         mock_db.return_value = mock_conn
         mock_get_db.return_value = mock_conn
-        mock_deps_db.return_value = mock_conn
+        
+        # Auth dependencies use the async database layer
+        mock_deps_cursor = MagicMock()
+        mock_deps_cursor.execute = AsyncMock()
+        mock_deps_cursor.fetchone = AsyncMock()
+        mock_deps_conn = MagicMock()
+        mock_deps_conn.__aenter__.return_value = mock_deps_conn
+        mock_deps_conn.cursor.return_value.__aenter__.return_value = mock_deps_cursor
+        mock_deps_db.return_value = mock_deps_conn
         
         # Mock token verification
         mock_verify.return_value = {"sub": "1"}
         
         # Mock user query for auth
+        mock_deps_cursor.fetchone.return_value = {
+            "user_id": 1,
+            "email": "doctor@example.com",
+            "first_name": "Doctor",
+            "last_name": "User",
+            "role_id": 2,
+            "role_name": "doctor"
+        }
         mock_cursor.fetchone.side_effect = [
-            {
-                "user_id": 1,
-                "email": "doctor@example.com",
-                "first_name": "Doctor",
-                "last_name": "User",
-                "role_id": 2,
-                "role_name": "doctor"
-            },
             {
                 "patient_id": 1
             }
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from unittest.mock import patch, MagicMock
+from app.utils.permissions import PermissionMatrix
+from app.api.deps import verify_permission
+
+def mock_db(mock_get_db, *results):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.side_effect = list(results)
+    mock_conn = MagicMock()
+    mock_conn.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_get_db.return_value = mock_conn
+    return mock_cursor
+
+def test_matrix_checks_role_and_user_grants():
+    matrix = PermissionMatrix()
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        mock_db(
+            mock_get_db,
+            [
+                {"role_id": 4, "permission_name": "manage_departments"},
+                {"role_id": 4, "permission_name": "view_audit_logs"}
+            ],
+            [{"user_id": 9, "permission_name": "manage_specializations"}]
+        )
+        matrix.load()
+
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        assert matrix.has(1, 4, "manage_departments")
+        assert matrix.has(9, 2, "manage_specializations")
+        assert not matrix.has(1, 2, "manage_departments")
+        assert not matrix.has(9, 4, "manage_insurance")
+        mock_get_db.assert_not_called()
+
+def test_matrix_refresh_role_replaces_grants():
+    matrix = PermissionMatrix()
+    matrix.role_permissions = {4: frozenset({"manage_departments"})}
+    matrix._loaded_at = float("inf")
+
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        mock_db(mock_get_db, [{"role_id": 4, "permission_name": "view_audit_logs"}])
+        matrix.refresh_role(4)
+
+    assert matrix.has(1, 4, "view_audit_logs")
+    assert not matrix.has(1, 4, "manage_departments")
+
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        mock_db(mock_get_db, [])
+        matrix.refresh_role(4)
+
+    assert 4 not in matrix.role_permissions
+
+def test_matrix_has_never_touches_the_database():
+    matrix = PermissionMatrix(refresh_interval=0)
+    matrix.role_permissions = {4: frozenset({"manage_departments"})}
+    matrix._loaded_at = 0
+
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        assert matrix.has(1, 4, "manage_departments")
+        mock_get_db.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_matrix_keeps_previous_grants_when_reload_fails():
+    matrix = PermissionMatrix(refresh_interval=0.01)
+    matrix.role_permissions = {4: frozenset({"manage_departments"})}
+
+    with patch('app.utils.permissions.db.get_db', side_effect=Exception("db down")):
+        task = asyncio.create_task(matrix.run_refresh())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    assert matrix.has(1, 4, "manage_departments")
+    assert matrix.stats()["reload_errors"] >= 1
+
+@pytest.mark.asyncio
+async def test_matrix_reloads_in_the_background():
+    matrix = PermissionMatrix(refresh_interval=0.01)
+
+    with patch('app.utils.permissions.db.get_db') as mock_get_db:
+        mock_db(mock_get_db, [{"role_id": 4, "permission_name": "view_audit_logs"}], [])
+        task = asyncio.create_task(matrix.run_refresh())
+        while matrix.stats()["age"] is None:
+            await asyncio.sleep(0.005)
+        task.cancel()
+
+    assert matrix.has(1, 4, "view_audit_logs")
+
+@pytest.mark.asyncio
+async def test_verify_permission_uses_matrix():
+    dependency = verify_permission("manage_departments")
+    user = {"user_id": 1, "role_id": 4, "role_name": "management"}
+
+    with patch('app.api.deps.security.permissions.has', return_value=True) as mock_has:
+        assert await dependency(user) == user
+        mock_has.assert_called_once_with(1, 4, "manage_departments")
+
+    with patch('app.api.deps.security.permissions.has', return_value=False):
+        with pytest.raises(HTTPException) as excinfo:
+            await dependency(user)
+
+    assert excinfo.value.status_code == 403
+
+@pytest.mark.asyncio
+async def test_verify_permission_allows_admin():
+    dependency = verify_permission("view_audit_logs")
+    admin = {"user_id": 1, "role_id": 1, "role_name": "admin"}
+
+    with patch('app.api.deps.security.permissions.has') as mock_has:
+        assert await dependency(admin) == admin
+        mock_has.assert_not_called()
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.pubsub import InMemoryBus, RedisBus
+
+@pytest.mark.asyncio
+async def test_in_memory_bus_delivers_to_subscribed_channels_only():
+    bus = InMemoryBus()
+    received = []
+
+    async def handler(message):
+        received.append(message)
+
+    await bus.subscribe("medihub:chat:1", handler)
+    await bus.publish("medihub:chat:1", '{"n":1}')
+    await bus.publish("medihub:chat:2", '{"n":2}')
+    await bus.unsubscribe("medihub:chat:1")
+    await bus.publish("medihub:chat:1", '{"n":3}')
+
+    assert received == ['{"n":1}']
+    assert bus.stats()["published"] == 3
+    assert bus.stats()["delivered"] == 1
+
+async def idle(timeout):
+    await asyncio.sleep(timeout)
+
+@pytest.mark.asyncio
+async def test_redis_bus_delivers_locally_when_publish_fails():
+    with patch("app.services.pubsub.aioredis") as aioredis:
+        client = aioredis.Redis.from_url.return_value
+        client.publish = AsyncMock(side_effect=ConnectionError("down"))
+        client.close = AsyncMock()
+        pubsub = client.pubsub.return_value
+        pubsub.subscribe = AsyncMock()
+        pubsub.get_message = idle
+        pubsub.close = AsyncMock()
+        bus = RedisBus("redis://localhost:6379/0")
+    handler = AsyncMock()
+    await bus.subscribe("medihub:chat:1", handler)
+    pubsub.subscribe.assert_awaited_once_with("medihub:chat:1")
+
+    await bus.publish("medihub:chat:1", '{"n":1}')
+
+    handler.assert_awaited_once_with('{"n":1}')
+    assert bus.stats()["errors"] == 1
+    await bus.close()
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+import time
+from unittest.mock import MagicMock
+from app.utils.revocation import BloomFilter, SQLiteRevocationStore, RevocationList
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteRevocationStore(str(tmp_path / "revoked.db"))
+    yield store
+    store.close()
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"jti-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_sqlite_store_revokes_until_expiry(store):
+    store.revoke("live", time.time() + 60)
+    store.revoke("expired", time.time() - 1)
+
+    assert store.is_revoked("live")
+    assert not store.is_revoked("expired")
+    assert not store.is_revoked("unknown")
+    assert store.active() == ["live"]
+
+def test_sqlite_store_lists_recent_revocations(store):
+    before = time.time()
+    store.revoke("a", time.time() + 60)
+
+    assert store.revoked_since(before) == ["a"]
+    assert store.revoked_since(time.time() + 1) == []
+
+def test_revocation_list_skips_store_for_unknown_ids(store):
+    store.is_revoked = MagicMock(wraps=store.is_revoked)
+    revocations = RevocationList(store, capacity=1000)
+    revocations.revoke("revoked", time.time() + 60)
+
+    assert not revocations.is_revoked("fresh")
+    assert revocations.is_revoked("revoked")
+
+    assert store.is_revoked.call_count == 1
+    stats = revocations.stats()
+    assert stats["checks"] == 2
+    assert stats["store_lookups"] == 1
+    assert stats["revoked_hits"] == 1
+
+def test_revocation_list_syncs_other_workers(store):
+    worker_a = RevocationList(store, capacity=1000)
+    worker_b = RevocationList(store, capacity=1000)
+    worker_b.sync()
+    assert not worker_b.is_revoked("jti")
+
+    worker_a.revoke("jti", time.time() + 60)
+    assert not worker_b.is_revoked("jti")
+
+    worker_b.sync()
+    assert worker_b.is_revoked("jti")
+
+def test_revocation_checks_do_no_store_io_for_unknown_ids():
+    store = MagicMock()
+    revocations = RevocationList(store, capacity=1000)
+
+    assert not revocations.is_revoked("jti")
+    store.active.assert_not_called()
+    store.revoked_since.assert_not_called()
+    store.is_revoked.assert_not_called()
+
+def test_revocation_list_keeps_last_filter_when_sync_fails(store):
+    revocations = RevocationList(store, capacity=1000)
+    revocations.revoke("jti", time.time() + 60)
+    revocations.sync()
+
+    store.revoked_since = MagicMock(side_effect=OSError("disk error"))
+    revocations.sync()
+
+    assert revocations.is_revoked("jti")
+    assert revocations.stats()["sync_errors"] == 1
+
+def test_revocation_list_rejects_filter_hits_when_store_fails():
+    failing = MagicMock()
+    failing.is_revoked.side_effect = OSError("disk error")
+    revocations = RevocationList(failing, capacity=1000)
+    revocations.bloom.add("jti")
+
+    assert revocations.is_revoked("jti")
+    assert revocations.stats()["lookup_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_run_sync_rebuilds_in_the_background(store):
+    revocations = RevocationList(store, capacity=1000, sync_interval=0.01)
+    store.revoke("jti", time.time() + 60)
+
+    task = asyncio.create_task(revocations.run_sync())
+    while revocations.stats()["syncs"] == 0:
+        await asyncio.sleep(0.005)
+    task.cancel()
+
+    assert revocations.is_revoked("jti")
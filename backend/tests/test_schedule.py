@@ -0,0 +1,88 @@
+import pytest
+from datetime import date, datetime, time, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.schedule import ScheduleMaterializer, as_time, schedule_candidates
+
+TODAY = date(2023, 12, 4)    # a Monday
+
+def mock_conn(cursor):
+    conn = MagicMock()
+    conn.__aenter__.return_value = conn
+    conn.cursor.return_value.__aenter__.return_value = cursor
+    return conn
+
+def test_as_time_converts_time_columns():
+    assert as_time(timedelta(hours=9, minutes=30)) == time(9, 30)
+    assert as_time(time(13)) == time(13)
+
+def test_schedule_candidates_follow_weekdays_and_drop_overlaps():
+    rules = [
+        (0, time(9), time(10)),
+        (0, time(9, 30), time(11)),     # overlaps the first rule
+        (2, time(14), time(15))
+    ]
+
+    candidates = schedule_candidates(rules, TODAY, TODAY + timedelta(days=6), timedelta(minutes=30))
+
+    assert candidates == [
+        (datetime(2023, 12, 4, 9), datetime(2023, 12, 4, 9, 30)),
+        (datetime(2023, 12, 4, 9, 30), datetime(2023, 12, 4, 10)),
+        (datetime(2023, 12, 4, 10), datetime(2023, 12, 4, 10, 30)),
+        (datetime(2023, 12, 4, 10, 30), datetime(2023, 12, 4, 11)),
+        (datetime(2023, 12, 6, 14), datetime(2023, 12, 6, 14, 30)),
+        (datetime(2023, 12, 6, 14, 30), datetime(2023, 12, 6, 15))
+    ]
+
+@pytest.mark.asyncio
+async def test_materialize_doctor_adds_only_the_new_tail():
+    materializer = ScheduleMaterializer(horizon_days=14)
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    # Calendar lock, then the materialization state: done through Friday of week one
+    cursor.fetchone = AsyncMock(side_effect=[{"calendar_id": 5}, {"materialized_through": date(2023, 12, 8)}])
+
+    with patch('app.services.schedule.db.atransaction', return_value=mock_conn(cursor)), \
+         patch('app.services.schedule.acreate_slots', new_callable=AsyncMock) as mock_create, \
+         patch('app.services.schedule.availability_index.refresh_doctor', new_callable=AsyncMock) as mock_refresh:
+        mock_create.side_effect = lambda cursor, calendar_id, candidates: (candidates, [])
+        created = await materializer.materialize_doctor(3, [(0, time(9), time(10))], today=TODAY)
+
+    # Only the Monday of week two is new
+    assert created == 2
+    candidates = mock_create.await_args.args[2]
+    assert {start.date() for start, _ in candidates} == {date(2023, 12, 11)}
+    assert cursor.execute.await_args_list[-1].args[1] == (3, date(2023, 12, 17))
+    mock_refresh.assert_awaited_once_with(3)
+
+@pytest.mark.asyncio
+async def test_materialize_doctor_is_a_noop_when_caught_up():
+    materializer = ScheduleMaterializer(horizon_days=14)
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchone = AsyncMock(side_effect=[{"calendar_id": 5}, {"materialized_through": date(2023, 12, 17)}])
+
+    with patch('app.services.schedule.db.atransaction', return_value=mock_conn(cursor)), \
+         patch('app.services.schedule.acreate_slots', new_callable=AsyncMock) as mock_create:
+        assert await materializer.materialize_doctor(3, [(0, time(9), time(10))], today=TODAY) == 0
+
+    mock_create.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_run_once_skips_doctors_already_materialized():
+    materializer = ScheduleMaterializer(horizon_days=14)
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchall = AsyncMock(side_effect=[
+        [
+            {"doctor_id": 1, "day_of_week": 0, "start_time": timedelta(hours=9), "end_time": timedelta(hours=10)},
+            {"doctor_id": 2, "day_of_week": 1, "start_time": timedelta(hours=9), "end_time": timedelta(hours=10)}
+        ],
+        [{"doctor_id": 1, "materialized_through": date(2023, 12, 17)}]
+    ])
+
+    with patch('app.services.schedule.db.aget_db', return_value=mock_conn(cursor)), \
+         patch.object(materializer, 'materialize_doctor', new_callable=AsyncMock, return_value=4) as mock_materialize:
+        assert await materializer.run_once(today=TODAY) == 4
+
+    mock_materialize.assert_awaited_once_with(2, [(1, time(9), time(10))], TODAY)
+    assert materializer.stats()["slots_created"] == 4
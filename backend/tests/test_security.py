@@ -0,0 +1,121 @@
+import pytest
+import asyncio
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+from fastapi import HTTPException
+from jose import jwt, JWTError
+from app.utils.security import HashingPool, SecurityManager
+
+@pytest.fixture(autouse=True)
+def revocation_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("REVOCATION_DB_PATH", str(tmp_path / "revoked_tokens.db"))
+
+@pytest.mark.asyncio
+async def test_hashing_pool_runs_off_event_loop():
+    pool = HashingPool(max_workers=1, max_pending=4)
+
+    thread_name = await pool.run(lambda: threading.current_thread().name)
+
+    assert thread_name.startswith("password-hash")
+    stats = pool.stats()
+    assert stats["completed"] == 1
+    assert stats["pending"] == 0
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_hashing_pool_rejects_when_saturated():
+    pool = HashingPool(max_workers=1, max_pending=1)
+    release = threading.Event()
+
+    blocked = asyncio.ensure_future(pool.run(release.wait, 1))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await pool.run(lambda: None)
+
+    release.set()
+    await blocked
+
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "1"
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 1
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_hashing_pool_propagates_errors():
+    pool = HashingPool(max_workers=1, max_pending=4)
+
+    def fail():
+        raise ValueError("bad hash")
+
+    with pytest.raises(ValueError):
+        await pool.run(fail)
+
+    assert pool.stats()["pending"] == 0
+    pool.shutdown()
+
+def test_verify_token_caches_decoded_payload():
+    manager = SecurityManager()
+    token = manager.create_access_token({"sub": "1"})
+
+    with patch('app.utils.security.jwt.decode', wraps=jwt.decode) as mock_decode:
+        first = manager.verify_token(token)
+        first["sub"] = "2"
+        second = manager.verify_token(token)
+
+    assert mock_decode.call_count == 1
+    assert second["sub"] == "1"
+    stats = manager.token_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_verify_token_drops_expired_entries():
+    manager = SecurityManager()
+    token = manager.create_access_token({"sub": "1"}, expires_delta=timedelta(minutes=5))
+    assert manager.verify_token(token) is not None
+
+    with patch('app.utils.security.time.time', return_value=10 ** 12):
+        with patch('app.utils.security.jwt.decode', side_effect=JWTError("expired")):
+            assert manager.verify_token(token) is None
+
+    assert manager.token_cache_stats()["size"] == 0
+
+def test_verify_token_rejects_blacklisted_token():
+    manager = SecurityManager()
+    token = manager.create_access_token({"sub": "1"})
+    assert manager.verify_token(token) is not None
+
+    with patch('app.utils.security.db.get_db'):
+        manager.blacklist_token(token)
+
+    assert manager.verify_token(token) is None
+
+def test_verify_token_rejects_invalid_token():
+    manager = SecurityManager()
+
+    assert manager.verify_token("not-a-token") is None
+    assert manager.token_cache_stats()["size"] == 0
+
+def test_issued_tokens_have_unique_jti():
+    manager = SecurityManager()
+
+    first = manager.verify_token(manager.create_access_token({"sub": "1"}))
+    second = manager.verify_token(manager.create_access_token({"sub": "1"}))
+
+    assert first["jti"] != second["jti"]
+
+def test_revocation_is_shared_between_workers():
+    worker_a = SecurityManager()
+    worker_b = SecurityManager()
+    token = worker_a.create_access_token({"sub": "1"})
+    assert worker_b.verify_token(token) is not None
+
+    with patch('app.utils.security.db.get_db'):
+        worker_a.blacklist_token(token)
+    # What worker_b's run_sync task does every REVOCATION_SYNC_INTERVAL seconds
+    worker_b.revocations.sync()
+
+    assert worker_b.verify_token(token) is None
@@ -0,0 +1,103 @@
+import pytest
+from datetime import date, datetime, time, timedelta
+from unittest.mock import MagicMock
+from app.services import timeslots
+from app.services.timeslots import generate_candidates, IntervalIndex, split_candidates, create_slots, find_overlap
+
+def dt(day, hour, minute=0):
+    return datetime(2023, 12, day, hour, minute)
+
+def test_generate_candidates_respects_days_and_hours():
+    candidates = generate_candidates(
+        date(2023, 12, 1), date(2023, 12, 4),   # Friday to Monday
+        time(9, 0), time(10, 0),
+        timedelta(minutes=25),
+        weekdays=[0, 4],
+        exclude_dates=[date(2023, 12, 4)]
+    )
+
+    # Only Friday remains; the third 25 minute slot would end after 10:00
+    assert candidates == [(dt(1, 9), dt(1, 9, 25)), (dt(1, 9, 25), dt(1, 9, 50))]
+
+def test_generate_candidates_rejects_empty_duration():
+    with pytest.raises(ValueError):
+        generate_candidates(date(2023, 12, 1), date(2023, 12, 1), time(9), time(10), timedelta(0))
+
+def test_interval_index_detects_overlaps():
+    index = IntervalIndex([
+        (dt(1, 9), dt(1, 12)),           # long slot hiding behind shorter ones
+        (dt(1, 9, 30), dt(1, 9, 45)),
+        (dt(1, 14), dt(1, 15))
+    ])
+
+    assert index.overlaps(dt(1, 11), dt(1, 11, 30))
+    assert index.overlaps(dt(1, 13, 30), dt(1, 14, 30))
+    assert not index.overlaps(dt(1, 12), dt(1, 14))
+    assert not index.overlaps(dt(1, 8), dt(1, 9))
+    assert not index.overlaps(dt(1, 15), dt(1, 16))
+
+def test_interval_index_add():
+    index = IntervalIndex([(dt(1, 14), dt(1, 15))])
+    assert not index.overlaps(dt(1, 10), dt(1, 11))
+
+    index.add(dt(1, 9), dt(1, 13))
+
+    assert index.overlaps(dt(1, 10), dt(1, 11))
+    assert index.overlaps(dt(1, 14, 30), dt(1, 16))
+    assert len(index) == 2
+
+def test_split_candidates_skips_overlaps_only():
+    candidates = [(dt(1, h), dt(1, h + 1)) for h in range(9, 14)]
+    existing = [
+        (dt(1, 8), dt(1, 9)),            # ends where the first candidate starts
+        (dt(1, 10, 15), dt(1, 10, 45)),  # inside the 10:00 candidate
+        (dt(1, 11, 30), dt(1, 12, 30))   # spans 11:00 and 12:00
+    ]
+
+    free, skipped = split_candidates(candidates, existing)
+
+    assert [start.hour for start, _ in free] == [9, 13]
+    assert [start.hour for start, _ in skipped] == [10, 11, 12]
+
+def test_create_slots_reads_once_and_batches_inserts(monkeypatch):
+    monkeypatch.setattr(timeslots, "INSERT_BATCH_SIZE", 2)
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [{"start_time": dt(1, 10), "end_time": dt(1, 11)}]
+    candidates = [(dt(1, h), dt(1, h + 1)) for h in range(9, 14)]
+
+    created, skipped = create_slots(cursor, 5, candidates)
+
+    assert len(created) == 4
+    assert skipped == [(dt(1, 10), dt(1, 11))]
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1] == {"calendar_id": 5, "start": dt(1, 9), "end": dt(1, 14)}
+    batches = [c[0][1] for c in cursor.executemany.call_args_list]
+    assert [len(b) for b in batches] == [2, 2]
+    assert batches[0][0] == (5, dt(1, 9), dt(1, 10), True)
+
+def test_create_slots_dry_run_writes_nothing():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = []
+
+    created, skipped = create_slots(cursor, 5, [(dt(1, 9), dt(1, 10))], dry_run=True)
+
+    assert len(created) == 1
+    cursor.executemany.assert_not_called()
+
+def test_create_slots_without_calendar():
+    cursor = MagicMock()
+
+    created, skipped = create_slots(cursor, None, [(dt(1, 9), dt(1, 10))], dry_run=True)
+
+    assert len(created) == 1
+    cursor.execute.assert_not_called()
+
+def test_find_overlap_excludes_slot():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = None
+
+    assert find_overlap(cursor, 5, dt(1, 9), dt(1, 10), exclude_slot_id=7) is None
+    assert cursor.execute.call_args[0][1]["exclude_slot_id"] == 7
+
+    find_overlap(cursor, 5, dt(1, 9), dt(1, 10))
+    assert cursor.execute.call_args[0][1]["exclude_slot_id"] == 0
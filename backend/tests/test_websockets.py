@@ -0,0 +1,119 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.api.endpoints.chat import ConnectionManager
+from app.services.notifications import NotificationManager
+from app.services.pubsub import InMemoryBus
+from app.services.websockets import SocketSender, encode_message
+
+def socket(send_text=None):
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_text = send_text or AsyncMock()
+    return websocket
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_encode_message_handles_datetimes_with_and_without_orjson():
+    message = {"type": "chat_message", "data": {"sent_at": datetime(2024, 3, 1, 10, 0, 5), "text": "é"}}
+
+    fast = encode_message(message)
+    with patch("app.services.websockets.orjson", None):
+        plain = encode_message(message)
+
+    assert json.loads(fast) == json.loads(plain) == {
+        "type": "chat_message", "data": {"sent_at": "2024-03-01T10:00:05", "text": "é"}
+    }
+
+@pytest.mark.asyncio
+async def test_sender_writes_queued_messages_in_order():
+    websocket = socket()
+    sender = SocketSender(websocket, max_size=4)
+    sender.start()
+
+    assert sender.send({"n": 1})
+    assert sender.send({"n": 2})
+    await settle()
+
+    assert [call.args[0] for call in websocket.send_text.await_args_list] == ['{"n":1}', '{"n":2}']
+    assert sender.counters["sent"] == 2
+    await sender.close()
+
+@pytest.mark.asyncio
+async def test_stalled_socket_is_evicted_past_the_high_water_mark():
+    stalled = asyncio.Event()
+
+    async def never_returns(message):
+        await stalled.wait()
+
+    websocket = socket(never_returns)
+    on_close = AsyncMock()
+    sender = SocketSender(websocket, max_size=2, policy="evict", on_close=on_close)
+    sender.start()
+
+    # The first message is taken by the writer, two more fill the queue
+    assert sender.send({"n": 0})
+    await settle()
+    assert sender.send({"n": 1})
+    assert sender.send({"n": 2})
+    assert not sender.send({"n": 3})
+    # Sends before the close task runs are refused without another eviction
+    assert not sender.send({"n": 4})
+    assert not sender.send({"n": 5})
+    await settle()
+
+    websocket.close.assert_awaited_once_with(code=1013, reason="Too slow")
+    on_close.assert_awaited_once_with(sender)
+    assert sender.counters["evicted"] == 1
+    assert sender.counters["dropped"] == 3
+    assert not sender.send({"n": 4})
+
+@pytest.mark.asyncio
+async def test_coalescing_replaces_the_backlog_with_an_overflow_message():
+    sender = SocketSender(socket(), max_size=2, policy="coalesce")
+
+    # Without a writer nothing drains
+    sender.send({"n": 1})
+    sender.send({"n": 2})
+    assert not sender.send({"n": 3})
+
+    assert sender.depth == 1
+    assert sender.queue.get_nowait() == '{"type":"overflow","dropped":3}'
+
+@pytest.mark.asyncio
+async def test_connection_manager_subscribes_per_user_and_delivers_from_bus():
+    bus = InMemoryBus()
+    manager = ConnectionManager(bus)
+    first, second = socket(), socket()
+
+    await manager.connect(first, 5)
+    await manager.connect(second, 5)
+    assert bus.stats()["channels"] == 1
+
+    await manager.send_personal_message({"type": "chat_message", "data": {"message_id": 1}}, 5)
+    await settle()
+    first.send_text.assert_awaited_once_with('{"type":"chat_message","data":{"message_id":1}}')
+    second.send_text.assert_awaited_once_with('{"type":"chat_message","data":{"message_id":1}}')
+    assert manager.stats()["connections"] == 2
+
+    await manager.disconnect(first, 5)
+    await manager.disconnect(second, 5)
+    assert bus.stats()["channels"] == 0
+    assert manager.stats()["connections"] == 0
+
+@pytest.mark.asyncio
+async def test_notification_manager_drops_failed_sockets():
+    bus = InMemoryBus()
+    manager = NotificationManager(bus)
+
+    await manager.connect(socket(AsyncMock(side_effect=RuntimeError("closed"))), 8)
+    await manager.send_notification(8, {"type": "notification"})
+    await settle()
+
+    assert 8 not in manager.active_connections
+    assert bus.stats()["channels"] == 0